@@ -0,0 +1,98 @@
+"""
+Conditional GET support (ETag / Last-Modified) for API views.
+
+Responses are stamped with the data versions of the scopes they depend on
+(see core.versioning). A request whose If-None-Match matches the current
+stamp gets a 304 before any queryset or serializer work runs.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.http import http_date, parse_etags, quote_etag
+from rest_framework import status
+from rest_framework.response import Response
+
+from core.versioning import version_token
+
+
+def _etag_for(request, token):
+    renderer = getattr(request, 'accepted_renderer', None)
+    raw = '|'.join([
+        # Date-relative views (analytics windows) must not stay fresh across days
+        timezone.now().date().isoformat(),
+        request.path,
+        request.META.get('QUERY_STRING', ''),
+        getattr(renderer, 'format', '') or '',
+        token,
+    ])
+    return quote_etag(hashlib.md5(raw.encode('utf-8')).hexdigest())
+
+
+def _strip_weak(etag):
+    return etag[2:] if etag.startswith('W/') else etag
+
+
+def _etag_matches(request, etag):
+    header = request.META.get('HTTP_IF_NONE_MATCH')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    if '*' in candidates:
+        return True
+    return any(_strip_weak(candidate) == etag for candidate in candidates)
+
+
+def conditional_get(request, scopes, render):
+    """
+    Return 304 if the client's ETag is current, otherwise call ``render()``
+    and stamp its response with ETag/Last-Modified.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return render()
+
+    token, last_modified = version_token(scopes)
+    etag = _etag_for(request, token)
+    headers = {'ETag': etag}
+    if last_modified:
+        headers['Last-Modified'] = http_date(last_modified.timestamp())
+
+    if _etag_matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    response = render()
+    if response.status_code == status.HTTP_200_OK:
+        for name, value in headers.items():
+            response[name] = value
+    return response
+
+
+def versioned(*scopes):
+    """
+    Decorator for DRF handler methods. Scopes may use URL kwargs, e.g.
+    ``@versioned('customers', 'customer:{pk}')``.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            resolved = [scope.format(**kwargs) for scope in scopes]
+            return conditional_get(request, resolved, lambda: method(self, request, *args, **kwargs))
+        return wrapper
+    return decorator
+
+
+class ConditionalGetMixin:
+    """Viewset mixin: ETag/304 handling for list and retrieve using ``version_scopes``"""
+    version_scopes = ()
+
+    def list(self, request, *args, **kwargs):
+        return conditional_get(
+            request, self.version_scopes,
+            lambda: super(ConditionalGetMixin, self).list(request, *args, **kwargs)
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return conditional_get(
+            request, self.version_scopes,
+            lambda: super(ConditionalGetMixin, self).retrieve(request, *args, **kwargs)
+        )
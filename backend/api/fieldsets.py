@@ -0,0 +1,164 @@
+"""
+Sparse fieldsets and expandable relations for API serializers.
+
+``?fields=invoice_code,total_amount,customer.name`` limits the rendered
+fields (dotted paths reach into nested serializers) and
+``?expand=items,items.product`` opts in to nested relations. Once either
+parameter is given, nested relations that are not expanded collapse to
+primary keys and fields listed in ``Meta.expandable_fields`` (computed
+nested data) are dropped unless expanded or named in ``fields``. Without
+either parameter serializers render their full default shape.
+
+Viewsets using ``SparseFieldsetMixin`` derive ``only()``,
+``select_related()`` and ``prefetch_related()`` from the resulting shape.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from rest_framework import serializers
+
+
+def parse_field_paths(value):
+    """Turn "a,b.c,b.d" into {'a': {}, 'b': {'c': {}, 'd': {}}}"""
+    tree = {}
+    for path in (value or '').split(','):
+        path = path.strip()
+        if not path:
+            continue
+        node = tree
+        for part in path.split('.'):
+            node = node.setdefault(part, {})
+    return tree
+
+
+def _nested_serializer(field):
+    if isinstance(field, serializers.ListSerializer):
+        return field.child
+    if isinstance(field, serializers.BaseSerializer):
+        return field
+    return None
+
+
+def shape_serializer(serializer, fields_tree, expand_tree):
+    """Prune and collapse ``serializer.fields`` in place for the requested shape"""
+    meta = getattr(serializer, 'Meta', None)
+    expandable = set(getattr(meta, 'expandable_fields', ()))
+
+    for name in list(serializer.fields):
+        field = serializer.fields[name]
+        if fields_tree and name not in fields_tree:
+            del serializer.fields[name]
+            continue
+
+        nested = _nested_serializer(field)
+        if nested is not None:
+            if name in expand_tree:
+                shape_serializer(nested, fields_tree.get(name, {}), expand_tree[name])
+            else:
+                kwargs = {'read_only': True, 'many': isinstance(field, serializers.ListSerializer)}
+                if field.source != name:
+                    kwargs['source'] = field.source
+                serializer.fields[name] = serializers.PrimaryKeyRelatedField(**kwargs)
+        elif name in expandable and name not in expand_tree and name not in fields_tree:
+            del serializer.fields[name]
+
+
+class DynamicFieldsMixin:
+    """Apply ?fields= / ?expand= from the request in the serializer context"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+
+        request = self.context.get('request')
+        if request is None:
+            return
+        params = getattr(request, 'query_params', request.GET)
+        if 'fields' not in params and 'expand' not in params:
+            return
+
+        shape_serializer(
+            self,
+            parse_field_paths(params.get('fields')),
+            parse_field_paths(params.get('expand')),
+        )
+
+
+def _model_field(model, name):
+    try:
+        return model._meta.get_field(name)
+    except FieldDoesNotExist:
+        return None
+
+
+def _collect_relations(serializer, model, prefix, in_many, select_related, prefetch_related):
+    for field in serializer.fields.values():
+        source = field.source
+        if source == '*' or '.' in source:
+            continue
+        model_field = _model_field(model, source)
+        if model_field is None or not model_field.is_relation:
+            continue
+
+        path = f"{prefix}{source}"
+        many = model_field.one_to_many or model_field.many_to_many
+        if many or in_many:
+            prefetch_related.append(path)
+        else:
+            select_related.append(path)
+
+        nested = _nested_serializer(field)
+        if nested is not None:
+            _collect_relations(
+                nested, model_field.related_model, f"{path}__",
+                in_many or many, select_related, prefetch_related
+            )
+
+
+def _root_only_fields(serializer, model):
+    """Concrete columns needed at the root, or None when a field may touch any column"""
+    only = set()
+    for field in serializer.fields.values():
+        source = field.source
+        if source == '*' or '.' in source:
+            return None
+        model_field = _model_field(model, source)
+        if model_field is None:
+            return None
+        if model_field.concrete:
+            only.add(source)
+    only.add(model._meta.pk.name)
+    return only
+
+
+def optimize_queryset(queryset, serializer, restrict_columns=False):
+    """Add select_related/prefetch_related (and only() when restricted) for a serializer shape"""
+    model = queryset.model
+    select_related, prefetch_related = [], []
+    _collect_relations(serializer, model, '', False, select_related, prefetch_related)
+
+    if select_related:
+        queryset = queryset.select_related(*select_related)
+    if prefetch_related:
+        queryset = queryset.prefetch_related(*prefetch_related)
+
+    if restrict_columns:
+        only = _root_only_fields(serializer, model)
+        if only is not None:
+            # Keep FK columns that select_related traverses from the root
+            only.update(path.split('__')[0] for path in select_related)
+            queryset = queryset.only(*only)
+    return queryset
+
+
+class SparseFieldsetMixin:
+    """Viewset mixin: shape the list/retrieve queryset to the rendered serializer"""
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset
+
+        params = self.request.query_params
+        serializer = self.get_serializer()
+        return optimize_queryset(
+            queryset, serializer,
+            restrict_columns='fields' in params,
+        )
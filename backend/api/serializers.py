@@ -1,4 +1,5 @@
 from rest_framework import serializers
+from django.db import transaction
 from django.contrib.auth.models import User
 from customers.models import Customer, Branch
 from products.models import Product, CustomerProductPrice
@@ -8,6 +9,8 @@ from invoices.models import Invoice, CreditNote, CreditNoteItem
 from expenses.models import Expense, ExpenseCategory, ExpenseAttachment
 from employees.models import Employee
 from planting_schedule.models import Crop, FarmBlock
+from core.coalesce import coalesce_signals
+from .fieldsets import DynamicFieldsMixin
 
 
 # Authentication Serializers
@@ -32,7 +35,7 @@ class CustomerSummarySerializer(serializers.ModelSerializer):
         fields = ['id', 'name', 'short_code', 'preferred_currency']
 
 
-class CustomerSerializer(serializers.ModelSerializer):
+class CustomerSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     branches = BranchSerializer(many=True, read_only=True)
     order_statistics = serializers.SerializerMethodField()
     current_balance = serializers.SerializerMethodField()
@@ -67,10 +70,11 @@ class CustomerDetailSerializer(CustomerSerializer):
         fields = CustomerSerializer.Meta.fields + [
             'recent_orders', 'payment_history'
         ]
+        expandable_fields = ['recent_orders', 'payment_history']
 
 
 # Product Serializers
-class ProductSerializer(serializers.ModelSerializer):
+class ProductSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     customer_prices = serializers.SerializerMethodField()
 
     def get_customer_prices(self, obj):
@@ -80,9 +84,10 @@ class ProductSerializer(serializers.ModelSerializer):
     class Meta:
         model = Product
         fields = ['id', 'name', 'stem_length_cm', 'customer_prices']
+        expandable_fields = ['customer_prices']
 
 
-class CustomerProductPriceSerializer(serializers.ModelSerializer):
+class CustomerProductPriceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     customer = CustomerSummarySerializer(read_only=True)
     product = ProductSerializer(read_only=True)
 
@@ -90,7 +95,7 @@ class CustomerProductPriceSerializer(serializers.ModelSerializer):
         model = CustomerProductPrice
         fields = [
             'id', 'customer', 'product', 'stem_length_cm',
-            'price_per_stem', 'last_updated'
+            'price_per_stem'
         ]
         read_only_fields = ['id']
 
@@ -103,7 +108,7 @@ class OrderBoxSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class OrderItemSerializer(serializers.ModelSerializer):
+class OrderItemSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     product = ProductSerializer(read_only=True)
     box = OrderBoxSerializer(read_only=True)
 
@@ -115,7 +120,7 @@ class OrderItemSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderSummarySerializer(serializers.ModelSerializer):
+class OrderSummarySerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     customer = CustomerSummarySerializer(read_only=True)
 
     class Meta:
@@ -132,7 +137,7 @@ class CreditNoteSummarySerializer(serializers.ModelSerializer):
         fields = ['id', 'code', 'total_credit_amount', 'status', 'created_at']
 
 
-class OrderSerializer(serializers.ModelSerializer):
+class OrderSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     items = OrderItemSerializer(many=True, read_only=True)
     customer = CustomerSummarySerializer(read_only=True)
     branch = BranchSerializer(read_only=True)
@@ -153,7 +158,7 @@ class OrderSerializer(serializers.ModelSerializer):
         return str(obj.total_paid_amount())
 
     def get_credit_notes(self, obj):
-        credit_notes = obj.credit_notes.all()
+        credit_notes = CreditNote.objects.filter(items__order_item__order=obj).distinct()
         return CreditNoteSummarySerializer(credit_notes, many=True).data
 
     def get_total_boxes(self, obj):
@@ -169,6 +174,7 @@ class OrderSerializer(serializers.ModelSerializer):
             'payment_status', 'outstanding_amount',
             'total_paid_amount', 'credit_notes'
         ]
+        expandable_fields = ['credit_notes']
 
 
 class CreateOrderItemSerializer(serializers.Serializer):
@@ -192,20 +198,55 @@ class CreateOrderSerializer(serializers.ModelSerializer):
 
     def create(self, validated_data):
         items_data = validated_data.pop('items')
-        order = Order.objects.create(**validated_data)
-
-        for item_data in items_data:
-            box_number = item_data.pop('box_number', None)
-            item = OrderItem.objects.create(order=order, **item_data)
-            if box_number and box_number > 0:
-                order_box, _ = OrderBox.objects.get_or_create(
-                    order=order, box_number=box_number
-                )
-                item.box = order_box
-                item.save(update_fields=['box'])
+        # One transaction per order; coalescing writes the learned pricing of
+        # all lines as one batch on commit
+        with transaction.atomic(), coalesce_signals():
+            order = Order.objects.create(**validated_data)
+
+            for item_data in items_data:
+                box_number = item_data.pop('box_number', None)
+                item = OrderItem.objects.create(order=order, product_id=item_data.pop('product'), **item_data)
+                if box_number and box_number > 0:
+                    order_box, _ = OrderBox.objects.get_or_create(
+                        order=order, box_number=box_number
+                    )
+                    item.box = order_box
+                    item.save(update_fields=['box'])
 
         return order
 
+    def to_representation(self, instance):
+        # Item input is keyed by product id; respond with the regular order representation
+        return OrderSerializer(instance, context=self.context).data
+
+
+class BulkOrderItemSerializer(CreateOrderItemSerializer):
+    price_per_stem = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+
+
+class BulkOrderSerializer(serializers.Serializer):
+    customer = serializers.IntegerField()
+    branch = serializers.IntegerField(required=False, allow_null=True)
+    date = serializers.DateField(required=False)
+    remarks = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=255)
+    logistics_provider = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=100)
+    logistics_cost = serializers.DecimalField(max_digits=10, decimal_places=2, required=False, allow_null=True)
+    tracking_number = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=100)
+    delivery_status = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=50)
+    items = BulkOrderItemSerializer(many=True)
+
+
+BULK_MAX_ORDERS = 500
+
+
+class BulkOrderRequestSerializer(serializers.Serializer):
+    orders = BulkOrderSerializer(many=True, allow_empty=False)
+
+    def validate_orders(self, value):
+        if len(value) > BULK_MAX_ORDERS:
+            raise serializers.ValidationError(f"A bulk request may contain at most {BULK_MAX_ORDERS} orders.")
+        return value
+
 
 class CustomerOrderDefaultsSerializer(serializers.ModelSerializer):
     customer = CustomerSummarySerializer(read_only=True)
@@ -228,7 +269,7 @@ class PaymentAllocationSerializer(serializers.ModelSerializer):
         fields = ['id', 'order', 'amount', 'allocated_at']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     customer = CustomerSummarySerializer(read_only=True)
     allocations = PaymentAllocationSerializer(many=True, read_only=True)
     allocated_amount = serializers.ReadOnlyField()
@@ -270,7 +311,7 @@ class PaymentSummarySerializer(serializers.ModelSerializer):
         ]
 
 
-class CustomerBalanceSerializer(serializers.ModelSerializer):
+class CustomerBalanceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     customer = CustomerSummarySerializer(read_only=True)
 
     class Meta:
@@ -294,7 +335,7 @@ class AccountStatementSerializer(serializers.ModelSerializer):
 
 
 # Invoice Serializers
-class InvoiceSerializer(serializers.ModelSerializer):
+class InvoiceSerializer(DynamicFieldsMixin, serializers.ModelSerializer):
     order = OrderSummarySerializer(read_only=True)
 
     class Meta:
@@ -442,9 +483,11 @@ class DashboardStatsSerializer(serializers.Serializer):
 
 class SalesAnalyticsSerializer(serializers.Serializer):
     period = serializers.CharField()
+    interval = serializers.CharField()
     sales_data = serializers.ListField()
     orders_data = serializers.ListField()
     customers_data = serializers.ListField()
+    products_data = serializers.ListField()
 
 
 class PaymentAnalyticsSerializer(serializers.Serializer):
@@ -454,3 +497,38 @@ class PaymentAnalyticsSerializer(serializers.Serializer):
     top_customers = serializers.ListField()
 
 
+# Batch Serializers
+BATCH_MAX_OPERATIONS = 500
+
+
+class BatchOperationSerializer(serializers.Serializer):
+    METHOD_CHOICES = ['create', 'update', 'partial_update', 'delete']
+
+    method = serializers.ChoiceField(choices=METHOD_CHOICES)
+    resource = serializers.CharField()
+    id = serializers.CharField(required=False)
+    ref = serializers.CharField(required=False)
+    data = serializers.DictField(required=False, default=dict)
+
+    def validate(self, attrs):
+        if attrs['method'] != 'create' and not attrs.get('id'):
+            raise serializers.ValidationError(f"'id' is required for {attrs['method']} operations.")
+        return attrs
+
+
+class BatchRequestSerializer(serializers.Serializer):
+    operations = BatchOperationSerializer(many=True, allow_empty=False)
+
+    def validate_operations(self, value):
+        if len(value) > BATCH_MAX_OPERATIONS:
+            raise serializers.ValidationError(f"A batch may contain at most {BATCH_MAX_OPERATIONS} operations.")
+
+        refs = set()
+        for op in value:
+            ref = op.get('ref')
+            if ref:
+                if ref in refs:
+                    raise serializers.ValidationError(f"Duplicate ref '{ref}'.")
+                refs.add(ref)
+        return value
+
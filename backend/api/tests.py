@@ -0,0 +1,100 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from customers.models import Customer
+from invoices.models import Invoice
+from payments.models import Payment
+from products.models import Product
+
+
+class BatchViewTests(TestCase):
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('clerk', is_staff=True))
+        self.customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='KSH')
+
+    def batch(self, *operations):
+        return self.client.post('/api/v1/batch/', {'operations': list(operations)}, format='json')
+
+    def test_failed_operation_rolls_back_batch(self):
+        response = self.batch(
+            {'method': 'create', 'resource': 'products', 'data': {'name': 'Rhodos', 'stem_length_cm': 50}},
+            {'method': 'partial_update', 'resource': 'orders', 'id': 999, 'data': {'remarks': 'x'}},
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(response.data['failed_index'], 1)
+        self.assertFalse(response.data['success'])
+        self.assertFalse(Product.objects.exists())
+
+    def test_failed_coalesced_work_rolls_back_batch(self):
+        payment = {
+            'customer': self.customer.pk, 'amount': '500.00', 'currency': 'KSH',
+            'payment_method': 'bank_transfer', 'payment_date': '2026-01-15',
+        }
+        with mock.patch('payments.models._recalculate_customer_balance', side_effect=RuntimeError('boom')):
+            response = self.batch({'method': 'create', 'resource': 'payments', 'data': payment})
+        self.assertEqual(response.status_code, 500)
+        self.assertIsNone(response.data['failed_index'])
+        self.assertFalse(Payment.objects.exists())
+
+    def test_successful_batch_resolves_refs(self):
+        response = self.batch(
+            {'method': 'create', 'resource': 'products', 'ref': 'rose', 'data': {'name': 'Rhodos', 'stem_length_cm': 50}},
+            {'method': 'partial_update', 'resource': 'products', 'id': '$rose', 'data': {'name': 'Athena'}},
+        )
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(Product.objects.get().name, 'Athena')
+        self.assertEqual(len(response.data['results']), 2)
+
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class OrderCreateTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('clerk', is_staff=True))
+        self.customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='KSH')
+        self.product = Product.objects.create(name='Rhodos', stem_length_cm=50)
+
+    def test_learned_pricing_written_once_per_order(self):
+        line = {'product': self.product.pk, 'boxes': 1, 'stems_per_box': 10, 'price_per_stem': '1.00'}
+        order = {
+            'customer': self.customer.pk, 'date': '2026-01-15',
+            'items': [dict(line, stem_length_cm=50), dict(line, stem_length_cm=60)],
+        }
+        with mock.patch('orders.services.upsert_learned_pricing') as upsert:
+            with self.captureOnCommitCallbacks(execute=True):
+                response = self.client.post('/api/v1/orders/', order, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(upsert.call_count, 1)
+        self.assertEqual(len(upsert.call_args[0][0]), 2)
+
+    def bulk_order(self):
+        line = {'product': self.product.pk, 'stem_length_cm': 50, 'boxes': 1, 'stems_per_box': 10, 'price_per_stem': '1.00'}
+        return {'customer': self.customer.pk, 'items': [line]}
+
+    def test_bulk_leaves_invoice_pdfs_to_the_command(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/v1/orders/bulk/', {'orders': [self.bulk_order()]}, format='json')
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertFalse(Invoice.objects.get().pdf_file)
+
+    def test_bulk_rejects_too_many_orders(self):
+        with mock.patch('api.serializers.BULK_MAX_ORDERS', 1):
+            response = self.client.post(
+                '/api/v1/orders/bulk/', {'orders': [self.bulk_order(), self.bulk_order()]}, format='json'
+            )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('orders', response.data)
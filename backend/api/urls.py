@@ -46,6 +46,11 @@ urlpatterns = [
     path('analytics/dashboard/', views.DashboardStatsView.as_view(), name='dashboard_stats'),
     path('analytics/sales/', views.SalesAnalyticsView.as_view(), name='sales_analytics'),
     path('analytics/payments/', views.PaymentAnalyticsView.as_view(), name='payment_analytics'),
+    path('analytics/aging/', views.ReceivablesAgingView.as_view(), name='receivables_aging'),
+    path('analytics/cache-stats/', views.AnalyticsCacheStatsView.as_view(), name='analytics_cache_stats'),
+
+    # Batch operations across the registered viewsets
+    path('batch/', views.BatchView.as_view(), name='batch'),
 
     # Include router URLs
     path('', include(router.urls)),
@@ -4,21 +4,31 @@ from rest_framework.response import Response
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import SearchFilter, OrderingFilter
+from django.db import transaction
 from django.db.models import Sum, Count, Q
 from django.utils import timezone
 from datetime import datetime, timedelta
 from decimal import Decimal
+import re
 
 # Model imports
 from customers.models import Customer, Branch
 from products.models import Product, CustomerProductPrice
-from orders.models import Order, OrderItem, CustomerOrderDefaults
+from orders.models import Order, OrderItem, CustomerOrderDefaults, DailySalesFact
 from payments.models import Payment, PaymentAllocation, CustomerBalance, AccountStatement
+from payments.aging import AGING_BUCKETS, aging_summary
 from invoices.models import Invoice, CreditNote, CreditNoteItem
 from expenses.models import Expense, ExpenseCategory, ExpenseAttachment
 from employees.models import Employee
 from planting_schedule.models import Crop, FarmBlock
 
+from core.coalesce import coalesce_signals
+from core.result_cache import cached_result, cache_stats
+from products.pricing import price_cache_stats
+from core.timeseries import time_series, month_range_start
+from .fieldsets import SparseFieldsetMixin
+from .conditional import ConditionalGetMixin, versioned
+
 # Serializer imports
 from .serializers import (
     # Customer serializers
@@ -30,7 +40,7 @@ from .serializers import (
 
     # Order serializers
     OrderSerializer, OrderSummarySerializer, CreateOrderSerializer,
-    OrderItemSerializer, CustomerOrderDefaultsSerializer,
+    OrderItemSerializer, CustomerOrderDefaultsSerializer, BulkOrderRequestSerializer,
 
     # Payment serializers
     PaymentSerializer, PaymentSummarySerializer, CreatePaymentSerializer,
@@ -53,17 +63,21 @@ from .serializers import (
 
     # Analytics serializers
     DashboardStatsSerializer, SalesAnalyticsSerializer, PaymentAnalyticsSerializer,
+
+    # Batch serializers
+    BatchRequestSerializer,
 )
 
 
 # Customer Views
-class CustomerViewSet(viewsets.ModelViewSet):
+class CustomerViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Customer.objects.all()
     serializer_class = CustomerSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = ['name', 'short_code']
     ordering_fields = ['name', 'created_at']
     ordering = ['name']
+    version_scopes = ['customers', 'orders', 'payments', 'credit_notes', 'balances']
 
     def get_serializer_class(self):
         if self.action == 'retrieve':
@@ -71,6 +85,7 @@ class CustomerViewSet(viewsets.ModelViewSet):
         return CustomerSerializer
 
     @action(detail=True, methods=['get'])
+    @versioned('customers', 'customer:{pk}')
     def balance(self, request, pk=None):
         customer = self.get_object()
         balance = customer.current_balance()
@@ -135,29 +150,32 @@ class BranchViewSet(viewsets.ModelViewSet):
 
 
 # Product Views
-class ProductViewSet(viewsets.ModelViewSet):
+class ProductViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Product.objects.all()
     serializer_class = ProductSerializer
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = ['name']
     ordering_fields = ['name', 'stem_length_cm']
     ordering = ['name']
+    version_scopes = ['products']
 
 
-class CustomerProductPriceViewSet(viewsets.ModelViewSet):
+class CustomerProductPriceViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = CustomerProductPrice.objects.all()
     serializer_class = CustomerProductPriceSerializer
     filter_backends = [DjangoFilterBackend]
     filterset_fields = ['customer', 'product', 'stem_length_cm']
+    version_scopes = ['products', 'customers']
 
 
 # Order Views
-class OrderViewSet(viewsets.ModelViewSet):
+class OrderViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Order.objects.all()
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = ['invoice_code']
     ordering_fields = ['date', 'total_amount', 'created_at']
     ordering = ['-date']
+    version_scopes = ['orders', 'customers', 'products', 'payments', 'credit_notes']
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -206,10 +224,34 @@ class OrderViewSet(viewsets.ModelViewSet):
         serializer = OrderItemSerializer(items, many=True)
         return Response(serializer.data)
 
+    @action(detail=False, methods=['post'])
+    def bulk(self, request):
+        from django.core.exceptions import ValidationError
+        from orders.services import bulk_create_orders
+
+        serializer = BulkOrderRequestSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+
+        try:
+            # PDFs are left for the render_invoice_pdfs command, not rendered in this request
+            orders = bulk_create_orders(serializer.validated_data['orders'], render_pdfs=False)
+        except ValidationError as e:
+            return Response({
+                'success': False,
+                'error': e.messages
+            }, status=status.HTTP_400_BAD_REQUEST)
 
-class OrderItemViewSet(viewsets.ModelViewSet):
+        return Response({
+            'success': True,
+            'count': len(orders),
+            'orders': OrderSummarySerializer(orders, many=True).data
+        }, status=status.HTTP_201_CREATED)
+
+
+class OrderItemViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = OrderItem.objects.all()
     serializer_class = OrderItemSerializer
+    version_scopes = ['orders', 'customers', 'products']
 
 
 class CustomerOrderDefaultsViewSet(viewsets.ModelViewSet):
@@ -220,12 +262,13 @@ class CustomerOrderDefaultsViewSet(viewsets.ModelViewSet):
 
 
 # Payment Views
-class PaymentViewSet(viewsets.ModelViewSet):
+class PaymentViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ModelViewSet):
     queryset = Payment.objects.all()
     filter_backends = [DjangoFilterBackend, SearchFilter, OrderingFilter]
     search_fields = ['reference_number', 'notes', 'customer__name']
     ordering_fields = ['payment_date', 'amount', 'created_at']
     ordering = ['-payment_date']
+    version_scopes = ['payments', 'orders', 'customers']
 
     def get_serializer_class(self):
         if self.action in ['create', 'update', 'partial_update']:
@@ -286,12 +329,13 @@ class PaymentViewSet(viewsets.ModelViewSet):
         return Response(serializer.data)
 
 
-class CustomerBalanceViewSet(viewsets.ReadOnlyModelViewSet):
+class CustomerBalanceViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = CustomerBalance.objects.all()
     serializer_class = CustomerBalanceSerializer
     filter_backends = [DjangoFilterBackend, OrderingFilter]
     ordering_fields = ['current_balance', 'last_updated']
     ordering = ['-current_balance']
+    version_scopes = ['balances', 'customers']
 
 
 class AccountStatementViewSet(viewsets.ModelViewSet):
@@ -303,9 +347,10 @@ class AccountStatementViewSet(viewsets.ModelViewSet):
 
 
 # Invoice Views
-class InvoiceViewSet(viewsets.ReadOnlyModelViewSet):
+class InvoiceViewSet(ConditionalGetMixin, SparseFieldsetMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Invoice.objects.all()
     serializer_class = InvoiceSerializer
+    version_scopes = ['invoices', 'orders', 'customers']
 
     @action(detail=True, methods=['post'], url_path='send-to-etims')
     def send_to_etims(self, request, pk=None):
@@ -446,7 +491,17 @@ class FarmBlockViewSet(viewsets.ModelViewSet):
 class DashboardStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @versioned('orders', 'payments', 'customers', 'credit_notes')
     def get(self, request):
+        data = cached_result(
+            'dashboard_stats',
+            {'date': timezone.now().date()},
+            ['orders', 'payments', 'customers', 'credit_notes'],
+            self.compute_stats,
+        )
+        return Response(data)
+
+    def compute_stats(self):
         # Basic statistics
         total_orders = Order.objects.count()
         total_sales = Order.objects.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
@@ -484,27 +539,19 @@ class DashboardStatsView(APIView):
         recent_payments = Payment.objects.filter(status='completed').order_by('-payment_date')[:10]
         recent_payments_data = PaymentSummarySerializer(recent_payments, many=True).data
 
-        # Monthly sales for the last 12 months
-        monthly_sales = []
-        for i in range(12):
-            month_start = timezone.now().replace(day=1) - timedelta(days=30 * i)
-            month_end = month_start + timedelta(days=30)
-
-            month_orders = Order.objects.filter(
-                date__gte=month_start,
-                date__lt=month_end
+        # Monthly sales for the last 12 calendar months (oldest to newest)
+        today = timezone.now().date()
+        monthly_sales = [
+            {
+                'month': bucket['period'].strftime('%Y-%m'),
+                'sales': str(bucket['total']),
+                'orders': bucket['count'],
+            }
+            for bucket in time_series(
+                Order.objects.all(), 'date', 'total_amount', 'month',
+                start=month_range_start(today, 12), end=today
             )
-
-            month_sales = month_orders.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
-            month_count = month_orders.count()
-
-            monthly_sales.append({
-                'month': month_start.strftime('%Y-%m'),
-                'sales': str(month_sales),
-                'orders': month_count
-            })
-
-        monthly_sales.reverse()  # Show oldest to newest
+        ]
 
         stats_data = {
             'total_orders': total_orders,
@@ -521,14 +568,27 @@ class DashboardStatsView(APIView):
         }
 
         serializer = DashboardStatsSerializer(stats_data)
-        return Response(serializer.data)
+        return serializer.data
 
 
 class SalesAnalyticsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @versioned('orders', 'customers')
     def get(self, request):
         period = request.query_params.get('period', '30d')
+        interval = request.query_params.get('interval', 'day')
+        if interval not in ('day', 'week', 'month'):
+            interval = 'day'
+        data = cached_result(
+            'sales_analytics',
+            {'period': period, 'interval': interval, 'date': timezone.now().date()},
+            ['orders', 'customers'],
+            lambda: self.compute_analytics(period, interval),
+        )
+        return Response(data)
+
+    def compute_analytics(self, period, interval='day'):
 
         # Calculate date range
         if period == '7d':
@@ -545,34 +605,59 @@ class SalesAnalyticsView(APIView):
         end_date = timezone.now().date()
         start_date = end_date - timedelta(days=days)
 
-        # Sales data
+        # Sales data, one zero-filled bucket per day/week/month
         orders = Order.objects.filter(date__gte=start_date, date__lte=end_date)
-        sales_data = orders.values('date').annotate(
-            total_sales=Sum('total_amount'),
-            order_count=Count('id')
-        ).order_by('date')
+        sales_data = [
+            {
+                'date': bucket['period'],
+                'total_sales': bucket['total'],
+                'order_count': bucket['count'],
+                'average_order_value': bucket['average'],
+            }
+            for bucket in time_series(orders, 'date', 'total_amount', interval, start_date, end_date)
+        ]
 
         # Customer data
         customers_data = orders.values('customer__name').annotate(
             total_sales=Sum('total_amount')
         ).order_by('-total_sales')[:10]
 
+        # Product data from the daily sales rollup
+        products_data = DailySalesFact.objects.filter(
+            date__gte=start_date, date__lte=end_date
+        ).values('product__name').annotate(
+            total_stems=Sum('stems'),
+            total_boxes=Sum('boxes'),
+        ).order_by('-total_stems')[:10]
+
         analytics_data = {
             'period': period,
-            'sales_data': list(sales_data),
-            'orders_data': list(sales_data),  # Same data, different view
-            'customers_data': list(customers_data)
+            'interval': interval,
+            'sales_data': sales_data,
+            'orders_data': sales_data,  # Same data, different view
+            'customers_data': list(customers_data),
+            'products_data': list(products_data),
         }
 
         serializer = SalesAnalyticsSerializer(analytics_data)
-        return Response(serializer.data)
+        return serializer.data
 
 
 class PaymentAnalyticsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @versioned('payments', 'customers')
     def get(self, request):
         period = request.query_params.get('period', '30d')
+        data = cached_result(
+            'payment_analytics',
+            {'period': period, 'date': timezone.now().date()},
+            ['payments', 'customers'],
+            lambda: self.compute_analytics(period),
+        )
+        return Response(data)
+
+    def compute_analytics(self, period):
 
         # Calculate date range
         if period == '7d':
@@ -625,6 +710,202 @@ class PaymentAnalyticsView(APIView):
         }
 
         serializer = PaymentAnalyticsSerializer(analytics_data)
-        return Response(serializer.data)
+        return serializer.data
+
+
+class ReceivablesAgingView(APIView):
+    """Outstanding receivables per customer and currency in aging buckets"""
+    permission_classes = [permissions.IsAuthenticated]
+
+    @versioned('orders', 'payments', 'credit_notes')
+    def get(self, request):
+        as_of = request.query_params.get('as_of')
+        if as_of:
+            try:
+                as_of = datetime.strptime(as_of, '%Y-%m-%d').date()
+            except ValueError:
+                return Response(
+                    {'error': 'as_of must be a date in YYYY-MM-DD format'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+        summary = aging_summary(as_of or None)
+        return Response(dict(summary, buckets=[
+            {'key': key, 'label': label, 'min_days': min_days} for key, label, min_days in AGING_BUCKETS
+        ]))
+
+
+class AnalyticsCacheStatsView(APIView):
+    """Hit ratios of this process's analytics result cache and price resolver"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(dict(cache_stats(), price_resolver=price_cache_stats()))
+
+
+# Batch Operations
+class BatchAborted(Exception):
+    """Raised inside the batch transaction to roll back every operation."""
+
+    def __init__(self, index, status_code, error):
+        super().__init__(error)
+        self.index = index
+        self.status_code = status_code
+        self.error = error
+
+
+class BatchView(APIView):
+    """
+    Run an ordered list of create/update/delete operations against the
+    registered viewsets in a single transaction.
+
+    Each operation may carry a ``ref``; later operations can use ``"$<ref>"``
+    anywhere in ``id`` or ``data`` to refer to the primary key of the object
+    created under that ref. Invoice PDFs, customer balances and credit note
+    totals are recomputed once per affected object when the batch completes.
+    """
+    permission_classes = [permissions.IsAuthenticated]
 
+    REF_PATTERN = re.compile(r'^\$([A-Za-z_][\w-]*)$')
+    VIEWSET_METHODS = {
+        'create': 'create',
+        'update': 'update',
+        'partial_update': 'partial_update',
+        'delete': 'destroy',
+    }
+
+    def post(self, request):
+        request_serializer = BatchRequestSerializer(data=request.data)
+        request_serializer.is_valid(raise_exception=True)
+        operations = request_serializer.validated_data['operations']
+
+        from .urls import router
+        registry = {prefix: viewset for prefix, viewset, basename in router.registry}
+
+        results = []
+        try:
+            with transaction.atomic():
+                try:
+                    with coalesce_signals():
+                        refs = {}
+                        executed = []
+                        for index, op in enumerate(operations):
+                            viewset_class = registry.get(op['resource'])
+                            if viewset_class is None:
+                                raise BatchAborted(index, status.HTTP_404_NOT_FOUND,
+                                                   f"Unknown resource '{op['resource']}'.")
+                            if not hasattr(viewset_class, self.VIEWSET_METHODS[op['method']]):
+                                raise BatchAborted(index, status.HTTP_405_METHOD_NOT_ALLOWED,
+                                                   f"'{op['method']}' is not supported on '{op['resource']}'.")
+
+                            try:
+                                view, instance, status_code = self._execute(request, viewset_class, op, refs)
+                            except BatchAborted:
+                                raise
+                            except Exception as e:
+                                status_code, error = self._describe_error(e)
+                                raise BatchAborted(index, status_code, error)
+
+                            if op.get('ref') and instance is not None:
+                                refs[op['ref']] = instance.pk
+                            executed.append((index, op, view, instance, status_code))
+                except BatchAborted:
+                    raise
+                except Exception as e:
+                    # Coalesced side effects run when the block exits; a failure
+                    # there belongs to no single operation
+                    status_code, error = self._describe_error(e)
+                    raise BatchAborted(None, status_code, error)
+
+                # Coalesced side effects have run; serialize the final state
+                for index, op, view, instance, status_code in executed:
+                    results.append(self._result(index, op, view, instance, status_code))
+        except BatchAborted as e:
+            return Response({
+                'success': False,
+                'failed_index': e.index,
+                'error': e.error,
+            }, status=e.status_code)
+
+        return Response({
+            'success': True,
+            'results': results,
+        })
+
+    def _execute(self, request, viewset_class, op, refs):
+        method = op['method']
+        action = self.VIEWSET_METHODS[method]
+        data = self._resolve_refs(op.get('data') or {}, refs)
+
+        view = viewset_class(request=request, format_kwarg=None, args=(), kwargs={}, action=action)
+        if op.get('id') is not None:
+            lookup_url_kwarg = view.lookup_url_kwarg or view.lookup_field
+            view.kwargs = {lookup_url_kwarg: str(self._resolve_refs(op['id'], refs))}
+        view.check_permissions(request)
+
+        if method == 'create':
+            serializer = view.get_serializer(data=data)
+            serializer.is_valid(raise_exception=True)
+            view.perform_create(serializer)
+            return view, serializer.instance, status.HTTP_201_CREATED
+
+        instance = view.get_object()
+        if method == 'delete':
+            view.perform_destroy(instance)
+            return view, None, status.HTTP_204_NO_CONTENT
+
+        serializer = view.get_serializer(instance, data=data, partial=(method == 'partial_update'))
+        serializer.is_valid(raise_exception=True)
+        view.perform_update(serializer)
+        return view, serializer.instance, status.HTTP_200_OK
+
+    def _resolve_refs(self, value, refs):
+        """Replace "$<ref>" strings with the primary key created under that ref"""
+        if isinstance(value, dict):
+            return {key: self._resolve_refs(item, refs) for key, item in value.items()}
+        if isinstance(value, list):
+            return [self._resolve_refs(item, refs) for item in value]
+        if isinstance(value, str):
+            match = self.REF_PATTERN.match(value)
+            if match and match.group(1) in refs:
+                pk = refs[match.group(1)]
+                return pk if isinstance(pk, int) else str(pk)
+        return value
+
+    def _result(self, index, op, view, instance, status_code):
+        result = {
+            'index': index,
+            'method': op['method'],
+            'resource': op['resource'],
+            'status': status_code,
+        }
+        if op.get('ref'):
+            result['ref'] = op['ref']
+        if instance is None:
+            result['id'] = view.kwargs.get(view.lookup_url_kwarg or view.lookup_field)
+            return result
+
+        try:
+            instance.refresh_from_db()
+        except instance.__class__.DoesNotExist:
+            # Removed by a later operation in the same batch
+            result['id'] = instance.pk if isinstance(instance.pk, int) else str(instance.pk)
+            return result
+
+        view.action = 'retrieve'
+        result['id'] = instance.pk if isinstance(instance.pk, int) else str(instance.pk)
+        result['data'] = view.get_serializer(instance).data
+        return result
+
+    def _describe_error(self, exc):
+        from django.core.exceptions import ValidationError as DjangoValidationError, ObjectDoesNotExist
+        from django.http import Http404
+        from rest_framework.exceptions import APIException
+
+        if isinstance(exc, APIException):
+            return exc.status_code, exc.detail
+        if isinstance(exc, (Http404, ObjectDoesNotExist)):
+            return status.HTTP_404_NOT_FOUND, str(exc) or 'Not found.'
+        if isinstance(exc, DjangoValidationError):
+            return status.HTTP_400_BAD_REQUEST, exc.messages
+        return status.HTTP_500_INTERNAL_SERVER_ERROR, str(exc)
 
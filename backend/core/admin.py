@@ -1,3 +1,10 @@
 from django.contrib import admin
 
-# Register your models here.
+from .models import DataVersion
+
+
+@admin.register(DataVersion)
+class DataVersionAdmin(admin.ModelAdmin):
+    list_display = ('scope', 'version', 'updated_at')
+    search_fields = ('scope',)
+    readonly_fields = ('scope', 'version', 'updated_at')
@@ -0,0 +1,81 @@
+"""
+Signal coalescing for bulk writes.
+
+Saving an Order, PaymentAllocation or CreditNoteItem fires receivers that
+regenerate invoice PDFs, recalculate customer balances and recompute credit
+note totals. When many rows are written in one go (API batches, bulk imports)
+those side effects only need to run once per affected object at the end.
+
+Receivers call ``run_or_defer(key, func, *args)``: outside a
+``coalesce_signals()`` block the function runs immediately (unchanged
+behaviour); inside one it is queued under ``key`` and runs once when the
+outermost block exits. ``collect_or_run(key, func, items)`` does the same for
+functions taking a list, merging the items of every call under ``key``.
+"""
+import logging
+import threading
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+_state = threading.local()
+
+
+def is_coalescing():
+    """Return True while inside a coalesce_signals() block on this thread."""
+    return getattr(_state, 'pending', None) is not None
+
+
+def run_or_defer(key, func, *args, **kwargs):
+    """
+    Run ``func`` now, or queue it until the active coalescing block exits.
+
+    Calls queued under the same key are collapsed: the last registration wins
+    but keeps the position of the first, so work runs in first-touched order.
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        return func(*args, **kwargs)
+    pending[key] = (func, args, kwargs)
+    return None
+
+
+def collect_or_run(key, func, items):
+    """
+    Like run_or_defer() for a function taking a list: ``func(items)`` runs now,
+    or, inside a coalesce_signals() block, the items of every call under
+    ``key`` are merged and ``func`` runs once with all of them at block exit.
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        return func(list(items))
+    if key in pending:
+        pending[key][1][0].extend(items)
+    else:
+        pending[key] = (func, (list(items),), {})
+    return None
+
+
+@contextmanager
+def coalesce_signals():
+    """
+    Defer coalescable signal side effects until the block exits.
+
+    Nested blocks join the outermost one. If the block raises, queued work is
+    discarded (the caller's transaction is expected to roll back as well).
+    """
+    if is_coalescing():
+        yield
+        return
+
+    _state.pending = {}
+    try:
+        yield
+    except BaseException:
+        _state.pending = None
+        raise
+
+    pending, _state.pending = _state.pending, None
+    for key, (func, args, kwargs) in pending.items():
+        logger.debug("Running coalesced signal work for %s", key)
+        func(*args, **kwargs)
@@ -0,0 +1,181 @@
+"""
+Home dashboard metrics, cached per target currency and data version.
+
+The dashboard only varies by the viewer's preferred currency and the day, so
+each variant is computed once per data version and shared by every user.
+The warm_home_dashboard command recomputes every currency variant in use; run
+it from one scheduler (cron) so interactive loads hit the cache after changes.
+"""
+import logging
+from decimal import Decimal
+
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .result_cache import cached_result
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CURRENCY = 'KES'
+HOME_SCOPES = ['orders', 'payments', 'expenses', 'credit_notes', 'exchange_rates']
+
+
+def _compute_home(target_currency, today):
+    from orders.models import Order, DailySalesFact
+    from payments.models import Payment
+    from expenses.models import Expense
+    from invoices.models import CreditNote
+    from payments.conversion import base_in_target, load_rates
+
+    # Date range for current month
+    start_of_month = today.replace(day=1)
+    # End of month computation
+    if start_of_month.month == 12:
+        end_of_month = start_of_month.replace(year=start_of_month.year + 1, month=1, day=1) - timezone.timedelta(days=1)
+    else:
+        end_of_month = start_of_month.replace(month=start_of_month.month + 1, day=1) - timezone.timedelta(days=1)
+
+    # Totals are SUM(amount_base) (KSH frozen at each document's date) scaled to the target currency
+    rates = load_rates()
+
+    def in_target(amount_field):
+        return base_in_target('amount_base', amount_field, 'currency', target_currency, rates)
+
+    def total_in_target(queryset, amount_field):
+        return queryset.aggregate(total=Sum(in_target(amount_field)))['total'] or Decimal('0.00')
+
+    # 1. Month Total Sales (Total Order Value Converted)
+    month_orders = Order.objects.filter(
+        date__gte=start_of_month,
+        date__lte=end_of_month
+    )
+    month_sales = total_in_target(month_orders, 'total_amount')
+
+    # 2. Month Total Revenue (Payments Completed Converted)
+    month_payments_qs = Payment.objects.filter(
+        payment_date__gte=start_of_month,
+        payment_date__lte=end_of_month,
+        status='completed'
+    )
+    month_revenue = total_in_target(month_payments_qs, 'amount')
+
+    # 3. Month Total Expenses (Converted)
+    month_expenses_qs = Expense.objects.filter(
+        date_incurred__gte=start_of_month,
+        date_incurred__lte=end_of_month
+    )
+    month_expenses = total_in_target(month_expenses_qs, 'amount')
+
+    # 4. Order Status Counts
+    status_counts = month_orders.aggregate(
+        paid=Count('id', filter=Q(status='paid')),
+        pending=Count('id', filter=Q(status='pending')),
+    )
+    paid_orders_count = status_counts['paid']
+    unpaid_orders_count = status_counts['pending']
+
+    # 5. Total Credits (Converted)
+    month_credits_qs = CreditNote.objects.filter(
+        created_at__date__gte=start_of_month,
+        created_at__date__lte=end_of_month,
+        status='approved'
+    )
+    month_credits = total_in_target(month_credits_qs, 'total_amount')
+
+    # 6. Most Ordered Product (from the daily sales rollup)
+    top_product_data = DailySalesFact.objects.filter(
+        date__gte=start_of_month,
+        date__lte=end_of_month
+    ).values('product__name').annotate(
+        total_qty=Sum('stems')
+    ).order_by('-total_qty').first()
+
+    top_product = top_product_data['product__name'] if top_product_data else "N/A"
+    top_product_qty = top_product_data['total_qty'] if top_product_data else 0
+
+    # 7. Highest Ordering Customer (Converted Amount)
+    top_customer_data = month_orders.values('customer__name').annotate(
+        total=Sum(in_target('total_amount'))
+    ).order_by('-total').first()
+
+    if top_customer_data:
+        top_customer = top_customer_data['customer__name']
+        top_customer_amount = top_customer_data['total']
+    else:
+        top_customer = "N/A"
+        top_customer_amount = 0
+
+    # Recent Orders (Limit 5)
+    recent_orders = list(Order.objects.select_related('customer').order_by('-date')[:5])
+
+    # Unified Transaction Feed (Limit 5)
+    # Payments
+    recent_payments = Payment.objects.filter(status='completed').select_related('customer').order_by('-payment_date')[:5]
+    payment_list = [{
+        'type': 'payment',
+        'date': p.payment_date,
+        'description': f"Payment from {p.customer.name}",
+        'amount': p.amount,
+        'currency': p.currency,
+        'reference': p.reference_number
+    } for p in recent_payments]
+
+    # Expenses
+    recent_expenses = Expense.objects.select_related('category').order_by('-date_incurred')[:5]
+    expense_list = [{
+        'type': 'expense',
+        'date': e.date_incurred,
+        'description': f"{e.category.name if e.category else 'Expense'}: {e.name}",
+        'amount': e.amount,
+        'currency': e.currency,
+        'reference': e.reference_number
+    } for e in recent_expenses]
+
+    # Combine and Sort
+    recent_transactions = sorted(payment_list + expense_list, key=lambda x: x['date'], reverse=True)[:5]
+
+    return {
+        'current_month': start_of_month.strftime('%B %Y'),
+        'currency_label': target_currency,
+        'metrics': {
+            'total_sales': month_sales,
+            'revenue': month_revenue,
+            'expenses': month_expenses,
+            'paid_orders': paid_orders_count,
+            'unpaid_orders': unpaid_orders_count,
+            'credits': month_credits,
+            'top_product': top_product,
+            'top_product_qty': top_product_qty,
+            'top_customer': top_customer,
+            'top_customer_amount': top_customer_amount,
+        },
+        'recent_transactions': recent_transactions,
+        'recent_orders': recent_orders,
+    }
+
+
+def home_dashboard(target_currency=DEFAULT_CURRENCY, today=None):
+    """Home page context for ``target_currency``, cached until HOME_SCOPES change"""
+    today = today or timezone.now().date()
+    return cached_result(
+        'home_dashboard', {'currency': target_currency, 'today': today}, HOME_SCOPES,
+        lambda: _compute_home(target_currency, today),
+    )
+
+
+def home_currencies():
+    """Target currencies users currently view the dashboard in"""
+    from .models import UserPreference
+
+    currencies = set(UserPreference.objects.values_list('currency', flat=True).distinct())
+    currencies.add(DEFAULT_CURRENCY)
+    return sorted(currencies)
+
+
+def warm_home_dashboard():
+    """Compute (or reuse) every currency variant of the home dashboard"""
+    currencies = home_currencies()
+    for currency in currencies:
+        home_dashboard(currency)
+    return currencies
+
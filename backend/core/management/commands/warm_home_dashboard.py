@@ -0,0 +1,9 @@
+from django.core.management.base import BaseCommand
+from core.dashboard import warm_home_dashboard
+
+class Command(BaseCommand):
+    help = 'Precomputes the home dashboard for every currency in use (e.g. after deploys or at midnight)'
+
+    def handle(self, *args, **options):
+        currencies = warm_home_dashboard()
+        self.stdout.write(self.style.SUCCESS(f"Warmed home dashboard for {', '.join(currencies)}"))
@@ -76,3 +76,16 @@ class EmailConfig(models.Model):
         return f"Email Config for {self.user.username}"
 
 # Signal to create EmailConfig automatically? Maybe not, better to let them configure it manually.
+
+
+class DataVersion(models.Model):
+    """
+    Monotonic change counter per data scope (e.g. 'orders', 'customer:12').
+    Bumped by model signals; used for API ETags and cache keys.
+    """
+    scope = models.CharField(max_length=100, unique=True)
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.scope} v{self.version}"
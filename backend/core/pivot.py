@@ -0,0 +1,69 @@
+"""
+Dense two-way pivots for charts (customer x product, stem length x product,
+month x customer, ...).
+
+Rows of (row label, column label, value) are factorized once into integer
+codes and accumulated into a NumPy matrix; top-N selection and chart
+datasets are then vectorized slices of that matrix.
+
+    mix = Pivot.from_records(qs, 'customer__name', 'product__name', 'total_qty')
+    chart = mix.top(rows=10, columns=5).chart_data()
+"""
+import numpy as np
+
+
+class Pivot:
+    def __init__(self, row_labels, column_labels, matrix):
+        self.row_labels = row_labels
+        self.column_labels = column_labels
+        self.matrix = matrix
+
+    @classmethod
+    def from_records(cls, records, row_key, column_key, value_key):
+        """Build from dicts (e.g. a values() queryset); repeated cells are summed"""
+        records = list(records)
+        if not records:
+            return cls(np.array([]), np.array([]), np.zeros((0, 0), dtype=np.int64))
+
+        row_values = np.array([r[row_key] for r in records])
+        column_values = np.array([r[column_key] for r in records])
+        values = np.array([r[value_key] or 0 for r in records])
+        if values.dtype == object:
+            # Decimal sums
+            values = values.astype(np.float64)
+
+        row_labels, row_codes = np.unique(row_values, return_inverse=True)
+        column_labels, column_codes = np.unique(column_values, return_inverse=True)
+
+        matrix = np.zeros((len(row_labels), len(column_labels)), dtype=values.dtype)
+        np.add.at(matrix, (row_codes, column_codes), values)
+        return cls(row_labels, column_labels, matrix)
+
+    def row_totals(self):
+        return self.matrix.sum(axis=1)
+
+    def column_totals(self):
+        return self.matrix.sum(axis=0)
+
+    def top(self, rows=None, columns=None):
+        """
+        Keep the ``rows`` largest rows and ``columns`` largest columns by total,
+        both ranked over the full matrix, in descending order.
+        """
+        row_index = np.argsort(-self.row_totals(), kind='stable')[:rows]
+        column_index = np.argsort(-self.column_totals(), kind='stable')[:columns]
+        return Pivot(
+            self.row_labels[row_index],
+            self.column_labels[column_index],
+            self.matrix[np.ix_(row_index, column_index)],
+        )
+
+    def chart_data(self):
+        """Chart.js shape: labels are rows, one dataset per column"""
+        return {
+            'labels': self.row_labels.tolist(),
+            'datasets': [
+                {'label': label, 'data': data}
+                for label, data in zip(self.column_labels.tolist(), self.matrix.T.tolist())
+            ],
+        }
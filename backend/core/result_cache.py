@@ -0,0 +1,99 @@
+"""
+Versioned result cache for expensive read-only computations (analytics).
+
+Entries are keyed by name, parameters and the data version token of the
+scopes the result depends on (see core.versioning), so a committed change to
+any of those scopes makes old entries unreachable without explicit deletes.
+
+On a miss only one caller recomputes: it takes a short-lived lock in the
+cache while concurrent callers poll for the fresh entry instead of all
+hitting the database at once. Entries and locks are only shared between
+worker processes when the cache backend is (settings.CACHES defaults to the
+database cache for that reason). Hits and misses are counted per name in
+process memory, like the price resolver's, so a hit costs no cache writes.
+"""
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .versioning import version_token
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = 'result_cache'
+DEFAULT_TIMEOUT = getattr(settings, 'RESULT_CACHE_TIMEOUT', 60 * 15)
+LOCK_TIMEOUT = getattr(settings, 'RESULT_CACHE_LOCK_TIMEOUT', 30)
+WAIT_INTERVAL = 0.1
+
+_stats_lock = threading.Lock()
+_stats = {}
+
+
+def _digest(value):
+    raw = json.dumps(value, sort_keys=True, default=str)
+    return hashlib.md5(raw.encode('utf-8')).hexdigest()
+
+
+def _count(name, outcome):
+    with _stats_lock:
+        counts = _stats.setdefault(name, {'hits': 0, 'misses': 0})
+        counts[outcome] += 1
+
+
+def cached_result(name, params, scopes, compute, timeout=None):
+    """
+    Return ``compute()`` for (name, params), reusing a cached value while the
+    data versions of ``scopes`` are unchanged.
+    """
+    token, _ = version_token(scopes)
+    key = f"{KEY_PREFIX}:{name}:{_digest(params)}:{_digest(token)}"
+    lock_key = f"{key}:lock"
+
+    result = cache.get(key)
+    if result is not None:
+        _count(name, 'hits')
+        return result
+
+    locked = cache.add(lock_key, 1, LOCK_TIMEOUT)
+    if not locked:
+        # Someone else is computing this entry; wait for it rather than stampede
+        deadline = time.monotonic() + LOCK_TIMEOUT
+        while time.monotonic() < deadline:
+            time.sleep(WAIT_INTERVAL)
+            result = cache.get(key)
+            if result is not None:
+                _count(name, 'hits')
+                return result
+            if cache.get(lock_key) is None:
+                break
+        logger.warning("No cached result for %s after waiting on the lock; computing it here", name)
+
+    try:
+        _count(name, 'misses')
+        result = compute()
+        cache.set(key, result, DEFAULT_TIMEOUT if timeout is None else timeout)
+    finally:
+        if locked:
+            cache.delete(lock_key)
+    return result
+
+
+def cache_stats():
+    """Hit/miss counters and hit ratio per cached name, in this process"""
+    with _stats_lock:
+        counts = {name: dict(outcomes) for name, outcomes in _stats.items()}
+    stats = {}
+    for name, outcomes in counts.items():
+        total = outcomes['hits'] + outcomes['misses']
+        stats[name] = dict(outcomes, hit_ratio=round(outcomes['hits'] / total, 4) if total else None)
+    return stats
+
+
+def reset_cache_stats():
+    with _stats_lock:
+        _stats.clear()
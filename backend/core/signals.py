@@ -0,0 +1,48 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from customers.models import Customer, Branch
+from products.models import Product, CustomerProductPrice
+from orders.models import Order, OrderItem, OrderBox, MissedSale, CustomerOrderDefaults
+from payments.models import Payment, PaymentAllocation, CustomerBalance, ExchangeRate, ExchangeRateHistory
+from invoices.models import Invoice, CreditNote, CreditNoteItem
+from expenses.models import Expense
+from .versioning import bump_version, customer_scope
+
+
+# Scopes touched by a change to each model
+VERSION_SCOPES = {
+    Customer: lambda obj: ['customers', customer_scope(obj.pk)],
+    Branch: lambda obj: ['customers'],
+    Product: lambda obj: ['products'],
+    CustomerProductPrice: lambda obj: ['products', customer_scope(obj.customer_id)],
+    Order: lambda obj: ['orders', customer_scope(obj.customer_id)],
+    OrderItem: lambda obj: ['orders', customer_scope(obj.order.customer_id)],
+    OrderBox: lambda obj: ['orders'],
+    CustomerOrderDefaults: lambda obj: [customer_scope(obj.customer_id)],
+    MissedSale: lambda obj: ['missed_sales'],
+    Payment: lambda obj: ['payments', customer_scope(obj.customer_id)],
+    PaymentAllocation: lambda obj: ['payments', 'orders', customer_scope(obj.payment.customer_id)],
+    CustomerBalance: lambda obj: ['balances', customer_scope(obj.customer_id)],
+    Invoice: lambda obj: ['invoices'],
+    CreditNote: lambda obj: ['credit_notes', customer_scope(obj.customer_id)],
+    CreditNoteItem: lambda obj: ['credit_notes', 'orders', customer_scope(obj.credit_note.customer_id)],
+    Expense: lambda obj: ['expenses'],
+    ExchangeRate: lambda obj: ['exchange_rates'],
+    ExchangeRateHistory: lambda obj: ['exchange_rates'],
+}
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_data_version(sender, instance, **kwargs):
+    """Bump the data version of every scope the saved/deleted row belongs to"""
+    scopes_for = VERSION_SCOPES.get(sender)
+    if scopes_for is None or kwargs.get('raw'):
+        return
+    try:
+        scopes = scopes_for(instance)
+    except Exception:
+        # Parent row already gone (cascade delete); the parent's own signal covers it
+        return
+    bump_version(*scopes)
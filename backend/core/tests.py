@@ -1,3 +1,46 @@
+from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 
-# Create your tests here.
+from .result_cache import cache_stats, cached_result, reset_cache_stats
+from .versioning import _increment, bump_version, get_versions
+
+
+class ResultCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        reset_cache_stats()
+        self.calls = 0
+
+    def compute(self):
+        self.calls += 1
+        return {'total': self.calls}
+
+    def test_reuses_result_until_scope_changes(self):
+        self.assertEqual(cached_result('sales', {'year': 2026}, ['orders'], self.compute), {'total': 1})
+        self.assertEqual(cached_result('sales', {'year': 2026}, ['orders'], self.compute), {'total': 1})
+        _increment('orders')
+        self.assertEqual(cached_result('sales', {'year': 2026}, ['orders'], self.compute), {'total': 2})
+        self.assertEqual(cache_stats()['sales'], {'hits': 1, 'misses': 2, 'hit_ratio': 0.3333})
+
+    def test_hit_does_not_write_to_cache(self):
+        cached_result('sales', {'year': 2026}, ['orders'], self.compute)
+        with CaptureQueriesContext(connection) as queries:
+            cached_result('sales', {'year': 2026}, ['orders'], self.compute)
+        self.assertFalse([q['sql'] for q in queries if not q['sql'].lstrip().upper().startswith('SELECT')])
+
+
+class BumpVersionTests(TestCase):
+    def version(self, scope):
+        return get_versions([scope])[scope][0]
+
+    def test_scope_incremented_once_per_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(40):
+                bump_version('orders', 'customer:1')
+        self.assertEqual((self.version('orders'), self.version('customer:1')), (1, 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_version('orders')
+        self.assertEqual(self.version('orders'), 2)
@@ -0,0 +1,96 @@
+"""
+Calendar-bucketed time series from a single GROUP BY query.
+
+``time_series(Order.objects.all(), 'date', 'total_amount', 'month', start, end)``
+returns one row per calendar day/week/month between ``start`` and ``end``
+with the sum, count and average of ``value_field``; buckets without rows are
+filled with zeros so charts get a continuous axis.
+"""
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncDay, TruncMonth, TruncWeek
+
+TRUNCATORS = {
+    'day': TruncDay,
+    'week': TruncWeek,
+    'month': TruncMonth,
+}
+
+
+def bucket_start(value, period):
+    """First day of the bucket containing ``value``"""
+    if isinstance(value, datetime):
+        value = value.date()
+    if period == 'month':
+        return value.replace(day=1)
+    if period == 'week':
+        return value - timedelta(days=value.weekday())
+    return value
+
+
+def next_bucket(value, period):
+    if period == 'month':
+        return (value.replace(day=28) + timedelta(days=4)).replace(day=1)
+    if period == 'week':
+        return value + timedelta(days=7)
+    return value + timedelta(days=1)
+
+
+def month_range_start(end, months):
+    """First day of the month ``months - 1`` calendar months before ``end``"""
+    year, month = end.year, end.month - (months - 1)
+    while month < 1:
+        month += 12
+        year -= 1
+    return date(year, month, 1)
+
+
+def time_series(queryset, date_field, value_field, period='month', start=None, end=None):
+    """
+    Return [{'period': date, 'total': Decimal, 'count': int, 'average': Decimal}, ...]
+    ordered by period. Gaps are zero-filled when both ``start`` and ``end`` are given.
+    """
+    if period not in TRUNCATORS:
+        raise ValueError(f"Unsupported period '{period}'")
+
+    if start:
+        queryset = queryset.filter(**{f"{date_field}__gte": start})
+    if end:
+        queryset = queryset.filter(**{f"{date_field}__lte": end})
+
+    if queryset.query.distinct:
+        # Joined filters (e.g. orders containing a product) would repeat rows in the GROUP BY
+        queryset = queryset.model._default_manager.filter(pk__in=queryset.values('pk'))
+
+    rows = (
+        queryset
+        .order_by()
+        .annotate(bucket=TRUNCATORS[period](date_field, output_field=DateField()))
+        .values('bucket')
+        .annotate(total=Sum(value_field), count=Count('pk'))
+    )
+    found = {bucket_start(row['bucket'], period): row for row in rows}
+
+    if start and end:
+        buckets = []
+        current = bucket_start(start, period)
+        while current <= end:
+            buckets.append(current)
+            current = next_bucket(current, period)
+    else:
+        buckets = sorted(found)
+
+    series = []
+    for bucket in buckets:
+        row = found.get(bucket)
+        total = (row['total'] if row else None) or Decimal('0.00')
+        count = row['count'] if row else 0
+        series.append({
+            'period': bucket,
+            'total': total,
+            'count': count,
+            'average': total / count if count else Decimal('0.00'),
+        })
+    return series
@@ -0,0 +1,81 @@
+"""
+Data version stamps.
+
+Each scope ('orders', 'payments', 'customer:12', ...) has a counter in
+DataVersion that is incremented after any committed change to the data it
+covers. Readers combine the counters of the scopes a response depends on
+into an ETag or cache key, so "has anything changed?" is a single indexed
+query instead of recomputing the response.
+"""
+import threading
+from functools import partial
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .coalesce import run_or_defer
+
+_local = threading.local()
+
+
+def customer_scope(customer_id):
+    """Scope covering everything shown for a single customer"""
+    return f"customer:{customer_id}"
+
+
+def _increment(scope):
+    from .models import DataVersion
+
+    now = timezone.now()
+    if DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=now):
+        return
+    try:
+        DataVersion.objects.create(scope=scope, version=1)
+    except IntegrityError:
+        # Created concurrently; count this change on the existing row
+        DataVersion.objects.filter(scope=scope).update(version=F('version') + 1, updated_at=now)
+
+
+def _increment_once(scope):
+    bumped = getattr(_local, 'bumped', None)
+    if bumped is None:
+        bumped = _local.bumped = set()
+    if scope in bumped:
+        return
+    bumped.add(scope)
+    _increment(scope)
+
+
+def bump_version(*scopes):
+    """
+    Mark scopes as changed once the current transaction commits; however
+    many rows it wrote, each scope is incremented once per commit.
+    Inside a coalesce_signals() block each scope is also queued once.
+    """
+    # A transaction's commit hooks all run after its last bump_version() call,
+    # so a scope already incremented since that call is covered by that increment
+    _local.bumped = set()
+    for scope in scopes:
+        run_or_defer(('data_version', scope), transaction.on_commit, partial(_increment_once, scope))
+
+
+def get_versions(scopes):
+    """Return {scope: (version, updated_at)} for the given scopes (missing -> (0, None))"""
+    from .models import DataVersion
+
+    versions = {scope: (0, None) for scope in scopes}
+    for row in DataVersion.objects.filter(scope__in=list(scopes)):
+        versions[row.scope] = (row.version, row.updated_at)
+    return versions
+
+
+def version_token(scopes):
+    """
+    Combined stamp for a set of scopes: (token string, latest updated_at).
+    The token changes whenever any of the scopes is bumped.
+    """
+    versions = get_versions(scopes)
+    token = ';'.join(f"{scope}={versions[scope][0]}" for scope in sorted(versions))
+    stamps = [updated_at for version, updated_at in versions.values() if updated_at]
+    return token, (max(stamps) if stamps else None)
@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('expenses', '0002_auto_20251226_2216'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='expense',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Amount in KSH at the rate on the date incurred', max_digits=15, null=True),
+        ),
+    ]
@@ -39,6 +39,8 @@ class Expense(models.Model):
         help_text="Amount of the expense"
     )
     currency = models.CharField(max_length=3, choices=CURRENCY_CHOICES, default='KSH')
+    amount_base = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False,
+                                      help_text="Amount in KSH at the rate on the date incurred")
     reference_number = models.CharField(
         max_length=100,
         blank=True,
@@ -106,6 +108,15 @@ class Expense(models.Model):
     def __str__(self):
         return f"{self.name} - {self.amount} {self.currency}"
 
+    def save(self, *args, **kwargs):
+        # Freeze the KSH value at the rate in effect on the date incurred
+        from payments.models import ExchangeRate
+        self.amount_base = ExchangeRate.to_base(self.amount, self.currency, self.date_incurred)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'amount', 'currency', 'date_incurred'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'amount_base'}
+        super().save(*args, **kwargs)
+
     def get_total_with_currency(self):
         """Return formatted amount with currency"""
         return f"{self.amount} {self.currency}"
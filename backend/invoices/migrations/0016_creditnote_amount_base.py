@@ -0,0 +1,18 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('invoices', '0015_auto_20260502_1155'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='creditnote',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Total in KSH at the rate on the credit note date', max_digits=15, null=True),
+        ),
+    ]
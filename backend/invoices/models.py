@@ -7,6 +7,7 @@ from django.core.exceptions import ValidationError
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
+from core.coalesce import run_or_defer
 
 class ETIMSSettings(models.Model):
     """Singleton model for storing KRA eTIMS API configurations"""
@@ -65,6 +66,8 @@ class CreditNote(models.Model):
     
     total_amount = models.DecimalField(max_digits=15, decimal_places=2, default=0, editable=False)
     currency = models.CharField(max_length=3, choices=Customer.CURRENCY_CHOICES)
+    amount_base = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False,
+                                      help_text="Total in KSH at the rate on the credit note date")
     
     reason = models.TextField(help_text="Reason for the credit note")
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
@@ -82,6 +85,14 @@ class CreditNote(models.Model):
     def save(self, *args, **kwargs):
         if not self.currency:
             self.currency = self.customer.preferred_currency
+        # Freeze the KSH value at the rate in effect when the note was raised
+        from payments.models import ExchangeRate
+        self.amount_base = ExchangeRate.to_base(
+            self.total_amount, self.currency, self.created_at or timezone.now()
+        )
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'total_amount', 'currency'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'amount_base'}
         super().save(*args, **kwargs)
 
     def calculate_total(self):
@@ -165,10 +176,17 @@ def generate_credit_note_code(sender, instance, **kwargs):
         import uuid
         instance.code = f"TEMP-{uuid.uuid4().hex[:8].upper()}"
 
+def _recalculate_credit_note_total(credit_note_id):
+    credit_note = CreditNote.objects.filter(pk=credit_note_id).first()
+    if credit_note is not None:
+        credit_note.calculate_total()
+
 @receiver(post_save, sender=CreditNoteItem)
 def update_credit_note_total(sender, instance, **kwargs):
-    instance.credit_note.calculate_total()
+    run_or_defer(('credit_note_total', instance.credit_note_id),
+                 _recalculate_credit_note_total, instance.credit_note_id)
 
 @receiver(models.signals.post_delete, sender=CreditNoteItem)
 def update_credit_note_total_on_delete(sender, instance, **kwargs):
-    instance.credit_note.calculate_total()
+    run_or_defer(('credit_note_total', instance.credit_note_id),
+                 _recalculate_credit_note_total, instance.credit_note_id)
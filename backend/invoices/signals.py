@@ -1,15 +1,38 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from orders.models import Order
+from core.coalesce import run_or_defer
 from .models import Invoice
 from .utils import generate_invoice_pdf
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 @receiver(post_save, sender=Order)
 def create_or_update_invoice_for_order(sender, instance, **kwargs):
-    invoice, created = Invoice.objects.get_or_create(order=instance, defaults={'invoice_code': instance.invoice_code})
+    """
+    Auto-create or update the Invoice when an Order is saved and regenerate
+    its PDF. This is the only Order receiver queued under ('invoice_pdf', pk).
+    """
+    run_or_defer(('invoice_pdf', instance.pk), _regenerate_invoice_for_order, instance.pk)
+
+
+def _regenerate_invoice_for_order(order_id):
+    instance = Order.objects.filter(pk=order_id).first()
+    if instance is None:
+        return
+    try:
+        invoice, created = Invoice.objects.get_or_create(order=instance, defaults={'invoice_code': instance.invoice_code})
+
+        # If invoice code somehow differs (e.g. order code changed), update it
+        if invoice.invoice_code != instance.invoice_code:
+            invoice.invoice_code = instance.invoice_code
+            invoice.save(update_fields=['invoice_code'])
 
-    if not created and invoice.pdf_file and os.path.isfile(invoice.pdf_file.path):
-        os.remove(invoice.pdf_file.path)
+        if not created and invoice.pdf_file and os.path.isfile(invoice.pdf_file.path):
+            os.remove(invoice.pdf_file.path)
 
-    generate_invoice_pdf(invoice)
+        generate_invoice_pdf(invoice)
+    except Exception as e:
+        logger.error(f"Error handling invoice for order {instance.invoice_code}: {e}")
@@ -3,8 +3,10 @@ from django.utils.html import format_html
 from django.urls import path
 from django.http import JsonResponse
 from django.template.response import TemplateResponse
-from .models import Order, OrderItem, OrderBox, CustomerOrderDefaults
+from core.coalesce import coalesce_signals
+from .models import Order, OrderItem, OrderBox, CustomerOrderDefaults, DailySalesFact, StandingOrder, StandingOrderItem
 from .forms import OrderItemForm, OrderAdminForm
+from .services import generate_standing_orders, reprice_orders, sync_orders_to_customer_pricing
 
 class OrderItemInline(admin.TabularInline):
     model = OrderItem
@@ -69,21 +71,19 @@ class OrderAdmin(admin.ModelAdmin):
 
         if customer_id and product_id and stem_length:
             try:
-                from products.models import CustomerProductPrice
-                pricing = CustomerProductPrice.objects.get(
-                    customer_id=customer_id,
-                    product_id=product_id,
-                    stem_length_cm=stem_length
-                )
+                from products.pricing import resolve_price
+                price = resolve_price(int(customer_id), int(product_id), int(stem_length))
+            except ValueError:
+                price = None
+            if price is not None:
                 return JsonResponse({
                     'success': True,
-                    'price': str(pricing.price_per_stem)
-                })
-            except CustomerProductPrice.DoesNotExist:
-                return JsonResponse({
-                    'success': False,
-                    'price': None
+                    'price': str(price)
                 })
+            return JsonResponse({
+                'success': False,
+                'price': None
+            })
 
         return JsonResponse({
             'success': False,
@@ -142,15 +142,15 @@ class OrderAdmin(admin.ModelAdmin):
         })
 
     def save_related(self, request, form, formsets, change):
-        super().save_related(request, form, formsets, change)
-        # After saving inlines, recalculate total_amount
-        form.instance.save()
+        # The change form runs in a transaction; coalescing writes the learned
+        # pricing of all inline lines as one batch on commit
+        with coalesce_signals():
+            super().save_related(request, form, formsets, change)
+            # After saving inlines, recalculate total_amount
+            form.instance.save()
 
     def update_prices_from_customer_pricing(self, request, queryset):
-        updated_count = 0
-        for order in queryset:
-            if order.update_prices_from_customer_pricing():
-                updated_count += 1
+        updated_count = reprice_orders(queryset)
 
         if updated_count > 0:
             self.message_user(request, f"Updated prices for {updated_count} orders from customer pricing.")
@@ -160,9 +160,7 @@ class OrderAdmin(admin.ModelAdmin):
     update_prices_from_customer_pricing.short_description = "Update prices from customer pricing"
 
     def sync_prices_to_customer_pricing(self, request, queryset):
-        synced_count = 0
-        for order in queryset:
-            synced_count += order.sync_prices_to_customer_pricing()
+        synced_count = sync_orders_to_customer_pricing(queryset)
 
         if synced_count > 0:
             self.message_user(request, f"Synced {synced_count} prices to customer pricing.")
@@ -184,3 +182,41 @@ class OrderBoxAdmin(admin.ModelAdmin):
     list_display = ('order', 'box_number', 'label')
     list_filter = ('order__customer',)
     search_fields = ('order__invoice_code', 'label')
+
+
+@admin.register(DailySalesFact)
+class DailySalesFactAdmin(admin.ModelAdmin):
+    list_display = ('date', 'customer', 'product', 'stem_length_cm', 'currency', 'status', 'stems', 'boxes', 'amount', 'order_count')
+    list_filter = ('date', 'currency', 'status')
+    search_fields = ('customer__name', 'product__name')
+
+    def has_add_permission(self, request):
+        # Rows are derived from orders; use the rebuild_daily_sales command instead
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class StandingOrderItemInline(admin.TabularInline):
+    model = StandingOrderItem
+    extra = 1
+    fields = ('product', 'stem_length_cm', 'box_number', 'boxes', 'stems_per_box', 'price_per_stem')
+
+
+@admin.register(StandingOrder)
+class StandingOrderAdmin(admin.ModelAdmin):
+    inlines = [StandingOrderItemInline]
+    list_display = ('customer', 'name', 'branch', 'weekday', 'active', 'start_date', 'end_date')
+    list_filter = ('active', 'weekday', 'customer')
+    search_fields = ('customer__name', 'name')
+    actions = ['generate_next_week']
+
+    def generate_next_week(self, request, queryset):
+        _, created = generate_standing_orders(standing_orders=queryset)
+        if created:
+            self.message_user(request, f"Created {len(created)} orders. Invoice PDFs are rendered by the render_invoice_pdfs command.")
+        else:
+            self.message_user(request, "No orders were due that had not been generated already.")
+
+    generate_next_week.short_description = "Generate this week's orders"
@@ -1,6 +1,8 @@
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from customers.models import Customer
-from products.models import Product, CustomerProductPrice
+from products.models import Product
+from products.price_matrix import upsert_customer_prices
 from decimal import Decimal
 
 
@@ -24,7 +26,7 @@ class Command(BaseCommand):
 
         # Create sample pricing data
         stem_lengths = [40, 50, 60, 70, 80]
-        created_count = 0
+        prices = {}
 
         for customer in customers:
             for product in products:
@@ -41,30 +43,15 @@ class Command(BaseCommand):
                         price = base_price
 
                     # Round to 2 decimal places
-                    price = round(price, 2)
+                    prices[(customer.id, product.id, stem_length)] = round(price, 2)
 
-                    # Create or update the pricing
-                    pricing, created = CustomerProductPrice.objects.get_or_create(
-                        customer=customer,
-                        product=product,
-                        stem_length_cm=stem_length,
-                        defaults={'price_per_stem': price}
-                    )
-
-                    if created:
-                        created_count += 1
-                        self.stdout.write(
-                            f'Created: {customer.name} - {product.name} @ {stem_length}cm: {price} {customer.preferred_currency}'
-                        )
-                    else:
-                        # Update existing price
-                        pricing.price_per_stem = price
-                        pricing.save()
-                        self.stdout.write(
-                            f'Updated: {customer.name} - {product.name} @ {stem_length}cm: {price} {customer.preferred_currency}'
-                        )
+        # Create or update the pricing in one bulk upsert
+        with transaction.atomic():
+            created_count, updated_count = upsert_customer_prices(prices)
 
         self.stdout.write(
-            self.style.SUCCESS(f'Successfully processed {created_count} pricing records!')
+            self.style.SUCCESS(
+                f'Successfully processed {len(prices)} pricing records '
+                f'({created_count} created, {updated_count} updated)!'
+            )
         )
-
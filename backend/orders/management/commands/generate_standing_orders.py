@@ -0,0 +1,64 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.models import StandingOrder
+from orders.services import generate_standing_orders
+
+
+class Command(BaseCommand):
+    help = "Create the coming week's orders from active standing orders (dates already generated are skipped)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First order date to generate (YYYY-MM-DD, default: today)')
+        parser.add_argument('--days', type=int, default=7, help='Number of days to cover (default: 7)')
+        parser.add_argument('--customer-id', type=int, help='Only standing orders of this customer (optional)')
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show the orders that would be created without creating them',
+        )
+        parser.add_argument(
+            '--render-pdfs',
+            action='store_true',
+            help='Render the invoice PDFs now instead of leaving them for render_invoice_pdfs',
+        )
+
+    def _parse_date(self, value, label):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid --{label} date "{value}", expected YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options['start'], 'start')
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1')
+
+        templates = StandingOrder.objects.all()
+        if options.get('customer_id'):
+            templates = templates.filter(customer_id=options['customer_id'])
+
+        planned, created = generate_standing_orders(
+            start=start, days=options['days'], standing_orders=templates, dry_run=options['dry_run'],
+            render_pdfs=options['render_pdfs'],
+        )
+
+        if options['dry_run']:
+            self.stdout.write('DRY RUN MODE - No changes will be made')
+            for data in planned:
+                boxes = sum(item['boxes'] for item in data['items'])
+                self.stdout.write(
+                    f"  {data['date']}: customer {data['customer']} (standing order {data['standing_order_id']}), "
+                    f"{len(data['items'])} lines, {boxes} boxes"
+                )
+            self.stdout.write(self.style.WARNING(f'Would create {len(planned)} orders.'))
+            return
+
+        for order in created:
+            self.stdout.write(f'Created {order.invoice_code} for {order.customer.name} on {order.date}')
+        self.stdout.write(self.style.SUCCESS(f'Successfully created {len(created)} orders'))
+        if created and not options['render_pdfs']:
+            self.stdout.write('Invoice PDFs are pending; run render_invoice_pdfs to produce them.')
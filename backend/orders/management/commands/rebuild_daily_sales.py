@@ -0,0 +1,31 @@
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from orders.rollups import rebuild_daily_sales
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the DailySalesFact rollup from order lines for a date range (default: all dates)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', help='First date to rebuild (YYYY-MM-DD)')
+        parser.add_argument('--end', help='Last date to rebuild (YYYY-MM-DD)')
+
+    def _parse_date(self, value, label):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid --{label} date "{value}", expected YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        start = self._parse_date(options['start'], 'start')
+        end = self._parse_date(options['end'], 'end')
+        if start and end and start > end:
+            raise CommandError('--start must not be after --end')
+
+        self.stdout.write(f"Rebuilding daily sales facts ({start or 'beginning'} to {end or 'latest'})...")
+        rows = rebuild_daily_sales(start, end)
+        self.stdout.write(self.style.SUCCESS(f'Successfully wrote {rows} daily sales rows'))
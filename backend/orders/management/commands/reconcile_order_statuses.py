@@ -0,0 +1,72 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.models import Order
+from orders.services import RECONCILE_BATCH_SIZE, reconcile_order_statuses
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute order status and claim status from payment allocations and approved credit notes '
+        '(cancelled orders are left alone)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Show what would change without making changes',
+        )
+        parser.add_argument(
+            '--customer-id',
+            type=int,
+            help='Only reconcile orders of this customer (optional)'
+        )
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=RECONCILE_BATCH_SIZE,
+            help=f'Rows per bulk update (default: {RECONCILE_BATCH_SIZE})'
+        )
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        if dry_run:
+            self.stdout.write('DRY RUN MODE - No changes will be made')
+            self.stdout.write('=' * 50)
+
+        orders = Order.objects.all()
+        if options.get('customer_id'):
+            orders = orders.filter(customer_id=options['customer_id'])
+
+        started = time.monotonic()
+        changes = reconcile_order_statuses(orders, dry_run=dry_run, batch_size=options['batch_size'])
+        elapsed = time.monotonic() - started
+
+        # The per-order diff is always shown for a dry run, otherwise with -v 2
+        if dry_run or options['verbosity'] >= 2:
+            for change in changes:
+                line = f"{change['invoice_code']}: {change['status']} → {change['new_status']}"
+                if change['claim_status'] != change['new_claim_status']:
+                    line += f" (claim: {change['claim_status'] or '-'} → {change['new_claim_status'] or '-'})"
+                self.stdout.write(line)
+
+        counts = {}
+        for change in changes:
+            if change['status'] != change['new_status']:
+                counts[f"to {change['new_status']}"] = counts.get(f"to {change['new_status']}", 0) + 1
+            if change['claim_status'] != change['new_claim_status']:
+                counts['claim status'] = counts.get('claim status', 0) + 1
+
+        self.stdout.write('\n' + '=' * 50)
+        self.stdout.write('SUMMARY:')
+        self.stdout.write(f'Orders changed: {len(changes)}')
+        for label, count in sorted(counts.items()):
+            self.stdout.write(f'  {label}: {count}')
+        self.stdout.write(f'Time: {elapsed:.2f}s')
+
+        if dry_run:
+            self.stdout.write(self.style.WARNING('\nThis was a dry run. No changes were made.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\nOrder statuses reconciled successfully!'))
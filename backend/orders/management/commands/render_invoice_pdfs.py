@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from orders.services import render_pending_invoice_pdfs
+
+
+class Command(BaseCommand):
+    help = 'Render invoice PDFs that are still pending (e.g. for generated standing orders)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help='Render at most this many invoices (optional)')
+
+    def handle(self, *args, **options):
+        self.stdout.write('Rendering pending invoice PDFs...')
+        rendered = render_pending_invoice_pdfs(options.get('limit'))
+        self.stdout.write(self.style.SUCCESS(f'Successfully rendered {rendered} invoice PDFs'))
@@ -1,5 +1,6 @@
 from django.core.management.base import BaseCommand
 from orders.models import Order
+from orders.services import sync_orders_to_customer_pricing
 
 class Command(BaseCommand):
     help = 'Sync all existing order prices to CustomerProductPrice'
@@ -32,34 +33,11 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('No orders found'))
             return
 
-        # Sync prices
-        total_synced = 0
-        for order in orders:
-            synced_count = order.sync_prices_to_customer_pricing()
-            total_synced += synced_count
-            if synced_count > 0:
-                self.stdout.write(f"Synced {synced_count} prices from order {order.invoice_code}")
+        # One pass over the order lines and a single bulk upsert
+        total_synced = sync_orders_to_customer_pricing(orders)
 
         self.stdout.write(
             self.style.SUCCESS(
                 f'Successfully synced {total_synced} prices to CustomerProductPrice'
             )
         )
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.18 on 2026-10-18 10:30
+
+from decimal import Decimal
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_auto_20260502_1155'),
+        ('customers', '0004_alter_customer_email'),
+        ('orders', '0018_auto_20260507_0914'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailySalesFact',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField()),
+                ('stem_length_cm', models.PositiveIntegerField()),
+                ('currency', models.CharField(max_length=10)),
+                ('status', models.CharField(max_length=20)),
+                ('stems', models.PositiveIntegerField(default=0)),
+                ('boxes', models.PositiveIntegerField(default=0)),
+                ('amount', models.DecimalField(decimal_places=2, default=Decimal('0.00'), help_text='Sum of order line totals (excludes logistics)', max_digits=14)),
+                ('order_count', models.PositiveIntegerField(default=0, help_text='Orders contributing to this row')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='customers.customer')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='daily_sales', to='products.product')),
+            ],
+            options={
+                'unique_together': {('date', 'customer', 'product', 'stem_length_cm', 'currency', 'status')},
+            },
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesfact',
+            index=models.Index(fields=['date'], name='orders_dail_date_d5ce96_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='dailysalesfact',
+            index=models.Index(fields=['customer', 'date'], name='orders_dail_custome_defb02_idx'),
+        ),
+    ]
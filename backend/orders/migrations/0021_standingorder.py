@@ -0,0 +1,62 @@
+# Generated by Django 3.2.18 on 2026-10-18 16:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_auto_20260502_1155'),
+        ('customers', '0004_alter_customer_email'),
+        ('orders', '0020_order_amount_base'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StandingOrder',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(blank=True, help_text="Optional label, e.g. 'Tuesday flight'", max_length=100)),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')], help_text='Order date weekday')),
+                ('active', models.BooleanField(default=True)),
+                ('start_date', models.DateField(default=django.utils.timezone.now, help_text='First date orders may be generated for')),
+                ('end_date', models.DateField(blank=True, help_text='Last date orders may be generated for (blank = no end)', null=True)),
+                ('remarks', models.CharField(blank=True, max_length=255, null=True)),
+                ('logistics_provider', models.CharField(blank=True, max_length=100, null=True)),
+                ('logistics_cost', models.DecimalField(blank=True, decimal_places=2, max_digits=10, null=True)),
+                ('invoice_template', models.CharField(choices=[('default', 'Default Template'), ('awb', 'AWB / Export Template')], default='default', max_length=20)),
+                ('agent_name', models.CharField(blank=True, default='TTC', max_length=100, null=True)),
+                ('mode_of_transport', models.CharField(blank=True, default='AIR', max_length=50, null=True)),
+                ('inco_term', models.CharField(blank=True, default='FOB', max_length=20, null=True)),
+                ('flight_number', models.CharField(blank=True, max_length=50, null=True)),
+                ('deliver_to', models.CharField(blank=True, max_length=100, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='customers.branch')),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standing_orders', to='customers.customer')),
+            ],
+            options={
+                'ordering': ['customer__name', 'weekday'],
+            },
+        ),
+        migrations.CreateModel(
+            name='StandingOrderItem',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stem_length_cm', models.PositiveIntegerField(help_text='Stem length in centimeters')),
+                ('boxes', models.PositiveIntegerField(default=1)),
+                ('stems_per_box', models.PositiveIntegerField(default=1)),
+                ('box_number', models.PositiveIntegerField(blank=True, help_text='Physical box number for mixed boxes', null=True)),
+                ('price_per_stem', models.DecimalField(blank=True, decimal_places=2, help_text='Fixed price; blank = customer price when the order is generated', max_digits=10, null=True)),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='standing_order_items', to='products.product')),
+                ('standing_order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='items', to='orders.standingorder')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='order',
+            name='standing_order',
+            field=models.ForeignKey(blank=True, help_text='Weekly template this order was generated from', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='orders', to='orders.standingorder'),
+        ),
+    ]
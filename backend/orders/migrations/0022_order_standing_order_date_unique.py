@@ -0,0 +1,34 @@
+# Generated by Django 3.2.18 on 2026-10-18 23:21
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def unlink_duplicate_standing_orders(apps, schema_editor):
+    """Keep the first order per (standing order, date); later duplicates become manual orders"""
+    Order = apps.get_model('orders', 'Order')
+    duplicates = (
+        Order.objects.filter(standing_order__isnull=False)
+        .values('standing_order', 'date').annotate(count=Count('id')).filter(count__gt=1)
+    )
+    for row in duplicates:
+        order_ids = list(
+            Order.objects.filter(standing_order=row['standing_order'], date=row['date'])
+            .order_by('pk').values_list('pk', flat=True)
+        )
+        Order.objects.filter(pk__in=order_ids[1:]).update(standing_order=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0021_standingorder'),
+    ]
+
+    operations = [
+        migrations.RunPython(unlink_duplicate_standing_orders, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='order',
+            unique_together={('standing_order', 'date')},
+        ),
+    ]
@@ -1,9 +1,11 @@
 from django.db import models
 from django.utils import timezone
 from customers.models import Customer, Branch
-from products.models import Product, CustomerProductPrice
+from products.models import Product
+from products.pricing import resolve_price
+from products.price_lists import order_line_price
 from django.core.exceptions import ValidationError
-from django.db.models import Sum
+from django.db.models import F, Sum, Value
 from decimal import Decimal
 
 
@@ -34,106 +36,90 @@ class OrderItem(models.Model):
     price_per_stem = models.DecimalField(max_digits=10, decimal_places=2, help_text="Price per stem (auto-filled from customer pricing if available)")
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Stored line total, so saves and deletes can move the order total by the difference
+        instance._saved_total = instance.__dict__.get('total_amount')
+        instance._saved_order_id = instance.__dict__.get('order_id')
+        return instance
+
     def save(self, *args, **kwargs):
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and not {
+            'boxes', 'stems_per_box', 'stems', 'price_per_stem', 'total_amount', 'product', 'stem_length_cm'
+        } & set(update_fields):
+            # e.g. save(update_fields=['box']): nothing priced or totalled changed
+            super().save(*args, **kwargs)
+            return
+
         # Calculate total stems
         self.stems = self.boxes * self.stems_per_box
 
-        # If price_per_stem is not set, try to fetch from CustomerProductPrice
+        # If price_per_stem is not set, use the customer price in effect on the order date
         if not self.price_per_stem:
-            try:
-                cpp = CustomerProductPrice.objects.get(
-                    customer=self.order.customer,
-                    product=self.product,
-                    stem_length_cm=self.stem_length_cm
-                )
-                self.price_per_stem = cpp.price_per_stem
-            except CustomerProductPrice.DoesNotExist:
-                # If no price found, set price to 0 and allow manual entry
-                self.price_per_stem = Decimal('0.00')
+            # If no price found, set price to 0 and allow manual entry
+            self.price_per_stem = order_line_price(
+                self.order.customer_id, self.product_id, self.stem_length_cm, self.order.date
+            ) or Decimal('0.00')
 
         # Calculate total amount for this item
         self.calculate_total_amount()
+        if update_fields is not None:
+            kwargs['update_fields'] = set(update_fields) | {'stems', 'price_per_stem', 'total_amount'}
 
-        # Remember this stem length and price for future orders (only if price > 0)
+        # Remember this stem length and price for future orders (only if price > 0);
+        # written on commit
         if self.price_per_stem > 0:
-            self._remember_defaults()
-            # Also update CustomerProductPrice to keep it in sync
-            self._sync_customer_pricing()
+            from .services import remember_learned_pricing
+            remember_learned_pricing([
+                (self.order.customer_id, self.product_id, self.stem_length_cm, self.price_per_stem)
+            ])
 
+        previous_total = getattr(self, '_saved_total', None) or Decimal('0.00')
+        previous_order_id = getattr(self, '_saved_order_id', None)
         super().save(*args, **kwargs)
-
-    def _sync_customer_pricing(self):
-        """Sync the order item price back to CustomerProductPrice"""
-        from products.models import CustomerProductPrice
-
-        if self.price_per_stem > 0:
-            # Create or update CustomerProductPrice
-            cpp, created = CustomerProductPrice.objects.get_or_create(
-                customer=self.order.customer,
-                product=self.product,
-                stem_length_cm=self.stem_length_cm,
-                defaults={'price_per_stem': self.price_per_stem}
-            )
-
-            if not created and cpp.price_per_stem != self.price_per_stem:
-                # Update existing price
-                cpp.price_per_stem = self.price_per_stem
-                cpp.save()
+        if previous_order_id and previous_order_id != self.order_id:
+            # Line moved to another order: take it off the old one in full
+            previous_order = Order.objects.filter(pk=previous_order_id).first()
+            if previous_order:
+                previous_order.apply_items_delta(-previous_total)
+            previous_total = Decimal('0.00')
+        self.order.apply_items_delta(self.total_amount - previous_total)
+        self._saved_total = self.total_amount
+        self._saved_order_id = self.order_id
+
+    def delete(self, *args, **kwargs):
+        order = self.order
+        stored_total = getattr(self, '_saved_total', None)
+        if stored_total is None:
+            stored_total = self.total_amount or Decimal('0.00')
+        result = super().delete(*args, **kwargs)
+        order.apply_items_delta(-stored_total)
+        return result
 
     def calculate_total_amount(self):
         """Calculate and update the total amount for this item"""
         self.total_amount = self.stems * self.price_per_stem
         return self.total_amount
 
-    def _remember_defaults(self):
-        """Remember stem length and price as defaults for future orders"""
-        from .models import CustomerOrderDefaults
-
-        # Only remember defaults if we have a valid price
-        if self.price_per_stem <= 0:
-            return
-
-        defaults, created = CustomerOrderDefaults.objects.get_or_create(
-            customer=self.order.customer,
-            product=self.product,
-            defaults={
-                'stem_length_cm': self.stem_length_cm,
-                'price_per_stem': self.price_per_stem
-            }
-        )
-
-        if not created:
-            # Update existing defaults
-            defaults.stem_length_cm = self.stem_length_cm
-            defaults.price_per_stem = self.price_per_stem
-            defaults.save()
-
     def update_price_from_customer_pricing(self):
-        """Update price from CustomerProductPrice if available"""
-        try:
-            cpp = CustomerProductPrice.objects.get(
-                customer=self.order.customer,
-                product=self.product,
-                stem_length_cm=self.stem_length_cm
-            )
-            if cpp.price_per_stem != self.price_per_stem:
-                self.price_per_stem = cpp.price_per_stem
-                self.total_amount = self.stems * self.price_per_stem
-                self.save()
-                return True
-        except CustomerProductPrice.DoesNotExist:
-            pass
+        """Update price to the customer price in effect on the order date, if any"""
+        price = order_line_price(self.order.customer_id, self.product_id, self.stem_length_cm, self.order.date)
+        if price is not None and price != self.price_per_stem:
+            self.price_per_stem = price
+            self.total_amount = self.stems * self.price_per_stem
+            self.save()
+            return True
         return False
 
     def update_price(self, new_price):
         """Update price and sync to CustomerProductPrice"""
         if new_price != self.price_per_stem:
             self.price_per_stem = new_price
+            # save() also remembers the new price in CustomerProductPrice
             self.calculate_total_amount()
             self.save()
-            # Sync to CustomerProductPrice
-            if self.price_per_stem > 0:
-                self._sync_customer_pricing()
             return True
         return False
 
@@ -154,6 +140,8 @@ class Order(models.Model):
     branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True)
     total_amount = models.DecimalField(max_digits=12, decimal_places=2, editable=False)
     currency = models.CharField(max_length=10, editable=False)
+    amount_base = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False,
+                                      help_text="Total in KSH at the rate on the order date")
     invoice_code = models.CharField(max_length=20, unique=True, editable=False)
     date = models.DateField(default=timezone.now)
     remarks = models.CharField(max_length=255, blank=True, null=True)
@@ -167,31 +155,103 @@ class Order(models.Model):
     tracking_number = models.CharField(max_length=100, blank=True, null=True, help_text="Tracking number for the shipment")
     delivery_status = models.CharField(max_length=50, blank=True, null=True, help_text="Delivery status (e.g., In Transit, Delivered, etc.)")
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._remember_saved_totals()
+        return instance
+
+    def _remember_saved_totals(self):
+        """
+        Stored (total_amount, logistics_cost, date, currency), to tell whether a
+        save changes the total, and the stored (date, customer_id) daily sales key
+        """
+        self._saved_totals = tuple(
+            self.__dict__.get(name) for name in ('total_amount', 'logistics_cost', 'date', 'currency')
+        )
+        self._saved_rollup_key = (self.__dict__.get('date'), self.__dict__.get('customer_id'))
+
+    def items_total(self):
+        """Sum of line totals, as one SQL SUM"""
+        return self.items.aggregate(total=Sum('total_amount'))['total'] or Decimal('0.00')
+
+    def mark_items_changed(self):
+        """Lines were written in bulk (no per-item deltas); the next save() re-sums them"""
+        self._items_changed = True
+
+    def apply_items_delta(self, delta):
+        """
+        Move the stored total by ``delta`` with an F() UPDATE when a line is
+        saved or deleted, then re-freeze the KSH value from the stored total
+        with ExchangeRate.to_base, the same rounding as a full save.
+        """
+        if not delta or self.pk is None:
+            return
+        from payments.models import ExchangeRate
+        orders = Order.objects.filter(pk=self.pk)
+        orders.update(total_amount=F('total_amount') + Value(delta, output_field=self._meta.get_field('total_amount')))
+        total = orders.values_list('total_amount', flat=True).first()
+        if total is None:
+            return
+        self.total_amount = total
+        self.amount_base = ExchangeRate.to_base(total, self.currency, self.date)
+        orders.update(amount_base=self.amount_base)
+
     def save(self, *args, **kwargs):
-        # Ensure currency consistency across items
-        if self.items.exists():
-            currencies = set(item.order.currency for item in self.items.all())
-            if len(currencies) > 1:
-                raise ValidationError("All items in an order must use the same currency.")
-        # Calculate total amount from all items and add logistics cost if present
-        items_total = sum(item.total_amount for item in self.items.all())
-        if self.logistics_cost:
-            self.total_amount = items_total + self.logistics_cost
-        else:
-            self.total_amount = items_total
+        update_fields = kwargs.get('update_fields')
+        fields = set(update_fields) if update_fields is not None else None
+
+        def saving(*names):
+            return fields is None or bool(fields & set(names))
+
+        saved_total, saved_logistics, saved_date, saved_currency = getattr(self, '_saved_totals', (None,) * 4)
+
         # Set currency from customer
-        self.currency = self.customer.preferred_currency
+        if saving('customer', 'currency'):
+            self.currency = self.customer.preferred_currency
+            if fields is not None:
+                fields |= {'currency'}
+
+        # Line saves and deletes keep the stored total_amount current with F()
+        # deltas, so the lines are only re-summed (one SQL SUM) after bulk writes,
+        # when the logistics cost, date or currency changed, or when the totals
+        # are saved explicitly. Otherwise a full save leaves total_amount and amount_base
+        # out of the UPDATE: this instance may predate a line change, and writing
+        # its total back would undo the delta.
+        totals_changed = False
+        if saving('total_amount', 'logistics_cost', 'date', 'customer', 'currency'):
+            rederive = True
+            if self.pk is None:
+                # A new order has no lines yet
+                self.total_amount = self.logistics_cost or Decimal('0.00')
+            elif (
+                getattr(self, '_items_changed', False)
+                or self.total_amount is None
+                or self.logistics_cost != saved_logistics
+                or self.date != saved_date
+                or self.currency != saved_currency
+                or fields is not None
+            ):
+                self.total_amount = self.items_total() + (self.logistics_cost or Decimal('0.00'))
+            elif fields is None and not self._state.adding and not kwargs.get('force_insert'):
+                rederive = False
+            self._items_changed = False
+            totals_changed = self.total_amount != saved_total
+            if rederive:
+                # Freeze the KSH value at the rate in effect on the order date
+                from payments.models import ExchangeRate
+                self.amount_base = ExchangeRate.to_base(self.total_amount, self.currency, self.date)
+                if fields is not None:
+                    fields |= {'total_amount', 'amount_base'}
+            else:
+                fields = {
+                    field.attname for field in self._meta.concrete_fields
+                    if not field.primary_key and field.attname in self.__dict__
+                } - {'total_amount', 'amount_base'}
+
         # Generate invoice code if not already set
         if not self.invoice_code:
-            # Determine prefix based on Customer preference
-            preference = self.customer.invoice_code_preference 
-            short_code = None
-            
-            if preference == 'branch' and self.branch:
-                short_code = self.branch.short_code
-            else:
-                # Fallback to customer code if preference is 'customer' OR 'branch' but no branch selected
-                short_code = self.customer.short_code
+            short_code = self.invoice_code_prefix()
 
             existing_orders = Order.objects.filter(
                 invoice_code__startswith=short_code
@@ -204,11 +264,50 @@ class Order(models.Model):
                 
             self.invoice_code = new_code
 
-        # Update status based on payment allocations if status is pending or partial
-        if self.pk and self.status not in ['cancelled', 'full_claim']:
+        # Update status based on payment allocations if status is pending or partial;
+        # settlement only needs re-checking when the total moved
+        if self.pk and totals_changed and self.status not in ['cancelled', 'full_claim']:
             self.update_status_from_credit_note()
+            if fields is not None:
+                fields |= {'status', 'claim_status'}
 
+        if fields is not None:
+            kwargs['update_fields'] = fields
         super().save(*args, **kwargs)
+        self._remember_saved_totals()
+
+    def invoice_code_prefix(self):
+        """Short code used to prefix this order's invoice number"""
+        # Determine prefix based on Customer preference
+        if self.customer.invoice_code_preference == 'branch' and self.branch:
+            return self.branch.short_code
+        # Fallback to customer code if preference is 'customer' OR 'branch' but no branch selected
+        return self.customer.short_code
+
+    @classmethod
+    def allocate_invoice_codes(cls, orders):
+        """
+        Assign invoice codes to unsaved orders in bulk.
+        Uses one lookup per prefix instead of the per-save count/exists loop.
+        """
+        by_prefix = {}
+        for order in orders:
+            if not order.invoice_code:
+                by_prefix.setdefault(order.invoice_code_prefix(), []).append(order)
+
+        for prefix, prefixed_orders in by_prefix.items():
+            taken = set(cls.objects.filter(
+                invoice_code__startswith=prefix
+            ).values_list('invoice_code', flat=True))
+            sequence = len(taken)
+            for order in prefixed_orders:
+                sequence += 1
+                new_code = f"{prefix}{str(sequence).zfill(3)}"
+                while new_code in taken:
+                    sequence += 1
+                    new_code = f"{prefix}{str(sequence).zfill(3)}"
+                taken.add(new_code)
+                order.invoice_code = new_code
 
     def update_status_from_credit_note(self):
         """Update status based on credits and payments"""
@@ -384,6 +483,13 @@ class Order(models.Model):
     inco_term = models.CharField(max_length=20, default='FOB', blank=True, null=True)
     deliver_to = models.CharField(max_length=100, blank=True, null=True, help_text="Specific delivery location/person if different from Customer")
 
+    standing_order = models.ForeignKey('StandingOrder', on_delete=models.SET_NULL, null=True, blank=True,
+                                       related_name='orders', help_text="Weekly template this order was generated from")
+
+    class Meta:
+        # One order per standing order and date, even when generation runs concurrently
+        unique_together = ('standing_order', 'date')
+
     def __str__(self):
         return f"{self.invoice_code or 'New Order'} - {self.customer.name}"
 
@@ -392,27 +498,19 @@ class Order(models.Model):
             raise ValidationError("Selected branch does not belong to the selected customer.")
 
     def update_prices_from_customer_pricing(self):
-        """Update all order item prices from CustomerProductPrice and recalculate totals"""
-        updated = False
-        for item in self.items.all():
-            if item.update_price_from_customer_pricing():
-                updated = True
+        """Re-price all items as of the order date and recalculate totals"""
+        from .services import reprice_orders
 
+        updated = reprice_orders(Order.objects.filter(pk=self.pk)) > 0
         if updated:
-            # Recalculate order total
-            self.total_amount = sum(item.total_amount for item in self.items.all())
-            self.save()
-
+            self.refresh_from_db(fields=['total_amount', 'amount_base', 'status', 'claim_status'])
         return updated
 
     def sync_prices_to_customer_pricing(self):
         """Sync all order item prices to CustomerProductPrice"""
-        synced_count = 0
-        for item in self.items.all():
-            if item.price_per_stem > 0:
-                item._sync_customer_pricing()
-                synced_count += 1
-        return synced_count
+        from .services import sync_orders_to_customer_pricing
+
+        return sync_orders_to_customer_pricing(Order.objects.filter(pk=self.pk))
 
     def total_boxes(self):
         """Count total physical boxes: unique OrderBoxes + unboxed item box counts."""
@@ -423,16 +521,6 @@ class Order(models.Model):
 
 
 
-# Django signals for automatic price syncing
-from django.db.models.signals import post_save
-from django.dispatch import receiver
-
-@receiver(post_save, sender=OrderItem)
-def sync_order_item_price_to_customer_pricing(sender, instance, created, **kwargs):
-    """Automatically sync OrderItem price to CustomerProductPrice when saved"""
-    if instance.price_per_stem > 0:
-        instance._sync_customer_pricing()
-
 class CustomerOrderDefaults(models.Model):
     """Remember stem length and price defaults for each customer-product combination"""
     customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='order_defaults')
@@ -488,19 +576,8 @@ class MissedSale(models.Model):
     def save(self, *args, **kwargs):
         # Auto-fetch price if not provided
         if self.price_per_stem is None:
-            from products.models import CustomerProductPrice
-            try:
-                # Try exact match with stem length
-                cpp = CustomerProductPrice.objects.get(
-                    customer=self.customer, 
-                    product=self.product,
-                    stem_length_cm=self.stem_length_cm
-                )
-                self.price_per_stem = cpp.price_per_stem
-            except CustomerProductPrice.DoesNotExist:
-                # Fallback: try to find any price for this product/customer (maybe generic length?)
-                # For now, if no exact match, leave as None (or 0)
-                pass
+            # Exact match with stem length; if there is none, leave as None
+            self.price_per_stem = resolve_price(self.customer_id, self.product_id, self.stem_length_cm)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -515,3 +592,108 @@ class MissedSale(models.Model):
 
     def __str__(self):
         return f"Missed: {self.product.name} ({self.quantity}) - {self.customer.name}"
+
+
+class DailySalesFact(models.Model):
+    """
+    Daily rollup of order lines per customer, product, stem length, currency
+    and order status. Maintained incrementally by orders.rollups and
+    rebuildable with the rebuild_daily_sales command.
+    """
+    date = models.DateField()
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='daily_sales')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='daily_sales')
+    stem_length_cm = models.PositiveIntegerField()
+    currency = models.CharField(max_length=10)
+    status = models.CharField(max_length=20)
+
+    stems = models.PositiveIntegerField(default=0)
+    boxes = models.PositiveIntegerField(default=0)
+    amount = models.DecimalField(max_digits=14, decimal_places=2, default=Decimal('0.00'),
+                                 help_text="Sum of order line totals (excludes logistics)")
+    order_count = models.PositiveIntegerField(default=0, help_text="Orders contributing to this row")
+
+    class Meta:
+        unique_together = ('date', 'customer', 'product', 'stem_length_cm', 'currency', 'status')
+        indexes = [
+            models.Index(fields=['date']),
+            models.Index(fields=['customer', 'date']),
+        ]
+
+    def __str__(self):
+        return f"{self.date} - {self.customer_id} - {self.product_id} ({self.stems})"
+
+
+class StandingOrder(models.Model):
+    """
+    Weekly order template for a customer. The generate_standing_orders
+    command turns it into a real order for each matching weekday.
+    """
+    WEEKDAY_CHOICES = [
+        (0, 'Monday'),
+        (1, 'Tuesday'),
+        (2, 'Wednesday'),
+        (3, 'Thursday'),
+        (4, 'Friday'),
+        (5, 'Saturday'),
+        (6, 'Sunday'),
+    ]
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='standing_orders')
+    branch = models.ForeignKey(Branch, on_delete=models.SET_NULL, null=True, blank=True)
+    name = models.CharField(max_length=100, blank=True, help_text="Optional label, e.g. 'Tuesday flight'")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES, help_text="Order date weekday")
+    active = models.BooleanField(default=True)
+    start_date = models.DateField(default=timezone.now, help_text="First date orders may be generated for")
+    end_date = models.DateField(null=True, blank=True, help_text="Last date orders may be generated for (blank = no end)")
+    remarks = models.CharField(max_length=255, blank=True, null=True)
+
+    # Defaults copied onto each generated order
+    logistics_provider = models.CharField(max_length=100, blank=True, null=True)
+    logistics_cost = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    invoice_template = models.CharField(max_length=20, choices=Order.INVOICE_TEMPLATES, default='default')
+    agent_name = models.CharField(max_length=100, default='TTC', blank=True, null=True)
+    mode_of_transport = models.CharField(max_length=50, default='AIR', blank=True, null=True)
+    inco_term = models.CharField(max_length=20, default='FOB', blank=True, null=True)
+    flight_number = models.CharField(max_length=50, blank=True, null=True)
+    deliver_to = models.CharField(max_length=100, blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['customer__name', 'weekday']
+
+    def __str__(self):
+        label = f" ({self.name})" if self.name else ""
+        return f"{self.customer.name} - every {self.get_weekday_display()}{label}"
+
+    def clean(self):
+        if self.branch and self.branch.customer_id != self.customer_id:
+            raise ValidationError("Selected branch does not belong to the selected customer.")
+        if self.end_date and self.end_date < self.start_date:
+            raise ValidationError("End date must not be before start date.")
+
+    def dates_between(self, start, end):
+        """Order dates this template is due on within [start, end]"""
+        first = max(start, self.start_date)
+        last = min(end, self.end_date) if self.end_date else end
+        day = first + timezone.timedelta(days=(self.weekday - first.weekday()) % 7)
+        dates = []
+        while day <= last:
+            dates.append(day)
+            day += timezone.timedelta(days=7)
+        return dates
+
+
+class StandingOrderItem(models.Model):
+    standing_order = models.ForeignKey(StandingOrder, on_delete=models.CASCADE, related_name='items')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='standing_order_items')
+    stem_length_cm = models.PositiveIntegerField(help_text="Stem length in centimeters")
+    boxes = models.PositiveIntegerField(default=1)
+    stems_per_box = models.PositiveIntegerField(default=1)
+    box_number = models.PositiveIntegerField(null=True, blank=True, help_text="Physical box number for mixed boxes")
+    price_per_stem = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True,
+                                         help_text="Fixed price; blank = customer price when the order is generated")
+
+    def __str__(self):
+        return f"{self.product.name} @ {self.stem_length_cm}cm x {self.boxes} boxes"
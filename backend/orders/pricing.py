@@ -0,0 +1,65 @@
+"""
+Customer price sheets for order entry.
+
+Instead of asking the server for defaults and a price every time a line is
+edited, order forms fetch a customer's whole sheet once and resolve lines
+client-side:
+
+    {
+      "customer_id": 3,
+      "currency": "USD",
+      "prices": {"12": {"60": "0.35", "70": "0.40"}},
+      "defaults": {"12": {"stem_length_cm": 60, "price_per_stem": "0.35"},
+                   "15": {"stem_length_cm": 50, "price_per_stem": null}}
+    }
+
+``prices`` is product id -> stem length -> customer price; ``defaults`` has an
+entry for every product (the remembered customer default, else the product's
+own stem length without a price).
+"""
+from core.result_cache import cached_result
+from core.versioning import customer_scope
+from customers.models import Customer
+from products.models import Product, CustomerProductPrice
+from .models import CustomerOrderDefaults
+
+
+def price_sheet_scopes(customer_id):
+    """Data version scopes a customer's price sheet depends on"""
+    return ['products', customer_scope(customer_id)]
+
+
+def _build_price_sheet(customer_id):
+    currency = Customer.objects.filter(pk=customer_id).values_list('preferred_currency', flat=True).first()
+    if currency is None:
+        return None
+
+    prices = {}
+    for product_id, stem_length_cm, price in CustomerProductPrice.objects.filter(
+        customer_id=customer_id
+    ).values_list('product_id', 'stem_length_cm', 'price_per_stem'):
+        prices.setdefault(str(product_id), {})[str(stem_length_cm)] = str(price)
+
+    defaults = {
+        str(product_id): {'stem_length_cm': stem_length_cm, 'price_per_stem': None}
+        for product_id, stem_length_cm in Product.objects.values_list('id', 'stem_length_cm')
+    }
+    for product_id, stem_length_cm, price in CustomerOrderDefaults.objects.filter(
+        customer_id=customer_id
+    ).values_list('product_id', 'stem_length_cm', 'price_per_stem'):
+        defaults[str(product_id)] = {'stem_length_cm': stem_length_cm, 'price_per_stem': str(price)}
+
+    return {
+        'customer_id': customer_id,
+        'currency': currency,
+        'prices': prices,
+        'defaults': defaults,
+    }
+
+
+def price_sheet(customer_id):
+    """Price sheet for a customer (None if the customer does not exist)"""
+    return cached_result(
+        'price_sheet', {'customer_id': customer_id}, price_sheet_scopes(customer_id),
+        lambda: _build_price_sheet(customer_id),
+    )
@@ -0,0 +1,93 @@
+"""
+Planning reports that combine order and missed-sale history.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, DateField, Sum
+from django.db.models.functions import TruncWeek
+from django.utils import timezone
+
+from core.result_cache import cached_result
+from core.timeseries import bucket_start
+from .models import DailySalesFact, MissedSale
+
+DEMAND_GAP_KEY = ('week', 'product_id', 'stem_length_cm')
+
+
+def _weekly(queryset, date_field, **aggregates):
+    return (
+        queryset
+        .order_by()
+        .annotate(week=TruncWeek(date_field, output_field=DateField()))
+        .values('week', 'product_id', 'product__name', 'stem_length_cm')
+        .annotate(**aggregates)
+        .order_by(*DEMAND_GAP_KEY)
+    )
+
+
+def _merge_sorted(shipped, missed):
+    """Full outer join of two lists already sorted by DEMAND_GAP_KEY"""
+    def key(row):
+        return tuple(row[k] for k in DEMAND_GAP_KEY)
+
+    def merged(row, shipped_stems, missed_stems, requests):
+        demand = shipped_stems + missed_stems
+        return {
+            'week': row['week'],
+            'product_id': row['product_id'],
+            'product': row['product__name'],
+            'stem_length_cm': row['stem_length_cm'],
+            'shipped_stems': shipped_stems,
+            'missed_stems': missed_stems,
+            'missed_requests': requests,
+            'fill_rate': round(shipped_stems / demand, 4) if demand else None,
+        }
+
+    rows, i, j = [], 0, 0
+    while i < len(shipped) or j < len(missed):
+        if j == len(missed) or (i < len(shipped) and key(shipped[i]) < key(missed[j])):
+            rows.append(merged(shipped[i], shipped[i]['stems'] or 0, 0, 0))
+            i += 1
+        elif i == len(shipped) or key(missed[j]) < key(shipped[i]):
+            rows.append(merged(missed[j], 0, missed[j]['quantity'] or 0, missed[j]['requests']))
+            j += 1
+        else:
+            rows.append(merged(
+                shipped[i], shipped[i]['stems'] or 0, missed[j]['quantity'] or 0, missed[j]['requests']
+            ))
+            i += 1
+            j += 1
+    return rows
+
+
+def _compute_demand_gap(start, end, product_id, stem_length_cm):
+    shipped_qs = DailySalesFact.objects.filter(date__gte=start, date__lte=end).exclude(status='cancelled')
+    missed_qs = MissedSale.objects.filter(date__gte=start, date__lte=end)
+    if product_id:
+        shipped_qs = shipped_qs.filter(product_id=product_id)
+        missed_qs = missed_qs.filter(product_id=product_id)
+    if stem_length_cm is not None:
+        shipped_qs = shipped_qs.filter(stem_length_cm=stem_length_cm)
+        missed_qs = missed_qs.filter(stem_length_cm=stem_length_cm)
+
+    shipped = list(_weekly(shipped_qs, 'date', stems=Sum('stems')))
+    missed = list(_weekly(missed_qs, 'date', quantity=Sum('quantity'), requests=Count('id')))
+    return _merge_sorted(shipped, missed)
+
+
+def demand_gap(start=None, end=None, product_id=None, stem_length_cm=None):
+    """
+    Weekly shipped stems (from the daily sales rollup, excluding cancelled
+    orders) next to missed-sale demand per product and stem length.
+    Defaults to the last 26 weeks. Cached until orders or missed sales change.
+    """
+    end = end or timezone.now().date()
+    start = bucket_start(start or end - timedelta(weeks=26), 'week')
+    params = {
+        'start': start, 'end': end,
+        'product_id': product_id, 'stem_length_cm': stem_length_cm,
+    }
+    return cached_result(
+        'demand_gap', params, ['orders', 'missed_sales'],
+        lambda: _compute_demand_gap(start, end, product_id, stem_length_cm),
+    )
@@ -0,0 +1,111 @@
+"""
+Maintenance of the DailySalesFact rollup.
+
+Order and OrderItem changes mark the affected (date, customer) slices dirty;
+each slice is recomputed from its order lines once the transaction commits
+(once per slice inside a coalesce_signals() block). ``rebuild_daily_sales``
+recomputes a whole date range, e.g. after imports that bypass signals.
+"""
+from datetime import datetime
+from functools import partial, reduce
+from operator import or_
+
+from django.db import transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from core.coalesce import run_or_defer
+
+FACT_DIMENSIONS = {
+    'date': 'order__date',
+    'customer_id': 'order__customer_id',
+    'product_id': 'product_id',
+    'stem_length_cm': 'stem_length_cm',
+    'currency': 'order__currency',
+    'status': 'order__status',
+}
+BATCH_SIZE = 500
+
+
+def _aggregate_lines(items):
+    """Group order lines into unsaved DailySalesFact rows"""
+    from .models import DailySalesFact
+
+    rows = (
+        items
+        .order_by()
+        .values(*FACT_DIMENSIONS.values())
+        .annotate(
+            total_stems=Sum('stems'),
+            total_boxes=Sum('boxes'),
+            total_amount=Sum('total_amount'),
+            orders=Count('order', distinct=True),
+        )
+    )
+    return [
+        DailySalesFact(
+            **{name: row[lookup] for name, lookup in FACT_DIMENSIONS.items()},
+            stems=row['total_stems'] or 0,
+            boxes=row['total_boxes'] or 0,
+            amount=row['total_amount'] or 0,
+            order_count=row['orders'],
+        )
+        for row in rows
+    ]
+
+
+def refresh_daily_sales(keys):
+    """Recompute the facts for an iterable of (date, customer_id) slices"""
+    from .models import OrderItem, DailySalesFact
+
+    keys = list(set(keys))
+    for start in range(0, len(keys), BATCH_SIZE):
+        chunk = keys[start:start + BATCH_SIZE]
+        fact_filter = reduce(or_, (Q(date=d, customer_id=c) for d, c in chunk))
+        line_filter = reduce(or_, (Q(order__date=d, order__customer_id=c) for d, c in chunk))
+        with transaction.atomic():
+            DailySalesFact.objects.filter(fact_filter).delete()
+            DailySalesFact.objects.bulk_create(
+                _aggregate_lines(OrderItem.objects.filter(line_filter)), batch_size=BATCH_SIZE
+            )
+
+
+def rebuild_daily_sales(start=None, end=None):
+    """Recompute all facts between ``start`` and ``end`` (inclusive). Returns rows written."""
+    from .models import OrderItem, DailySalesFact
+
+    facts = DailySalesFact.objects.all()
+    items = OrderItem.objects.all()
+    if start:
+        facts = facts.filter(date__gte=start)
+        items = items.filter(order__date__gte=start)
+    if end:
+        facts = facts.filter(date__lte=end)
+        items = items.filter(order__date__lte=end)
+
+    with transaction.atomic():
+        facts.delete()
+        rows = _aggregate_lines(items)
+        DailySalesFact.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+    return len(rows)
+
+
+def _as_date(value):
+    # Order.date defaults to timezone.now, so unsaved/just-saved instances may hold a datetime
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    return value
+
+
+def mark_daily_sales_dirty(keys):
+    """Schedule a refresh of the given (date, customer_id) slices after commit"""
+    for date, customer_id in keys:
+        if date is None or customer_id is None:
+            continue
+        date = _as_date(date)
+        run_or_defer(
+            ('daily_sales', date, customer_id),
+            transaction.on_commit, partial(refresh_daily_sales, [(date, customer_id)])
+        )
@@ -0,0 +1,623 @@
+"""
+Set-based order services.
+
+These helpers write many orders/items at once with bulk queries instead of
+going through Order.save()/OrderItem.save() per row, and then run the
+derived work (pricing memory, invoices, balances) once per order/customer.
+"""
+import logging
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import DecimalField, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.coalesce import collect_or_run, run_or_defer
+from core.versioning import bump_version, customer_scope
+from customers.models import Customer, Branch
+from products.models import Product
+from products.price_matrix import upsert_customer_prices
+from products.price_lists import order_line_prices
+from .models import Order, OrderItem, OrderBox, CustomerOrderDefaults, StandingOrder
+from .rollups import mark_daily_sales_dirty
+
+logger = logging.getLogger(__name__)
+
+REPRICE_BATCH_SIZE = 500
+RECONCILE_BATCH_SIZE = 1000
+# Order fields bulk_create_orders copies from the input when given (AWB/export details etc.)
+OPTIONAL_ORDER_FIELDS = (
+    'standing_order_id', 'invoice_template', 'awb_number', 'flight_number', 'agent_name',
+    'mode_of_transport', 'inco_term', 'deliver_to',
+)
+MONEY_FIELD = DecimalField(max_digits=15, decimal_places=2)
+
+
+def _upsert_order_defaults(defaults_by_key, customer_ids, product_ids):
+    """CustomerOrderDefaults: one row per (customer, product)"""
+    now = timezone.now()
+    existing_defaults = {
+        (d.customer_id, d.product_id): d
+        for d in CustomerOrderDefaults.objects.filter(
+            customer_id__in=customer_ids, product_id__in=product_ids
+        )
+    }
+    new_defaults, changed_defaults = [], []
+    for (customer_id, product_id), (stem_length_cm, price) in defaults_by_key.items():
+        current = existing_defaults.get((customer_id, product_id))
+        if current is None:
+            new_defaults.append(CustomerOrderDefaults(
+                customer_id=customer_id, product_id=product_id,
+                stem_length_cm=stem_length_cm, price_per_stem=price, last_used=now
+            ))
+        else:
+            current.stem_length_cm = stem_length_cm
+            current.price_per_stem = price
+            current.last_used = now
+            changed_defaults.append(current)
+    CustomerOrderDefaults.objects.bulk_create(new_defaults, ignore_conflicts=True)
+    CustomerOrderDefaults.objects.bulk_update(
+        changed_defaults, ['stem_length_cm', 'price_per_stem', 'last_used']
+    )
+    # Defaults are part of the customer's price sheet; bulk writes skip post_save
+    bump_version(*(customer_scope(customer_id) for customer_id in customer_ids))
+
+
+def upsert_learned_pricing(entries, remember_defaults=True):
+    """
+    Remember prices used on order lines as customer defaults and pricing.
+
+    ``entries`` is an iterable of (customer_id, product_id, stem_length_cm,
+    price_per_stem) in write order; the last entry per key wins. With
+    ``remember_defaults=False`` only CustomerProductPrice is updated.
+    Writes are one SELECT plus one bulk insert and one bulk update per table.
+    """
+    defaults_by_key = {}
+    prices_by_key = {}
+    for customer_id, product_id, stem_length_cm, price in entries:
+        if not price or price <= 0:
+            continue
+        defaults_by_key[(customer_id, product_id)] = (stem_length_cm, price)
+        prices_by_key[(customer_id, product_id, stem_length_cm)] = price
+
+    if not prices_by_key:
+        return
+
+    customer_ids = {key[0] for key in prices_by_key}
+    product_ids = {key[1] for key in prices_by_key}
+
+    if remember_defaults:
+        _upsert_order_defaults(defaults_by_key, customer_ids, product_ids)
+
+    # CustomerProductPrice: one row per (customer, product, stem length)
+    upsert_customer_prices(prices_by_key)
+
+
+def _remember_on_commit(entries):
+    if not entries:
+        return
+    if not transaction.get_connection().in_atomic_block:
+        upsert_learned_pricing(entries)
+        return
+    transaction.on_commit(lambda: upsert_learned_pricing(entries))
+
+
+def remember_learned_pricing(entries):
+    """
+    Remember order line prices, (customer_id, product_id, stem_length_cm,
+    price) in write order, as the customers' defaults and
+    CustomerProductPrice (last write per key wins). Inside a transaction they
+    are written as one upsert batch when it commits, and dropped if it rolls
+    back; in autocommit mode they are written straight away. Inside a
+    coalesce_signals() block the entries of every line are merged into one
+    batch, so every path saving lines one by one (order views, the order
+    serializer, admin inlines) wraps its transaction in one.
+    """
+    collect_or_run('learned_pricing', _remember_on_commit, entries)
+
+
+def sync_order_items(order, lines):
+    """
+    Make ``order``'s items and boxes match ``lines`` by applying a diff
+    instead of deleting and recreating everything.
+
+    Each line is a dict with product_id, stem_length_cm, boxes, stems_per_box,
+    price_per_stem, box_number and ``id`` (the existing OrderItem id, or None
+    for a new line). Unchanged lines are not written, changed ones keep their
+    primary key (so credit note lines stay attached), and only removed lines
+    and boxes are deleted. The caller saves the order afterwards, which
+    recomputes its total and refreshes invoices and rollups.
+    Returns {'created': n, 'updated': n, 'deleted': n}.
+    """
+    existing = {item.pk: item for item in order.items.all()}
+    boxes = {box.box_number: box for box in order.order_boxes.all()}
+
+    # Boxes referenced by the submitted lines
+    used_box_numbers = {line['box_number'] for line in lines if line.get('box_number')}
+    new_boxes = [
+        OrderBox(order=order, box_number=number)
+        for number in sorted(used_box_numbers - set(boxes))
+    ]
+    if new_boxes:
+        OrderBox.objects.bulk_create(new_boxes)
+        if any(box.pk is None for box in new_boxes):
+            boxes = {box.box_number: box for box in order.order_boxes.all()}
+        else:
+            boxes.update((box.box_number, box) for box in new_boxes)
+
+    unpriced = [
+        (order.customer_id, line['product_id'], line['stem_length_cm'], order.date)
+        for line in lines if not line.get('price_per_stem')
+    ]
+    price_lookup = order_line_prices(unpriced) if unpriced else {}
+
+    fields = ['product_id', 'stem_length_cm', 'boxes', 'stems_per_box', 'price_per_stem', 'box_id']
+    to_create, to_update, kept = [], [], set()
+    for line in lines:
+        price = line.get('price_per_stem') or price_lookup.get(
+            (order.customer_id, line['product_id'], line['stem_length_cm'], order.date)
+        ) or Decimal('0.00')
+        box = boxes.get(line['box_number']) if line.get('box_number') else None
+        values = {
+            'product_id': line['product_id'],
+            'stem_length_cm': line['stem_length_cm'],
+            'boxes': line['boxes'],
+            'stems_per_box': line['stems_per_box'],
+            'price_per_stem': price,
+            'box_id': box.pk if box else None,
+        }
+
+        item = existing.get(line.get('id'))
+        if item is None or item.pk in kept:
+            item = OrderItem(order=order, **values)
+            to_create.append(item)
+        else:
+            kept.add(item.pk)
+            if all(getattr(item, field) == value for field, value in values.items()):
+                continue
+            for field, value in values.items():
+                setattr(item, field, value)
+            to_update.append(item)
+        item.stems = item.boxes * item.stems_per_box
+        item.calculate_total_amount()
+
+    removed = [pk for pk in existing if pk not in kept]
+    OrderItem.objects.bulk_create(to_create)
+    OrderItem.objects.bulk_update(to_update, fields + ['stems', 'total_amount'])
+    if removed:
+        OrderItem.objects.filter(pk__in=removed).delete()
+    stale_boxes = [box.pk for number, box in boxes.items() if number not in used_box_numbers]
+    if stale_boxes:
+        OrderBox.objects.filter(pk__in=stale_boxes).delete()
+
+    # Bulk writes skip the per-line total deltas, so have order.save() re-sum the lines
+    order.mark_items_changed()
+    prefetched = getattr(order, '_prefetched_objects_cache', {})
+    prefetched.pop('items', None)
+    prefetched.pop('order_boxes', None)
+
+    # Bulk writes skip OrderItem.save, so remember pricing for the written lines here
+    remember_learned_pricing(
+        (order.customer_id, item.product_id, item.stem_length_cm, item.price_per_stem)
+        for item in to_create + to_update if item.price_per_stem > 0
+    )
+
+    return {'created': len(to_create), 'updated': len(to_update), 'deleted': len(removed)}
+
+
+def _in_bulk_or_error(model, ids, label):
+    found = model.objects.in_bulk(set(ids))
+    missing = sorted(set(ids) - set(found))
+    if missing:
+        raise ValidationError(f"Unknown {label} id(s): {', '.join(str(i) for i in missing)}")
+    return found
+
+
+def _generate_invoice_pdfs(order_ids):
+    from invoices.models import Invoice
+    from invoices.utils import generate_invoice_pdf
+
+    invoices = Invoice.objects.filter(order_id__in=order_ids).select_related('order__customer', 'order__branch')
+    for invoice in invoices:
+        try:
+            generate_invoice_pdf(invoice)
+        except Exception as e:
+            logger.error(f"Failed to generate PDF for order {invoice.invoice_code}: {e}")
+
+
+def render_pending_invoice_pdfs(limit=None):
+    """Render invoices that have no PDF yet (e.g. from bulk_create_orders(render_pdfs=False))"""
+    from invoices.models import Invoice
+
+    pending = Invoice.objects.filter(Q(pdf_file__isnull=True) | Q(pdf_file='')).order_by('pk')
+    order_ids = pending.values_list('order_id', flat=True)
+    order_ids = list(order_ids[:limit] if limit else order_ids)
+    _generate_invoice_pdfs(order_ids)
+    return len(order_ids)
+
+
+def bulk_create_orders(orders_data, render_pdfs=True):
+    """
+    Create many orders (with items and boxes) in a fixed number of queries.
+
+    ``orders_data`` is a list of dicts shaped like CreateOrderSerializer input,
+    with ``customer``/``branch``/``product`` given as ids; any of
+    OPTIONAL_ORDER_FIELDS may be given too. Items without a price are priced
+    as of the order date (see products.price_lists.order_line_prices). Invoice PDFs are rendered after commit, or
+    left for the render_invoice_pdfs command with ``render_pdfs=False``.
+    Returns the created orders.
+    """
+    from invoices.models import Invoice
+    from payments.models import ExchangeRate, _recalculate_customer_balance
+
+    if not orders_data:
+        return []
+
+    customers = _in_bulk_or_error(Customer, [o['customer'] for o in orders_data], 'customer')
+    branches = _in_bulk_or_error(Branch, [o['branch'] for o in orders_data if o.get('branch')], 'branch')
+    products = _in_bulk_or_error(
+        Product, [i['product'] for o in orders_data for i in o.get('items', [])], 'product'
+    )
+
+    # Prices for every unpriced line as of its order date, resolved in one batch
+    today = timezone.now().date()
+    price_lookup = order_line_prices([
+        (o['customer'], i['product'], i['stem_length_cm'], o.get('date') or today)
+        for o in orders_data for i in o.get('items', []) if not i.get('price_per_stem')
+    ])
+
+    orders, order_lines = [], []
+    base_rates = {}
+    for index, data in enumerate(orders_data):
+        customer = customers[data['customer']]
+        branch = branches.get(data['branch']) if data.get('branch') else None
+        if branch and branch.customer_id != customer.id:
+            raise ValidationError(f"Order {index}: selected branch does not belong to the selected customer.")
+
+        order = Order(
+            customer=customer,
+            branch=branch,
+            date=data.get('date') or today,
+            remarks=data.get('remarks'),
+            logistics_provider=data.get('logistics_provider'),
+            logistics_cost=data.get('logistics_cost'),
+            tracking_number=data.get('tracking_number'),
+            delivery_status=data.get('delivery_status'),
+            currency=customer.preferred_currency,
+        )
+        for field in OPTIONAL_ORDER_FIELDS:
+            if data.get(field) is not None:
+                setattr(order, field, data[field])
+
+        lines = []
+        items_total = Decimal('0.00')
+        for item_data in data.get('items', []):
+            price = item_data.get('price_per_stem')
+            if not price:
+                price = price_lookup.get(
+                    (customer.id, item_data['product'], item_data['stem_length_cm'], order.date)
+                ) or Decimal('0.00')
+            item = OrderItem(
+                product=products[item_data['product']],
+                stem_length_cm=item_data['stem_length_cm'],
+                boxes=item_data['boxes'],
+                stems_per_box=item_data['stems_per_box'],
+                price_per_stem=price,
+            )
+            item.stems = item.boxes * item.stems_per_box
+            item.calculate_total_amount()
+            items_total += item.total_amount
+            lines.append((item, item_data.get('box_number')))
+
+        order.total_amount = items_total + (order.logistics_cost or Decimal('0.00'))
+        rate_key = (order.currency, order.date)
+        if rate_key not in base_rates:
+            base_rates[rate_key] = ExchangeRate.rate_on(*rate_key)
+        order.amount_base = (order.total_amount * base_rates[rate_key]).quantize(Decimal('0.01'))
+        orders.append(order)
+        order_lines.append(lines)
+
+    with transaction.atomic():
+        Order.allocate_invoice_codes(orders)
+        Order.objects.bulk_create(orders)
+        if any(order.pk is None for order in orders):
+            # Backends without RETURNING on bulk insert: map back via the unique invoice code
+            ids = dict(Order.objects.filter(
+                invoice_code__in=[o.invoice_code for o in orders]
+            ).values_list('invoice_code', 'id'))
+            for order in orders:
+                order.pk = ids[order.invoice_code]
+
+        boxes = {}
+        for order, lines in zip(orders, order_lines):
+            for item, box_number in lines:
+                if box_number and box_number > 0 and (order.pk, box_number) not in boxes:
+                    boxes[(order.pk, box_number)] = OrderBox(order=order, box_number=box_number)
+        OrderBox.objects.bulk_create(boxes.values())
+        if any(box.pk is None for box in boxes.values()):
+            for box in OrderBox.objects.filter(order_id__in=[o.pk for o in orders]):
+                boxes[(box.order_id, box.box_number)].pk = box.pk
+
+        items, learned = [], []
+        for order, lines in zip(orders, order_lines):
+            for item, box_number in lines:
+                item.order = order
+                if box_number and box_number > 0:
+                    item.box = boxes[(order.pk, box_number)]
+                items.append(item)
+                learned.append((order.customer_id, item.product_id, item.stem_length_cm, item.price_per_stem))
+        OrderItem.objects.bulk_create(items)
+
+        upsert_learned_pricing(learned)
+
+        Invoice.objects.bulk_create([
+            Invoice(order=order, invoice_code=order.invoice_code) for order in orders
+        ])
+        customer_ids = {order.customer_id for order in orders}
+        for customer_id in customer_ids:
+            _recalculate_customer_balance(customer_id)
+        mark_daily_sales_dirty((order.date, order.customer_id) for order in orders)
+        bump_version('orders', *(customer_scope(customer_id) for customer_id in customer_ids))
+
+        if render_pdfs:
+            order_ids = [order.pk for order in orders]
+            transaction.on_commit(lambda: _generate_invoice_pdfs(order_ids))
+
+    return orders
+
+
+def _sum_subquery(queryset, group_field, amount_field):
+    """Correlated SUM(amount_field) of ``queryset`` grouped by ``group_field``, 0 when empty"""
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(group_field).annotate(total=Sum(amount_field)).values('total'),
+            output_field=MONEY_FIELD,
+        ),
+        Value(Decimal('0.00')),
+        output_field=MONEY_FIELD,
+    )
+
+
+def _with_settlements(orders):
+    """Annotate an Order queryset with allocated (payments) and credited (approved credit notes)"""
+    from invoices.models import CreditNoteItem
+    from payments.models import PaymentAllocation
+
+    return orders.annotate(
+        allocated=_sum_subquery(PaymentAllocation.objects.filter(order=OuterRef('pk')), 'order', 'amount'),
+        credited=_sum_subquery(
+            CreditNoteItem.objects.filter(order_item__order=OuterRef('pk'), credit_note__status='approved'),
+            'order_item__order', 'amount',
+        ),
+    )
+
+
+def _claim_status(total_amount, credited):
+    """Same rule as Order.update_status_from_credit_note"""
+    if credited > 0:
+        return 'full_claim' if credited >= total_amount else 'partial_claim'
+    return None
+
+
+def refresh_order_totals(order_ids):
+    """
+    Recompute total_amount, amount_base, status and claim_status the way
+    Order.save() does, for orders whose lines were written in bulk. Item
+    totals and settlements are summed in SQL and the orders are written with
+    one bulk_update per batch. Returns the refreshed orders.
+    """
+    from payments.models import ExchangeRate
+
+    orders = list(_with_settlements(Order.objects.filter(pk__in=order_ids)).annotate(
+        items_total=_sum_subquery(OrderItem.objects.filter(order=OuterRef('pk')), 'order', 'total_amount'),
+    ))
+
+    base_rates = {}
+    for order in orders:
+        order.total_amount = order.items_total + (order.logistics_cost or Decimal('0.00'))
+        rate_key = (order.currency, order.date)
+        if rate_key not in base_rates:
+            base_rates[rate_key] = ExchangeRate.rate_on(*rate_key)
+        order.amount_base = (order.total_amount * base_rates[rate_key]).quantize(Decimal('0.01'))
+
+        if order.status != 'cancelled':
+            order.claim_status = _claim_status(order.total_amount, order.credited)
+            if order.allocated + order.credited >= order.total_amount:
+                order.status = 'paid'
+
+    Order.objects.bulk_update(
+        orders, ['total_amount', 'amount_base', 'status', 'claim_status'], batch_size=REPRICE_BATCH_SIZE
+    )
+    return orders
+
+
+def reconcile_order_statuses(orders=None, dry_run=False, batch_size=RECONCILE_BATCH_SIZE):
+    """
+    Derive status and claim_status of every non-cancelled order from its
+    payment allocations and approved credits: 'paid' once they cover the
+    total, otherwise 'pending'. Settlements come from grouped subqueries in
+    one streamed query; changed orders are written with chunked
+    bulk_update unless ``dry_run``. Returns the changes as dicts with
+    id, invoice_code, status/new_status and claim_status/new_claim_status.
+    """
+    orders = (orders if orders is not None else Order.objects.all()).exclude(status='cancelled')
+    rows = _with_settlements(orders).order_by('pk').values_list(
+        'pk', 'invoice_code', 'date', 'customer_id', 'status', 'claim_status',
+        'total_amount', 'allocated', 'credited',
+    )
+
+    changes = []
+    for pk, invoice_code, order_date, customer_id, status, claim_status, total, allocated, credited in rows.iterator(
+        chunk_size=batch_size
+    ):
+        new_status = 'paid' if allocated + credited >= total else 'pending'
+        new_claim_status = _claim_status(total, credited)
+        if (new_status, new_claim_status) != (status, claim_status):
+            changes.append({
+                'id': pk, 'invoice_code': invoice_code, 'date': order_date, 'customer_id': customer_id,
+                'status': status, 'new_status': new_status,
+                'claim_status': claim_status, 'new_claim_status': new_claim_status,
+            })
+
+    if changes and not dry_run:
+        with transaction.atomic():
+            Order.objects.bulk_update(
+                [Order(pk=c['id'], status=c['new_status'], claim_status=c['new_claim_status']) for c in changes],
+                ['status', 'claim_status'], batch_size=batch_size,
+            )
+            # Bulk writes skip post_save: the rollup is keyed by status, and the dashboards count it
+            mark_daily_sales_dirty({(c['date'], c['customer_id']) for c in changes})
+            bump_version('orders', *{customer_scope(c['customer_id']) for c in changes})
+    return changes
+
+
+def _orders_changed_in_bulk(orders):
+    """
+    Downstream work Order's post_save would do, once per order or customer:
+    balances, daily sales rollups, data versions and (after commit) invoice PDFs.
+    """
+    from payments.models import _recalculate_customer_balance
+
+    customer_ids = {order.customer_id for order in orders}
+    for customer_id in customer_ids:
+        run_or_defer(('customer_balance', customer_id), _recalculate_customer_balance, customer_id)
+    mark_daily_sales_dirty((order.date, order.customer_id) for order in orders)
+    bump_version('orders', *(customer_scope(customer_id) for customer_id in customer_ids))
+
+    order_ids = [order.pk for order in orders]
+    transaction.on_commit(lambda: _generate_invoice_pdfs(order_ids))
+
+
+def reprice_orders(orders):
+    """
+    Re-price the lines of an Order queryset at the customer price in effect
+    on each order's date (see products.price_lists.order_line_prices).
+
+    Lines are read in one streamed query and priced in batches; only lines
+    whose price differs are written, with chunked bulk_update. Totals of the
+    affected orders are then recomputed set-wise and their invoices and
+    balances refreshed once per order. Returns the number of orders changed.
+    """
+    rows = OrderItem.objects.filter(order__in=orders).order_by('pk').values_list(
+        'id', 'order_id', 'order__customer_id', 'product_id', 'stem_length_cm', 'order__date',
+        'stems', 'price_per_stem',
+    )
+    items, batch = [], []
+
+    def price_batch():
+        prices = order_line_prices([row[2:6] for row in batch])
+        for pk, order_id, customer_id, product_id, stem_length_cm, order_date, stems, current in batch:
+            price = prices[(customer_id, product_id, stem_length_cm, order_date)]
+            if price is not None and price != current:
+                items.append(OrderItem(pk=pk, order_id=order_id, price_per_stem=price, total_amount=stems * price))
+        batch.clear()
+
+    for row in rows.iterator(chunk_size=REPRICE_BATCH_SIZE):
+        batch.append(row)
+        if len(batch) >= REPRICE_BATCH_SIZE:
+            price_batch()
+    if batch:
+        price_batch()
+    if not items:
+        return 0
+
+    with transaction.atomic():
+        OrderItem.objects.bulk_update(items, ['price_per_stem', 'total_amount'], batch_size=REPRICE_BATCH_SIZE)
+        refreshed = refresh_order_totals({item.order_id for item in items})
+        _orders_changed_in_bulk(refreshed)
+    return len(refreshed)
+
+
+def sync_orders_to_customer_pricing(orders):
+    """
+    Remember the prices on an Order queryset's lines as CustomerProductPrice,
+    oldest order first so the latest price per key wins. Returns the number
+    of lines read.
+    """
+    entries = list(
+        OrderItem.objects.filter(order__in=orders, price_per_stem__gt=0)
+        .order_by('order__date', 'order_id', 'id')
+        .values_list('order__customer_id', 'product_id', 'stem_length_cm', 'price_per_stem')
+        .iterator()
+    )
+    with transaction.atomic():
+        upsert_learned_pricing(entries, remember_defaults=False)
+    return len(entries)
+
+
+def _plan_standing_orders(templates, start, end):
+    """Order dicts for every due date in [start, end] that has no order from its template yet"""
+    existing = set(Order.objects.filter(
+        standing_order__in=[template.pk for template in templates], date__range=(start, end)
+    ).values_list('standing_order_id', 'date'))
+
+    planned = []
+    for template in templates:
+        items = [{
+            'product': item.product_id,
+            'stem_length_cm': item.stem_length_cm,
+            'boxes': item.boxes,
+            'stems_per_box': item.stems_per_box,
+            'price_per_stem': item.price_per_stem,
+            'box_number': item.box_number,
+        } for item in template.items.all()]
+        if not items:
+            continue
+        for order_date in template.dates_between(start, end):
+            if (template.pk, order_date) in existing:
+                continue
+            planned.append({
+                'customer': template.customer_id,
+                'branch': template.branch_id,
+                'date': order_date,
+                'remarks': template.remarks,
+                'logistics_provider': template.logistics_provider,
+                'logistics_cost': template.logistics_cost,
+                'standing_order_id': template.pk,
+                'invoice_template': template.invoice_template,
+                'flight_number': template.flight_number,
+                'agent_name': template.agent_name,
+                'mode_of_transport': template.mode_of_transport,
+                'inco_term': template.inco_term,
+                'deliver_to': template.deliver_to,
+                'items': [dict(item) for item in items],
+            })
+    return planned
+
+
+def generate_standing_orders(start=None, days=7, standing_orders=None, dry_run=False, render_pdfs=False):
+    """
+    Materialize active StandingOrder templates into orders for every due
+    date in [start, start + days). Dates that already have an order from the
+    template are skipped, so reruns are safe; the (standing_order, date)
+    unique constraint stops concurrent runs from creating an order twice,
+    and the loser plans again without the dates the other run created.
+    Everything goes through one bulk_create_orders call: lines without a
+    fixed price are priced in one batch and invoice codes are allocated
+    together. PDFs are left for the render_invoice_pdfs command unless
+    ``render_pdfs`` (then they are rendered after commit, in this thread).
+    Returns (planned order dicts, created orders).
+    """
+    start = start or timezone.now().date()
+    end = start + timezone.timedelta(days=days - 1)
+    templates = list(
+        (standing_orders if standing_orders is not None else StandingOrder.objects.all())
+        .filter(active=True, start_date__lte=end)
+        .filter(Q(end_date__isnull=True) | Q(end_date__gte=start))
+        .select_related('customer', 'branch')
+        .prefetch_related('items')
+    )
+    planned = _plan_standing_orders(templates, start, end)
+    if dry_run or not planned:
+        return planned, []
+    try:
+        with transaction.atomic():
+            return planned, bulk_create_orders(planned, render_pdfs=render_pdfs)
+    except IntegrityError:
+        # Another run created some of these orders first
+        planned = _plan_standing_orders(templates, start, end)
+        if not planned:
+            return planned, []
+        return planned, bulk_create_orders(planned, render_pdfs=render_pdfs)
@@ -1,36 +1,30 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
-from .models import Order
-from invoices.models import Invoice
-from invoices.utils import generate_invoice_pdf
-import logging
-
-logger = logging.getLogger(__name__)
+from .models import Order, OrderItem
+from .rollups import mark_daily_sales_dirty
 
 @receiver(post_save, sender=Order)
-def create_or_update_invoice(sender, instance, created, **kwargs):
-    """
-    Auto-create or update Invoice when Order is saved.
-    Generate PDF for the invoice.
-    """
-    try:
-        # Create invoice if it doesn't exist
-        invoice, created_invoice = Invoice.objects.get_or_create(
-            order=instance,
-            defaults={'invoice_code': instance.invoice_code}
-        )
-        
-        # If invoice code somehow differs (e.g. order code changed), update it
-        if invoice.invoice_code != instance.invoice_code:
-            invoice.invoice_code = instance.invoice_code
-            invoice.save(update_fields=['invoice_code'])
+@receiver(post_delete, sender=Order)
+def refresh_order_rollups(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    keys = [(instance.date, instance.customer_id)]
+    # Stored key tracked by Order.from_db/save, so a moved order also refreshes its old slice
+    previous = getattr(instance, '_saved_rollup_key', None)
+    if previous and previous != keys[0]:
+        keys.append(previous)
+    mark_daily_sales_dirty(keys)
+
 
-        # Generate PDF
-        # We generate PDF on every save to keep it updated with changes
-        try:
-            generate_invoice_pdf(invoice)
-        except Exception as e:
-            logger.error(f"Failed to generate PDF for order {instance.invoice_code}: {e}")
-            
-    except Exception as e:
-        logger.error(f"Error handling invoice for order {instance.invoice_code}: {e}")
+@receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
+def refresh_item_rollups(sender, instance, **kwargs):
+    if kwargs.get('raw'):
+        return
+    if OrderItem.order.is_cached(instance):
+        order = instance.order
+        mark_daily_sales_dirty([(order.date, order.customer_id)])
+    else:
+        key = Order.objects.filter(pk=instance.order_id).values_list('date', 'customer_id').first()
+        if key:
+            mark_daily_sales_dirty([key])
@@ -50,38 +50,44 @@ document.addEventListener('DOMContentLoaded', function() {
 
 // New functionality for auto-filling stem length and price defaults
 document.addEventListener('DOMContentLoaded', function() {
+    // Customer price sheets: fetched once per customer, every line resolves client-side
+    const priceSheets = {};
+    function loadPriceSheet(customerId) {
+        if (!priceSheets[customerId]) {
+            priceSheets[customerId] = fetch(`/orders/api/price-sheet/${customerId}/`)
+                .then(response => {
+                    if (!response.ok) {
+                        throw new Error(`HTTP error! status: ${response.status}`);
+                    }
+                    return response.json();
+                })
+                .catch(error => {
+                    console.error('Error loading price sheet:', error);
+                    delete priceSheets[customerId];
+                    return null;
+                });
+        }
+        return priceSheets[customerId];
+    }
+
     // Handle product selection changes in OrderItem inlines
     document.addEventListener('change', function(e) {
         if (e.target.classList.contains('product-select')) {
             const row = e.target.closest('tr');
             const stemLengthInput = row.querySelector('.stem-length-input');
-            const priceInput = row.querySelector('.price-input');
             const customerSelect = document.getElementById('id_customer');
 
             if (stemLengthInput && customerSelect && customerSelect.value) {
                 const productId = e.target.value;
-                const customerId = customerSelect.value;
 
                 if (productId) {
-                    // First, try to get defaults from CustomerOrderDefaults
-                    fetch('/admin/orders/order/get-defaults/', {
-                        method: 'POST',
-                        headers: {
-                            'Content-Type': 'application/x-www-form-urlencoded',
-                            'X-CSRFToken': getCookie('csrftoken')
-                        },
-                        body: `customer_id=${customerId}&product_id=${productId}`
-                    })
-                    .then(response => response.json())
-                    .then(data => {
-                        if (data.success) {
-                            stemLengthInput.value = data.stem_length_cm;
+                    loadPriceSheet(customerSelect.value).then(sheet => {
+                        const defaults = sheet && sheet.defaults[productId];
+                        if (defaults) {
+                            stemLengthInput.value = defaults.stem_length_cm;
                             // Trigger change event to update price
-                            stemLengthInput.dispatchEvent(new Event('change'));
+                            stemLengthInput.dispatchEvent(new Event('change', { bubbles: true }));
                         }
-                    })
-                    .catch(error => {
-                        console.error('Error loading defaults:', error);
                     });
                 }
             }
@@ -96,45 +102,22 @@ document.addEventListener('DOMContentLoaded', function() {
 
             if (productSelect && priceInput && customerSelect && customerSelect.value) {
                 const productId = productSelect.value;
-                const customerId = customerSelect.value;
                 const stemLength = e.target.value;
 
                 if (productId && stemLength) {
-                    // Get pricing for this customer-product-stem length combination
-                    fetch(`/admin/orders/order/get-pricing/?customer_id=${customerId}&product_id=${productId}&stem_length=${stemLength}`)
-                        .then(response => response.json())
-                        .then(data => {
-                            if (data.success && data.price) {
-                                priceInput.value = data.price;
-                                // Trigger change event to update calculations
-                                priceInput.dispatchEvent(new Event('change'));
-                            } else {
-                                // Clear price if no pricing found
-                                priceInput.value = '';
-                            }
-                        })
-                        .catch(error => {
-                            console.error('Error loading pricing:', error);
+                    loadPriceSheet(customerSelect.value).then(sheet => {
+                        const price = sheet && sheet.prices[productId] && sheet.prices[productId][stemLength];
+                        if (price) {
+                            priceInput.value = price;
+                            // Trigger change event to update calculations
+                            priceInput.dispatchEvent(new Event('change', { bubbles: true }));
+                        } else {
+                            // Clear price if no pricing found
                             priceInput.value = '';
-                        });
+                        }
+                    });
                 }
             }
         }
     });
-
-    // Function to get CSRF token from cookies
-    function getCookie(name) {
-        let cookieValue = null;
-        if (document.cookie && document.cookie !== '') {
-            const cookies = document.cookie.split(';');
-            for (let i = 0; i < cookies.length; i++) {
-                const cookie = cookies[i].trim();
-                if (cookie.substring(0, name.length + 1) === (name + '=')) {
-                    cookieValue = decodeURIComponent(cookie.substring(name.length + 1));
-                    break;
-                }
-            }
-        }
-        return cookieValue;
-    }
 });
@@ -1,3 +1,261 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from customers.models import Customer
+from invoices.models import Invoice
+from payments.models import ExchangeRateHistory, Payment, PaymentAllocation
+from core.coalesce import coalesce_signals
+from products.models import Product, CustomerProductPrice
+from products.price_lists import import_price_list
+from .models import DailySalesFact, Order, OrderItem, StandingOrder
+from .services import (
+    bulk_create_orders, generate_standing_orders, reconcile_order_statuses, render_pending_invoice_pdfs,
+    reprice_orders, sync_order_items,
+)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class OrderTestCase(TestCase):
+    """Customer, product and a one-line order (10 stems at 1.00, total 10.00)"""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='KSH')
+        self.product = Product.objects.create(name='Rhodos', stem_length_cm=50)
+        self.order = Order.objects.create(customer=self.customer)
+        self.item = self.add_item(self.order, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.00'))
+
+    def add_item(self, order, **fields):
+        fields.setdefault('product', self.product)
+        fields.setdefault('stem_length_cm', 50)
+        return order.items.create(**fields)
+
+    def stored(self, order):
+        return Order.objects.values_list('total_amount', 'amount_base', 'status').get(pk=order.pk)
+
+
+class OrderTotalsTests(OrderTestCase):
+    def test_line_save_moves_stored_total(self):
+        item = OrderItem.objects.get(pk=self.item.pk)
+        item.boxes = 3
+        item.save()
+        self.assertEqual(self.stored(self.order)[0], Decimal('30.00'))
+
+    def test_stale_instance_does_not_overwrite_total(self):
+        order = Order.objects.get(pk=self.order.pk)
+        item = OrderItem.objects.get(pk=self.item.pk)
+        item.boxes = 3
+        item.save()
+
+        order.remarks = 'x'
+        order.save()
+        total, amount_base, status = self.stored(order)
+        self.assertEqual(total, Decimal('30.00'))
+        self.assertEqual(amount_base, Decimal('30.00'))
+        self.assertEqual(Order.objects.get(pk=order.pk).remarks, 'x')
+
+    def test_logistics_change_resums_lines(self):
+        order = Order.objects.get(pk=self.order.pk)
+        OrderItem.objects.filter(pk=self.item.pk).update(total_amount=Decimal('12.00'))
+        order.logistics_cost = Decimal('5.00')
+        order.save()
+        self.assertEqual(self.stored(order)[0], Decimal('17.00'))
+
+    def test_deleting_line_settles_covered_order(self):
+        self.add_item(self.order, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.00'))
+        self.order.save()
+        payment = Payment.objects.create(
+            customer=self.customer, amount=Decimal('10.00'), currency='KSH',
+            payment_method='cash', payment_date=self.order.date,
+        )
+        PaymentAllocation.objects.create(payment=payment, order=self.order, amount=Decimal('10.00'))
+        self.assertEqual(self.stored(self.order)[2], 'pending')
+
+        self.client.force_login(User.objects.create_user('clerk'))
+        self.client.get(reverse('orders:order_item_delete', args=[self.item.pk]))
+        total, amount_base, status = self.stored(self.order)
+        self.assertEqual(total, Decimal('10.00'))
+        self.assertEqual(status, 'paid')
+
+    def test_line_delta_rounds_base_amount_like_full_save(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRateHistory.objects.create(
+                currency='USD', rate=Decimal('129.37'), effective_date=self.order.date.replace(year=2000)
+            )
+        self.customer.preferred_currency = 'USD'
+        self.customer.save()
+        order = Order.objects.create(customer=self.customer)
+        self.add_item(order, boxes=1, stems_per_box=25, price_per_stem=Decimal('0.50'))
+
+        self.assertEqual(self.stored(order)[:2], (Decimal('12.50'), Decimal('1617.12')))
+        self.assertEqual(order.amount_base, Decimal('1617.12'))
+        order.logistics_cost = Decimal('0.00')
+        order.save()
+        self.assertEqual(self.stored(order)[1], Decimal('1617.12'))
+
+    def test_moved_order_refreshes_old_daily_sales_slice(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.order.save()
+        old_date = self.order.date
+        self.assertTrue(DailySalesFact.objects.filter(date=old_date).exists())
+
+        order = Order.objects.get(pk=self.order.pk)
+        order.date = date(2026, 1, 5)
+        with self.captureOnCommitCallbacks(execute=True):
+            order.save()
+        self.assertFalse(DailySalesFact.objects.filter(date=old_date).exists())
+        self.assertTrue(DailySalesFact.objects.filter(date=date(2026, 1, 5)).exists())
+
+
+class OrderServiceTests(OrderTestCase):
+    def line(self, item=None, **fields):
+        values = {
+            'id': item.pk if item else None, 'product_id': self.product.pk, 'stem_length_cm': 50,
+            'boxes': 1, 'stems_per_box': 10, 'price_per_stem': Decimal('1.00'), 'box_number': None,
+        }
+        values.update(fields)
+        return values
+
+    def test_sync_order_items_applies_diff(self):
+        removed = self.add_item(self.order, stem_length_cm=60, boxes=1, stems_per_box=10, price_per_stem=Decimal('2.00'))
+        CustomerProductPrice.objects.create(
+            customer=self.customer, product=self.product, stem_length_cm=70, price_per_stem=Decimal('0.50')
+        )
+        result = sync_order_items(self.order, [
+            self.line(self.item, boxes=2, box_number=1),
+            self.line(stem_length_cm=70, price_per_stem=None),
+        ])
+        self.order.save()
+
+        self.assertEqual(result, {'created': 1, 'updated': 1, 'deleted': 1})
+        self.assertFalse(OrderItem.objects.filter(pk=removed.pk).exists())
+        item = OrderItem.objects.get(pk=self.item.pk)
+        self.assertEqual((item.boxes, item.box.box_number), (2, 1))
+        new_item = self.order.items.get(stem_length_cm=70)
+        self.assertEqual(new_item.price_per_stem, Decimal('0.50'))
+        self.assertEqual(self.stored(self.order)[0], Decimal('25.00'))
+
+    def test_sync_order_items_leaves_unchanged_lines_alone(self):
+        result = sync_order_items(self.order, [self.line(self.item)])
+        self.assertEqual(result, {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_reconcile_order_statuses(self):
+        Order.objects.filter(pk=self.order.pk).update(status='paid')
+        payment = Payment.objects.create(
+            customer=self.customer, amount=Decimal('10.00'), currency='KSH',
+            payment_method='cash', payment_date=self.order.date,
+        )
+        covered = Order.objects.create(customer=self.customer)
+        self.add_item(covered, boxes=1, stems_per_box=5, price_per_stem=Decimal('1.00'))
+        PaymentAllocation.objects.create(payment=payment, order=covered, amount=Decimal('5.00'))
+        Order.objects.filter(pk=covered.pk).update(status='pending')
+
+        changes = reconcile_order_statuses(dry_run=True)
+        self.assertEqual(
+            {(change['id'], change['new_status']) for change in changes},
+            {(self.order.pk, 'pending'), (covered.pk, 'paid')},
+        )
+        self.assertEqual(self.stored(self.order)[2], 'paid')
+
+        reconcile_order_statuses()
+        self.assertEqual(self.stored(self.order)[2], 'pending')
+        self.assertEqual(self.stored(covered)[2], 'paid')
+        self.assertEqual(reconcile_order_statuses(), [])
+
+
+class DatedPricingTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        CustomerProductPrice.objects.create(
+            customer=self.customer, product=self.product, stem_length_cm=50, price_per_stem=Decimal('2.00')
+        )
+        import_price_list(
+            [(self.customer.pk, self.product.pk, 50, Decimal('3.00'))], date(2026, 2, 1), date(2026, 2, 15)
+        )
+
+    def test_reprice_orders_uses_price_on_order_date(self):
+        seasonal = Order.objects.create(customer=self.customer, date=date(2026, 2, 10))
+        self.add_item(seasonal, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.00'))
+
+        self.assertEqual(reprice_orders(Order.objects.all()), 2)
+        self.assertEqual(self.stored(seasonal)[0], Decimal('30.00'))
+        self.assertEqual(self.stored(self.order)[0], Decimal('20.00'))
+        self.assertEqual(reprice_orders(Order.objects.all()), 0)
+
+    def test_bulk_created_lines_priced_on_order_date(self):
+        item = {'product': self.product.pk, 'stem_length_cm': 50, 'boxes': 1, 'stems_per_box': 10}
+        seasonal, regular = bulk_create_orders([
+            {'customer': self.customer.pk, 'date': date(2026, 2, 10), 'items': [dict(item)]},
+            {'customer': self.customer.pk, 'items': [dict(item)]},
+        ], render_pdfs=False)
+        self.assertEqual(self.stored(seasonal)[0], Decimal('30.00'))
+        self.assertEqual(self.stored(regular)[0], Decimal('20.00'))
+
+
+class LearnedPricingTests(OrderTestCase):
+    def learned_price(self, stem_length_cm=50):
+        return CustomerProductPrice.objects.filter(
+            customer=self.customer, product=self.product, stem_length_cm=stem_length_cm
+        ).values_list('price_per_stem', flat=True).first()
+
+    def test_line_price_learned_on_commit(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            with coalesce_signals():
+                self.add_item(self.order, stem_length_cm=60, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.10'))
+                self.add_item(self.order, stem_length_cm=60, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.20'))
+                self.assertIsNone(self.learned_price(60))
+        self.assertEqual(self.learned_price(60), Decimal('1.20'))
+
+    def test_rolled_back_line_price_not_learned(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.add_item(self.order, stem_length_cm=70, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.30'))
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertIsNone(self.learned_price(70))
+
+
+class StandingOrderTests(OrderTestCase):
+    def setUp(self):
+        super().setUp()
+        self.standing = StandingOrder.objects.create(customer=self.customer, weekday=1, start_date=date(2026, 1, 1))
+        self.standing.items.create(
+            product=self.product, stem_length_cm=50, boxes=2, stems_per_box=10, price_per_stem=Decimal('1.50')
+        )
+
+    def test_generates_due_dates_once(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            planned, created = generate_standing_orders(start=date(2026, 3, 2), days=14)
+        self.assertEqual([order.date for order in created], [date(2026, 3, 3), date(2026, 3, 10)])
+        for order in created:
+            self.assertEqual(self.stored(order)[0], Decimal('30.00'))
+            self.assertFalse(Invoice.objects.get(order=order).pdf_file)
+
+        self.assertEqual(generate_standing_orders(start=date(2026, 3, 2), days=14), ([], []))
+        self.assertEqual(render_pending_invoice_pdfs(), 2)
+        self.assertTrue(Invoice.objects.get(order=created[0]).pdf_file)
+
+    def test_render_pdfs_opt_in(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            _, created = generate_standing_orders(start=date(2026, 3, 2), days=7, render_pdfs=True)
+        self.assertTrue(Invoice.objects.get(order=created[0]).pdf_file)
+
+    def test_one_order_per_standing_order_and_date(self):
+        Order.objects.create(customer=self.customer, standing_order=self.standing, date=date(2026, 3, 3))
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Order.objects.create(customer=self.customer, standing_order=self.standing, date=date(2026, 3, 3))
@@ -20,6 +20,13 @@ urlpatterns = [
     path('missed-sales/<int:pk>/edit/', views.missed_sale_edit, name='missed_sale_edit'),
     path('missed-sales/<int:pk>/delete/', views.missed_sale_delete, name='missed_sale_delete'),
 
+    # Reports
+    path('reports/demand-gap/', views.demand_gap_report, name='demand_gap_report'),
+    path('api/demand-gap/', views.demand_gap_data, name='demand_gap_data'),
+
+    # Pricing
+    path('api/price-sheet/<int:customer_id>/', views.price_sheet_data, name='price_sheet'),
+
     # AJAX helpers
     path('get-branches/', views.get_branches, name='get_branches'),
     path('get-orders/', views.get_orders, name='get_orders'),
@@ -1,13 +1,23 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.http import JsonResponse
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition, require_GET
 from django.contrib.admin.views.decorators import staff_member_required
 from .models import CustomerOrderDefaults, Order, OrderBox, MissedSale
 from customers.models import Customer, Branch
 from products.models import Product
 from django.contrib import messages
-from django.db.models import Sum, Count
+from django.db import transaction
+from django.db.models import Sum, Count, Q
+from django.core.paginator import Paginator
 from decimal import Decimal
+import hashlib
+
+from core.coalesce import coalesce_signals
+from core.versioning import version_token
+from .pricing import price_sheet, price_sheet_scopes
+from .services import sync_order_items
 
 
 def order_list(request):
@@ -93,59 +103,62 @@ def order_create(request):
             logistics_provider = request.POST.get('logistics_provider')
             logistics_cost = request.POST.get('logistics_cost') or None
 
-            order = Order.objects.create(
-                customer_id=customer_id,
-                branch_id=branch_id,
-                date=date,
-                remarks=remarks,
-                logistics_provider=logistics_provider,
-                logistics_cost=Decimal(logistics_cost) if logistics_cost else None,
-                # AWB / Export Details
-                invoice_template=request.POST.get('invoice_template', 'default'),
-                awb_number=request.POST.get('awb_number'),
-                flight_number=request.POST.get('flight_number'),
-                agent_name=request.POST.get('agent_name'),
-                mode_of_transport=request.POST.get('mode_of_transport'),
-                inco_term=request.POST.get('inco_term'),
-                deliver_to=request.POST.get('deliver_to'),
-            )
-
-            # Create initial items from arrays in the form
-            product_ids = request.POST.getlist('item_product')
-            stem_lengths = request.POST.getlist('item_stem_length_cm')
-            boxes_list = request.POST.getlist('item_boxes')
-            stems_per_box_list = request.POST.getlist('item_stems_per_box')
-            price_list = request.POST.getlist('item_price_per_stem')
-            box_numbers = request.POST.getlist('item_box_number')
-
-            if product_ids and any((pid or '').strip() for pid in product_ids):
-                for idx, pid in enumerate(product_ids):
-                    pid = (pid or '').strip()
-                    if not pid:
-                        continue
-                    if not pid.isdigit():
-                         continue
+            # One transaction per order; coalescing writes the learned pricing of
+            # all lines as one batch on commit
+            with transaction.atomic(), coalesce_signals():
+                order = Order.objects.create(
+                    customer_id=customer_id,
+                    branch_id=branch_id,
+                    date=date,
+                    remarks=remarks,
+                    logistics_provider=logistics_provider,
+                    logistics_cost=Decimal(logistics_cost) if logistics_cost else None,
+                    # AWB / Export Details
+                    invoice_template=request.POST.get('invoice_template', 'default'),
+                    awb_number=request.POST.get('awb_number'),
+                    flight_number=request.POST.get('flight_number'),
+                    agent_name=request.POST.get('agent_name'),
+                    mode_of_transport=request.POST.get('mode_of_transport'),
+                    inco_term=request.POST.get('inco_term'),
+                    deliver_to=request.POST.get('deliver_to'),
+                )
+
+                # Create initial items from arrays in the form
+                product_ids = request.POST.getlist('item_product')
+                stem_lengths = request.POST.getlist('item_stem_length_cm')
+                boxes_list = request.POST.getlist('item_boxes')
+                stems_per_box_list = request.POST.getlist('item_stems_per_box')
+                price_list = request.POST.getlist('item_price_per_stem')
+                box_numbers = request.POST.getlist('item_box_number')
+
+                if product_ids and any((pid or '').strip() for pid in product_ids):
+                    for idx, pid in enumerate(product_ids):
+                        pid = (pid or '').strip()
+                        if not pid:
+                            continue
+                        if not pid.isdigit():
+                             continue
                     
-                    # Clean input values
-                    sl = stem_lengths[idx].strip() if idx < len(stem_lengths) else '0'
-                    bx = boxes_list[idx].strip() if idx < len(boxes_list) else '0'
-                    spb = stems_per_box_list[idx].strip() if idx < len(stems_per_box_list) else '0'
-                    pps = price_list[idx].strip() if idx < len(price_list) else '0'
-
-                    item = order.items.create(
-                        product_id=int(pid),
-                        stem_length_cm=int(sl) if sl else 0,
-                        boxes=int(bx) if bx else 0,
-                        stems_per_box=int(spb) if spb else 0,
-                        price_per_stem=Decimal(pps) if pps else Decimal('0'),
-                    )
-
-                    # Assign to box if box number provided
-                    bn = box_numbers[idx].strip() if idx < len(box_numbers) else ''
-                    _assign_box(order, item, bn)
-
-            # Recalculate totals and trigger invoice regeneration via Order post_save signal
-            order.save()
+                        # Clean input values
+                        sl = stem_lengths[idx].strip() if idx < len(stem_lengths) else '0'
+                        bx = boxes_list[idx].strip() if idx < len(boxes_list) else '0'
+                        spb = stems_per_box_list[idx].strip() if idx < len(stems_per_box_list) else '0'
+                        pps = price_list[idx].strip() if idx < len(price_list) else '0'
+
+                        item = order.items.create(
+                            product_id=int(pid),
+                            stem_length_cm=int(sl) if sl else 0,
+                            boxes=int(bx) if bx else 0,
+                            stems_per_box=int(spb) if spb else 0,
+                            price_per_stem=Decimal(pps) if pps else Decimal('0'),
+                        )
+
+                        # Assign to box if box number provided
+                        bn = box_numbers[idx].strip() if idx < len(box_numbers) else ''
+                        _assign_box(order, item, bn)
+
+                # Recalculate totals and trigger invoice regeneration via Order post_save signal
+                order.save()
 
             messages.success(request, f'Order {order.invoice_code} created.')
             return redirect('orders:order_detail', order_id=order.id)
@@ -184,11 +197,8 @@ def order_edit(request, order_id):
             logistics_cost = request.POST.get('logistics_cost') or None
             order.logistics_cost = Decimal(logistics_cost) if logistics_cost else None
 
-            # Clear existing items and boxes, then recreate from form data
-            order.items.all().delete()
-            order.order_boxes.all().delete()
-
-            # Create new items from arrays in the form
+            # Lines keep their id from the form, so only changed lines are written
+            item_ids = request.POST.getlist('item_id')
             product_ids = request.POST.getlist('item_product')
             stem_lengths = request.POST.getlist('item_stem_length_cm')
             boxes_list = request.POST.getlist('item_boxes')
@@ -196,33 +206,33 @@ def order_edit(request, order_id):
             price_list = request.POST.getlist('item_price_per_stem')
             box_numbers = request.POST.getlist('item_box_number')
 
-            if product_ids and any((pid or '').strip() for pid in product_ids):
-                for idx, pid in enumerate(product_ids):
-                    pid = (pid or '').strip()
-                    if not pid:
-                        continue
-                    if not pid.isdigit():
-                        continue
-
-                    # Clean input values
-                    sl = stem_lengths[idx].strip() if idx < len(stem_lengths) else '0'
-                    bx = boxes_list[idx].strip() if idx < len(boxes_list) else '0'
-                    spb = stems_per_box_list[idx].strip() if idx < len(stems_per_box_list) else '0'
-                    pps = price_list[idx].strip() if idx < len(price_list) else '0'
-
-                    item = order.items.create(
-                        product_id=int(pid),
-                        stem_length_cm=int(sl) if sl else 0,
-                        boxes=int(bx) if bx else 0,
-                        stems_per_box=int(spb) if spb else 0,
-                        price_per_stem=Decimal(pps) if pps else Decimal('0'),
-                    )
-
-                    # Assign to box if box number provided
-                    bn = box_numbers[idx].strip() if idx < len(box_numbers) else ''
-                    _assign_box(order, item, bn)
-
-            order.save()
+            lines = []
+            for idx, pid in enumerate(product_ids):
+                pid = (pid or '').strip()
+                if not pid or not pid.isdigit():
+                    continue
+
+                # Clean input values
+                item_id = item_ids[idx].strip() if idx < len(item_ids) else ''
+                sl = stem_lengths[idx].strip() if idx < len(stem_lengths) else '0'
+                bx = boxes_list[idx].strip() if idx < len(boxes_list) else '0'
+                spb = stems_per_box_list[idx].strip() if idx < len(stems_per_box_list) else '0'
+                pps = price_list[idx].strip() if idx < len(price_list) else '0'
+                bn = box_numbers[idx].strip() if idx < len(box_numbers) else ''
+
+                lines.append({
+                    'id': int(item_id) if item_id.isdigit() else None,
+                    'product_id': int(pid),
+                    'stem_length_cm': int(sl) if sl else 0,
+                    'boxes': int(bx) if bx else 0,
+                    'stems_per_box': int(spb) if spb else 0,
+                    'price_per_stem': Decimal(pps) if pps else Decimal('0'),
+                    'box_number': int(bn) if bn.isdigit() and int(bn) > 0 else None,
+                })
+
+            with transaction.atomic():
+                sync_order_items(order, lines)
+                order.save()
             messages.success(request, 'Order updated.')
             return redirect('orders:order_detail', order_id=order.id)
         except Exception as e:
@@ -247,19 +257,20 @@ def order_item_add(request, order_id):
             price_per_stem = Decimal(request.POST.get('price_per_stem'))
             box_number = request.POST.get('box_number', '').strip()
 
-            item = order.items.create(
-                product_id=product_id,
-                stem_length_cm=stem_length_cm,
-                boxes=boxes,
-                stems_per_box=stems_per_box,
-                price_per_stem=price_per_stem,
-            )
+            with transaction.atomic(), coalesce_signals():
+                item = order.items.create(
+                    product_id=product_id,
+                    stem_length_cm=stem_length_cm,
+                    boxes=boxes,
+                    stems_per_box=stems_per_box,
+                    price_per_stem=price_per_stem,
+                )
 
-            # Assign to box if box number provided
-            _assign_box(order, item, box_number)
+                # Assign to box if box number provided
+                _assign_box(order, item, box_number)
 
-            # Recalculate totals and regenerate invoice
-            order.save()
+                # Recalculate totals and regenerate invoice
+                order.save()
             messages.success(request, 'Item added.')
         except Exception as e:
             messages.error(request, f'Error adding item: {e}')
@@ -270,9 +281,10 @@ def order_item_delete(request, item_id):
     from .models import OrderItem
     item = get_object_or_404(OrderItem, id=item_id)
     order_id = item.order_id
+    # Save the instance the line delta was applied to, so save() sees the total
+    # move and re-checks settlement, then regenerates the invoice
+    order = item.order
     item.delete()
-    # Recalculate totals and regenerate invoice
-    order = get_object_or_404(Order, id=order_id)
     order.save()
     messages.success(request, 'Item removed.')
     return redirect('orders:order_detail', order_id=order_id)
@@ -396,13 +408,33 @@ def get_customer_pricing(request):
         })
 
 
+def _price_sheet_etag(request, customer_id):
+    token, _ = version_token(price_sheet_scopes(customer_id))
+    return hashlib.md5(f"price_sheet:{customer_id}:{token}".encode('utf-8')).hexdigest()
+
+
+@cache_control(private=True, no_cache=True)
+@require_GET
+@condition(etag_func=_price_sheet_etag)
+def price_sheet_data(request, customer_id):
+    """
+    A customer's whole price matrix (product x stem length) and per-product
+    defaults, so order forms resolve every line client-side. Clients
+    revalidate with If-None-Match and get a 304 until pricing changes.
+    """
+    sheet = price_sheet(customer_id)
+    if sheet is None:
+        return JsonResponse({
+            'success': False,
+            'error': 'Customer not found'
+        }, status=404)
+    return JsonResponse(dict(sheet, success=True))
+
+
 def missed_sales_list(request):
     """List missed sales, show summary metrics, and analytics with KES conversion"""
-    from payments.models import ExchangeRate
-    from collections import defaultdict
-    from datetime import datetime
     import json
-    
+
     # Determine target currency
     target_currency = 'KES'
     if request.user.is_authenticated:
@@ -412,91 +444,48 @@ def missed_sales_list(request):
         except (ImportError, AttributeError, UserPreference.DoesNotExist):
             pass
 
-    missed_sales = MissedSale.objects.select_related('customer', 'product').order_by('-date')
-    
-    # --- Currency Conversion Helper ---
-    # Cache rates to avoid N queries
-    rates = {}
-    for rate in ExchangeRate.objects.all():
-        rates[rate.currency] = rate.rate
-        
-    def convert_currency(amount, from_currency, to_currency):
-        if not amount: return Decimal('0.00')
-        if from_currency == to_currency: return amount
-        
-        # Convert to KSH first (base)
-        rate_to_ksh = rates.get(from_currency, Decimal('1.0'))
-        amount_in_ksh = amount * rate_to_ksh
-        
-        # Then convert from KSH to target
-        if to_currency == 'KSH':
-            return amount_in_ksh
-            
-        rate_from_ksh = rates.get(to_currency, Decimal('1.0'))
-        if rate_from_ksh == 0: return amount_in_ksh
-        return amount_in_ksh / rate_from_ksh
+    # Table: one page of rows; everything else below is aggregated in SQL
+    missed_sales = MissedSale.objects.select_related('customer', 'product').order_by('-date', '-id')
+    paginator = Paginator(missed_sales, 25)
+    page_obj = paginator.get_page(request.GET.get('page'))
 
     # --- Calculations ---
-    total_missed_qty = 0
-    potential_revenue = Decimal('0.00')
-    
-    # Analytics Buckets
-    monthly_data = defaultdict(lambda: {'qty': 0, 'val': Decimal('0.00')})
-    product_data = defaultdict(lambda: {'qty': 0, 'val': Decimal('0.00')})
-
-    # Iterate in Python to handle multi-currency conversion
-    # Note: If missed_sales gets very large, this should be optimized or paginated,
-    # but for typical "missed sales" volumes (hundreds/thousands), this is fine.
-    for sale in missed_sales:
-        total_missed_qty += sale.quantity
-        
-        # Calculate Value
-        price = sale.price_per_stem
-        if price:
-            currency = sale.customer.preferred_currency
-            
-            # Local value
-            local_val = price * sale.quantity
-            # Converted value
-            base_val = convert_currency(local_val, currency, target_currency)
-            
-            potential_revenue += base_val
-            
-            # Add to Monthly Trend
-            month_key = sale.date.strftime('%Y-%m') # YYYY-MM for sorting
-            monthly_data[month_key]['qty'] += sale.quantity
-            monthly_data[month_key]['val'] += base_val
-            
-            # Add to Product Breakdown
-            prod_name = sale.product.name
-            product_data[prod_name]['qty'] += sale.quantity
-            product_data[prod_name]['val'] += base_val
+    # Values are converted in SQL (CASE over exchange rates on the customer's currency)
+    from payments.conversion import converted, AMOUNT_FIELD
+    from django.db.models import F, ExpressionWrapper
+    from django.db.models.functions import TruncMonth
+
+    missed_value = converted(
+        ExpressionWrapper(F('price_per_stem') * F('quantity'), output_field=AMOUNT_FIELD),
+        'customer__preferred_currency', target_currency
+    )
+    priced = MissedSale.objects.filter(price_per_stem__gt=0)
+
+    totals = MissedSale.objects.aggregate(
+        qty=Sum('quantity'),
+        value=Sum(missed_value, filter=Q(price_per_stem__gt=0)),
+    )
+    total_missed_qty = totals['qty'] or 0
+    potential_revenue = totals['value'] or Decimal('0.00')
 
     # --- Prepare Chart Data ---
     # 1. Monthly Trend
-    sorted_months = sorted(monthly_data.keys())
-    chart_months = []
-    chart_qtys = []
-    chart_vals = []
-    
-    for month in sorted_months:
-        # Format month label like "Jan 2025"
-        dt = datetime.strptime(month, '%Y-%m')
-        chart_months.append(dt.strftime('%b %Y'))
-        chart_qtys.append(monthly_data[month]['qty'])
-        chart_vals.append(float(monthly_data[month]['val']))
+    monthly_rows = priced.annotate(month=TruncMonth('date')).values('month').annotate(
+        qty=Sum('quantity'), val=Sum(missed_value)
+    ).order_by('month')
+    chart_months = [row['month'].strftime('%b %Y') for row in monthly_rows]
+    chart_qtys = [row['qty'] for row in monthly_rows]
+    chart_vals = [float(row['val'] or 0) for row in monthly_rows]
 
     # 2. Product Breakdown (Top 5 by Value)
-    sorted_products = sorted(product_data.items(), key=lambda x: x[1]['val'], reverse=True)[:5]
-    prod_labels = []
-    prod_vals = []
-    
-    for prod_name, data in sorted_products:
-        prod_labels.append(prod_name)
-        prod_vals.append(float(data['val']))
+    product_rows = priced.values('product__name').annotate(val=Sum(missed_value)).order_by('-val')[:5]
+    prod_labels = [row['product__name'] for row in product_rows]
+    prod_vals = [float(row['val'] or 0) for row in product_rows]
 
     context = {
-        'missed_sales': missed_sales,
+        'missed_sales': page_obj,
+        'page_obj': page_obj,
+        'total_missed_sales': paginator.count,
         'total_missed_qty': total_missed_qty,
         'potential_revenue': potential_revenue,
         'currency_label': target_currency,
@@ -602,6 +591,71 @@ def missed_sale_delete(request, pk):
     return redirect('orders:missed_sales_list')
 
 
+def _demand_gap_params(request):
+    from datetime import datetime
+
+    def parse_date(value):
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date() if value else None
+        except ValueError:
+            return None
+
+    def parse_int(value):
+        try:
+            return int(value) if value not in (None, '') else None
+        except ValueError:
+            return None
+
+    return {
+        'start': parse_date(request.GET.get('start')),
+        'end': parse_date(request.GET.get('end')),
+        'product_id': parse_int(request.GET.get('product')),
+        'stem_length_cm': parse_int(request.GET.get('stem_length')),
+    }
+
+
+def demand_gap_report(request):
+    """Weekly shipped stems next to missed-sale demand per product and stem length"""
+    from itertools import groupby
+    import json
+    from .reports import demand_gap
+
+    params = _demand_gap_params(request)
+    rows = demand_gap(**params)
+
+    # Weekly totals across products for the chart (rows are sorted by week)
+    weeks, shipped_series, missed_series = [], [], []
+    for week, week_rows in groupby(rows, key=lambda row: row['week']):
+        week_rows = list(week_rows)
+        weeks.append(week.strftime('%d %b %Y'))
+        shipped_series.append(sum(row['shipped_stems'] for row in week_rows))
+        missed_series.append(sum(row['missed_stems'] for row in week_rows))
+
+    context = {
+        'rows': rows,
+        'products': Product.objects.all().order_by('name'),
+        'filters': request.GET,
+        'total_shipped': sum(shipped_series),
+        'total_missed': sum(missed_series),
+        'chart_weeks': json.dumps(weeks),
+        'chart_shipped': json.dumps(shipped_series),
+        'chart_missed': json.dumps(missed_series),
+    }
+    return render(request, 'orders/demand_gap_report.html', context)
+
+
+def demand_gap_data(request):
+    """JSON version of the demand-gap report (same filters as the page)"""
+    from .reports import demand_gap
+
+    rows = demand_gap(**_demand_gap_params(request))
+    return JsonResponse({
+        'success': True,
+        'count': len(rows),
+        'rows': rows,
+    })
+
+
 def email_invoice(request, order_id):
     """View to compose and send invoice via email"""
     from core.utils.email import send_invoice_email, fetch_recent_threads, get_email_config
@@ -0,0 +1,144 @@
+"""
+Receivables aging.
+
+Outstanding per order is computed set-wise as order total minus payment
+allocations minus approved credit notes, all as of a given date, and each
+order is bucketed by its age in SQL. The whole book is one grouped query:
+
+    summary = aging_summary(as_of)
+    summary['customers']  # per customer and currency
+    summary['totals']     # per currency
+"""
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import (
+    Case, CharField, DecimalField, ExpressionWrapper, F, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from core.result_cache import cached_result
+from orders.models import Order
+from .models import PaymentAllocation
+
+ZERO = Decimal('0.00')
+MONEY_FIELD = DecimalField(max_digits=15, decimal_places=2)
+
+# (key, label, minimum age in days); an order falls in the last bucket it reaches
+AGING_BUCKETS = [
+    ('current', 'Current (0-30)', 0),
+    ('days_31_60', '31-60 days', 31),
+    ('days_61_90', '61-90 days', 61),
+    ('days_over_90', '90+ days', 91),
+]
+BUCKET_KEYS = [key for key, _, _ in AGING_BUCKETS]
+
+
+def _total_subquery(queryset, group_field):
+    return Coalesce(
+        Subquery(
+            queryset.order_by().values(group_field).annotate(total=Sum('amount')).values('total'),
+            output_field=MONEY_FIELD,
+        ),
+        Value(ZERO),
+        output_field=MONEY_FIELD,
+    )
+
+
+def _bucket_case(as_of):
+    """CASE on order date; buckets are checked oldest first"""
+    whens = [
+        When(date__lte=as_of - timedelta(days=min_days), then=Value(key))
+        for key, _, min_days in reversed(AGING_BUCKETS[1:])
+    ]
+    return Case(*whens, default=Value(AGING_BUCKETS[0][0]), output_field=CharField())
+
+
+def outstanding_orders(as_of=None, customer_id=None):
+    """
+    Non-cancelled orders dated on or before ``as_of`` with an outstanding
+    balance, annotated with allocated, credited, outstanding and age_bucket.
+    """
+    from invoices.models import CreditNoteItem
+
+    as_of = as_of or timezone.now().date()
+    # Dated by the payment, not allocated_at (set when the allocation was recorded)
+    allocations = PaymentAllocation.objects.filter(
+        order=OuterRef('pk'),
+        payment__payment_date__lte=as_of,
+    )
+    credits = CreditNoteItem.objects.filter(
+        Q(credit_note__approved_at__isnull=True) | Q(credit_note__approved_at__date__lte=as_of),
+        order_item__order=OuterRef('pk'),
+        credit_note__status='approved',
+    )
+
+    orders = Order.objects.filter(date__lte=as_of).exclude(status='cancelled')
+    if customer_id:
+        orders = orders.filter(customer_id=customer_id)
+    return orders.annotate(
+        allocated=_total_subquery(allocations, 'order'),
+        credited=_total_subquery(credits, 'order_item__order'),
+    ).annotate(
+        outstanding=ExpressionWrapper(
+            F('total_amount') - F('allocated') - F('credited'), output_field=MONEY_FIELD
+        ),
+        age_bucket=_bucket_case(as_of),
+    ).filter(outstanding__gt=0)
+
+
+def _bucket_sums(as_of):
+    sums = {}
+    for index, (key, _, min_days) in enumerate(AGING_BUCKETS):
+        condition = Q(date__lte=as_of - timedelta(days=min_days))
+        if index + 1 < len(AGING_BUCKETS):
+            condition &= Q(date__gt=as_of - timedelta(days=AGING_BUCKETS[index + 1][2]))
+        sums[key] = Coalesce(
+            Sum(Case(When(condition, then=F('outstanding')), output_field=MONEY_FIELD)),
+            Value(ZERO),
+            output_field=MONEY_FIELD,
+        )
+    return sums
+
+
+def _compute_aging(as_of):
+    rows = (
+        outstanding_orders(as_of)
+        .order_by()
+        .values('customer_id', 'customer__name', 'currency')
+        .annotate(total=Sum('outstanding'), **_bucket_sums(as_of))
+        .order_by('currency', 'customer__name')
+    )
+
+    customers, totals = [], {}
+    for row in rows:
+        customer = {
+            'customer_id': row['customer_id'],
+            'customer': row['customer__name'],
+            'currency': row['currency'],
+            'total': row['total'],
+        }
+        customer.update((key, row[key]) for key in BUCKET_KEYS)
+        customers.append(customer)
+
+        total = totals.setdefault(
+            row['currency'], dict({'currency': row['currency'], 'total': ZERO}, **{k: ZERO for k in BUCKET_KEYS})
+        )
+        total['total'] += row['total']
+        for key in BUCKET_KEYS:
+            total[key] += row[key]
+
+    return {'as_of': as_of, 'customers': customers, 'totals': list(totals.values())}
+
+
+def aging_summary(as_of=None):
+    """
+    Outstanding receivables per customer and per currency in the
+    AGING_BUCKETS. Cached until orders, payments or credit notes change.
+    """
+    as_of = as_of or timezone.now().date()
+    return cached_result(
+        'receivables_aging', {'as_of': as_of}, ['orders', 'payments', 'credit_notes'],
+        lambda: _compute_aging(as_of),
+    )
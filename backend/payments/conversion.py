@@ -0,0 +1,106 @@
+"""
+Currency conversion through the ExchangeRate table.
+
+Rates are "KSH per 1 unit" of each currency. Amounts are converted to KSH
+and then to the target currency; currencies without a rate (including KSH
+itself) count as 1, matching ExchangeRate.get_rate().
+
+``converted()`` builds a SQL expression (CASE WHEN currency = ... THEN
+amount * rate ...) so totals in a target currency can be aggregated in the
+database instead of converting model instances one by one in Python.
+
+Documents with an ``amount_base`` column (KSH frozen at the document date)
+should be totalled with ``base_in_target()`` instead, which is a plain
+SUM(amount_base) scaled by today's target rate, except for documents already
+in the target currency, whose own amount is used as is.
+"""
+from decimal import Decimal
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, Value, When
+from django.db.models.functions import Coalesce
+
+from .rates import get_rates
+
+BASE_CURRENCY = 'KSH'
+AMOUNT_FIELD = DecimalField(max_digits=20, decimal_places=2)
+# Cross rates (rate / target rate) need more precision than stored rates
+RATE_FIELD = DecimalField(max_digits=28, decimal_places=12)
+
+
+def load_rates():
+    """{currency: KSH per unit} for every stored rate, from the process-local rate cache"""
+    return get_rates()
+
+
+def convert_amount(amount, from_currency, to_currency, rates):
+    """Convert a single amount in Python using a rates dict from load_rates()"""
+    if not amount:
+        return Decimal('0.00')
+    if from_currency == to_currency:
+        return amount
+
+    amount_in_base = amount * rates.get(from_currency, Decimal('1.0'))
+    if to_currency == BASE_CURRENCY:
+        return amount_in_base
+
+    target_rate = rates.get(to_currency, Decimal('1.0'))
+    if target_rate == 0:
+        return amount_in_base
+    return amount_in_base / target_rate
+
+
+def converted(amount, currency_field, to_currency, rates=None):
+    """
+    Expression for ``amount`` (field name or expression) converted from the
+    currency stored in ``currency_field`` to ``to_currency``.
+    """
+    if rates is None:
+        rates = load_rates()
+    if isinstance(amount, str):
+        amount = F(amount)
+
+    target_rate = Decimal('1.0')
+    if to_currency != BASE_CURRENCY:
+        target_rate = rates.get(to_currency, Decimal('1.0')) or Decimal('1.0')
+
+    # Each currency's factor to the target currency, so one CASE covers both legs
+    whens = [
+        When(**{currency_field: currency}, then=Value(rate / target_rate, output_field=RATE_FIELD))
+        for currency, rate in rates.items()
+        if currency != to_currency
+    ]
+    whens.append(When(**{currency_field: to_currency}, then=Value(Decimal('1.0'), output_field=RATE_FIELD)))
+    factor = Case(
+        *whens,
+        default=Value(Decimal('1.0') / target_rate, output_field=RATE_FIELD),
+        output_field=RATE_FIELD,
+    )
+    return ExpressionWrapper(amount * factor, output_field=AMOUNT_FIELD)
+
+
+def base_in_target(base_field, amount_field, currency_field, to_currency, rates=None):
+    """
+    Expression for a document's frozen KSH amount in ``to_currency`` (today's
+    rate). Rows not yet backfilled fall back to converting ``amount_field``;
+    rows already in ``to_currency`` use ``amount_field`` unconverted.
+    """
+    if rates is None:
+        rates = load_rates()
+    target_rate = Decimal('1.0')
+    if to_currency != BASE_CURRENCY:
+        target_rate = rates.get(to_currency, Decimal('1.0')) or Decimal('1.0')
+
+    base = Coalesce(
+        F(base_field), converted(amount_field, currency_field, BASE_CURRENCY, rates),
+        output_field=AMOUNT_FIELD,
+    )
+    if target_rate != 1:
+        base = ExpressionWrapper(
+            base * Value(Decimal('1.0') / target_rate, output_field=RATE_FIELD), output_field=AMOUNT_FIELD
+        )
+    # A round trip through KSH would drift from the document's own amount
+    return Case(
+        When(**{currency_field: to_currency}, then=F(amount_field)),
+        default=base,
+        output_field=AMOUNT_FIELD,
+    )
@@ -0,0 +1,58 @@
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+
+from core.versioning import bump_version
+from orders.models import Order
+from payments.models import Payment
+from payments.rates import rate_on
+from invoices.models import CreditNote
+from expenses.models import Expense
+
+BATCH_SIZE = 500
+
+# model, amount field, document date field (matches each model's save())
+DOCUMENTS = [
+    (Order, 'total_amount', 'date'),
+    (Payment, 'amount', 'payment_date'),
+    (Expense, 'amount', 'date_incurred'),
+    (CreditNote, 'total_amount', 'created_at'),
+]
+
+
+class Command(BaseCommand):
+    help = 'Fill amount_base (KSH at the document date rate) on orders, payments, expenses and credit notes'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--all', action='store_true',
+            help='Recompute every row, not only rows where amount_base is empty'
+        )
+
+    def handle(self, *args, **options):
+        for model, amount_field, date_field in DOCUMENTS:
+            queryset = model.objects.all()
+            if not options['all']:
+                queryset = queryset.filter(amount_base__isnull=True)
+
+            updated = 0
+            batch = []
+            for obj in queryset.iterator(chunk_size=BATCH_SIZE):
+                on_date = getattr(obj, date_field)
+                amount = getattr(obj, amount_field) or Decimal('0.00')
+                obj.amount_base = (amount * rate_on(obj.currency, on_date)).quantize(Decimal('0.01'))
+                batch.append(obj)
+                if len(batch) >= BATCH_SIZE:
+                    # bulk_update skips save(): no PDF regeneration or balance recalculation
+                    model.objects.bulk_update(batch, ['amount_base'])
+                    updated += len(batch)
+                    batch = []
+            if batch:
+                model.objects.bulk_update(batch, ['amount_base'])
+                updated += len(batch)
+
+            self.stdout.write(f'{model._meta.verbose_name_plural.title()}: {updated} rows updated')
+
+        # bulk_update bypasses the save signals, so invalidate cached reports explicitly
+        bump_version('orders', 'payments', 'expenses', 'credit_notes')
+        self.stdout.write(self.style.SUCCESS('Successfully backfilled base currency amounts'))
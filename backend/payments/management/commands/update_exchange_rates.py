@@ -1,12 +1,27 @@
 from django.core.management.base import BaseCommand
-from payments.utils import fetch_and_update_rates
+from payments.utils import get_rate_source, update_rates_from_source, TARGET_CURRENCIES
 
 class Command(BaseCommand):
     help = 'Fetches live exchange rates and updates the database'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--source',
+            help='Rate source: URL, path to a .json file, or dotted path to a source class '
+                 '(default: settings.EXCHANGE_RATE_SOURCE or the public API)'
+        )
+        parser.add_argument('--retries', type=int, default=3, help='Fetch attempts before giving up')
+        parser.add_argument('--backoff', type=float, default=2.0, help='Seconds to wait between attempts (grows per attempt)')
+        parser.add_argument('--currencies', default=','.join(TARGET_CURRENCIES), help='Comma-separated currency codes')
+
     def handle(self, *args, **options):
-        self.stdout.write('Fetching exchange rates...')
-        success, message = fetch_and_update_rates()
+        source = get_rate_source(options['source'])
+        currencies = [code.strip().upper() for code in options['currencies'].split(',') if code.strip()]
+
+        self.stdout.write(f'Fetching exchange rates from {source}...')
+        success, message = update_rates_from_source(
+            source, currencies, retries=max(options['retries'], 1), backoff=options['backoff']
+        )
         
         if success:
             self.stdout.write(self.style.SUCCESS(message))
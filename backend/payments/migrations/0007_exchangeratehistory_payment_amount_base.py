@@ -0,0 +1,47 @@
+# Generated by Django 3.2.18 on 2026-10-18 11:15
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_rate_history(apps, schema_editor):
+    """Start the history with the current rates so as-of lookups have a value"""
+    ExchangeRate = apps.get_model('payments', 'ExchangeRate')
+    ExchangeRateHistory = apps.get_model('payments', 'ExchangeRateHistory')
+    for rate in ExchangeRate.objects.all():
+        ExchangeRateHistory.objects.get_or_create(
+            currency=rate.currency,
+            effective_date=(rate.updated_at or timezone.now()).date(),
+            defaults={'rate': rate.rate}
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('payments', '0006_auto_20260324_1531'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ExchangeRateHistory',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('currency', models.CharField(choices=[('KSH', 'Kenyan Shilling'), ('USD', 'US Dollar'), ('GBP', 'British Pound'), ('EUR', 'Euro')], max_length=5)),
+                ('rate', models.DecimalField(decimal_places=4, max_digits=10)),
+                ('effective_date', models.DateField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'verbose_name_plural': 'Exchange rate history',
+                'ordering': ['currency', '-effective_date'],
+                'unique_together': {('currency', 'effective_date')},
+            },
+        ),
+        migrations.AddField(
+            model_name='payment',
+            name='amount_base',
+            field=models.DecimalField(blank=True, decimal_places=2, editable=False, help_text='Amount in KSH at the rate on the payment date', max_digits=15, null=True),
+        ),
+        migrations.RunPython(seed_rate_history, migrations.RunPython.noop),
+    ]
@@ -2,7 +2,7 @@ from django.db import models
 from django.core.exceptions import ValidationError
 from django.db.models import Sum, Q
 from django.utils import timezone
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from customers.models import Customer
 from orders.models import Order
@@ -11,6 +11,7 @@ import uuid
 from decimal import Decimal
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
+from core.coalesce import run_or_defer
 
 
 
@@ -44,6 +45,8 @@ class Payment(models.Model):
     payment_method = models.CharField(max_length=20, choices=PAYMENT_METHOD_CHOICES)
     payment_date = models.DateField()
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
+    amount_base = models.DecimalField(max_digits=15, decimal_places=2, null=True, blank=True, editable=False,
+                                      help_text="Amount in KSH at the rate on the payment date")
 
     # Reference and notes
     reference_number = models.CharField(max_length=100, blank=True, help_text="Check number, transaction ID, etc.")
@@ -72,6 +75,10 @@ class Payment(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
+        self.amount_base = ExchangeRate.to_base(self.amount, self.currency, self.payment_date)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'amount', 'currency', 'payment_date'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'amount_base'}
         super().save(*args, **kwargs)
 
     @property
@@ -594,24 +601,30 @@ class PaymentLog(models.Model):
 # Methods are now defined on their respective models to avoid monkey-patching
 
 # Signals to automatically update customer balances
+def _recalculate_customer_balance(customer_id):
+    """Recalculate the stored balance for a customer (coalescable signal work)"""
+    customer = Customer.objects.filter(pk=customer_id).first()
+    if customer is None:
+        return
+    balance, created = CustomerBalance.objects.get_or_create(
+        customer=customer,
+        defaults={'currency': customer.preferred_currency}
+    )
+    balance.recalculate_balance()
+
+
 @receiver(post_save, sender=Payment)
 def update_customer_balance_on_payment(sender, instance, created, **kwargs):
     """Update customer balance when a payment is created or updated"""
     if created or instance.status == 'completed':
-        balance, created = CustomerBalance.objects.get_or_create(
-            customer=instance.customer,
-            defaults={'currency': instance.customer.preferred_currency}
-        )
-        balance.recalculate_balance()
+        run_or_defer(('customer_balance', instance.customer_id),
+                     _recalculate_customer_balance, instance.customer_id)
 
 @receiver(post_save, sender=PaymentAllocation)
 def update_customer_balance_on_allocation(sender, instance, created, **kwargs):
     """Update customer balance when a payment allocation is created or updated"""
-    balance, created = CustomerBalance.objects.get_or_create(
-        customer=instance.payment.customer,
-        defaults={'currency': instance.payment.customer.preferred_currency}
-    )
-    balance.recalculate_balance()
+    customer_id = instance.payment.customer_id
+    run_or_defer(('customer_balance', customer_id), _recalculate_customer_balance, customer_id)
 
     # Update order status if it becomes fully paid
     order = instance.order
@@ -622,11 +635,8 @@ def update_customer_balance_on_allocation(sender, instance, created, **kwargs):
 @receiver(post_save, sender=Order)
 def update_customer_balance_on_order(sender, instance, created, **kwargs):
     """Update customer balance when an order is created or updated"""
-    balance, created = CustomerBalance.objects.get_or_create(
-        customer=instance.customer,
-        defaults={'currency': instance.customer.preferred_currency}
-    )
-    balance.recalculate_balance()
+    run_or_defer(('customer_balance', instance.customer_id),
+                 _recalculate_customer_balance, instance.customer_id)
 
 
 class ExchangeRate(models.Model):
@@ -638,12 +648,57 @@ class ExchangeRate(models.Model):
     def __str__(self):
         return f"1 {self.currency} = {self.rate} KSH"
 
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # Keep the dated history in step: today's rate is the latest save
+        ExchangeRateHistory.objects.update_or_create(
+            currency=self.currency,
+            effective_date=timezone.now().date(),
+            defaults={'rate': self.rate}
+        )
+
     @classmethod
     def get_rate(cls, currency_code):
-        if currency_code == 'KSH':
-            return Decimal('1.0')
-        try:
-            return cls.objects.get(currency=currency_code).rate
-        except cls.DoesNotExist:
-            return Decimal('1.0')
+        from .rates import get_rate
+        return get_rate(currency_code)
+
+    @classmethod
+    def rate_on(cls, currency_code, on_date):
+        """Rate in effect on ``on_date`` (see payments.rates.rate_on)"""
+        from .rates import rate_on
+        return rate_on(currency_code, on_date)
+
+    @classmethod
+    def to_base(cls, amount, currency_code, on_date):
+        """``amount`` in KSH at the rate in effect on ``on_date``"""
+        if amount is None:
+            return None
+        rate = cls.rate_on(currency_code, on_date or timezone.now().date())
+        return (amount * rate).quantize(Decimal('0.01'))
+
+
+class ExchangeRateHistory(models.Model):
+    """Effective-dated exchange rates (KSH per unit) for converting documents at their own date"""
+    currency = models.CharField(max_length=5, choices=Customer.CURRENCY_CHOICES)
+    rate = models.DecimalField(max_digits=10, decimal_places=4)
+    effective_date = models.DateField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('currency', 'effective_date')
+        ordering = ['currency', '-effective_date']
+        verbose_name_plural = 'Exchange rate history'
+
+    def __str__(self):
+        return f"1 {self.currency} = {self.rate} KSH from {self.effective_date}"
+
+
+@receiver(post_save, sender=ExchangeRate)
+@receiver(post_delete, sender=ExchangeRate)
+@receiver(post_save, sender=ExchangeRateHistory)
+@receiver(post_delete, sender=ExchangeRateHistory)
+def invalidate_rate_cache(sender, instance, **kwargs):
+    """Make every process reload its cached rates after the change commits"""
+    from .rates import invalidate_rates
+    invalidate_rates()
 
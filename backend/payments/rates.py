@@ -0,0 +1,103 @@
+"""
+Process-local exchange rate cache.
+
+Current rates and the effective-dated history are small, so each process
+keeps them in memory and answers get_rate()/rate_on() without a query. Saves
+to ExchangeRate/ExchangeRateHistory bump a stamp in the Django cache; a
+process compares it with its own at most every RATE_STAMP_INTERVAL seconds
+and reloads when it differs (or after RATE_CACHE_TTL seconds, for cache
+backends that are not shared). The saving process reloads straight away.
+"""
+import threading
+import time
+from bisect import bisect_right
+from datetime import datetime
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+BASE_CURRENCY = 'KSH'
+STAMP_KEY = 'exchange_rates:stamp'
+RATE_CACHE_TTL = getattr(settings, 'RATE_CACHE_TTL', 300)
+# Seconds between checks of the shared stamp (each check is a cache read)
+RATE_STAMP_INTERVAL = getattr(settings, 'RATE_STAMP_INTERVAL', 5)
+
+_lock = threading.Lock()
+_state = {'stamp': None, 'loaded_at': 0.0, 'checked_at': 0.0, 'current': {}, 'history': {}}
+
+
+def _shared_stamp():
+    stamp = cache.get(STAMP_KEY)
+    if stamp is None:
+        stamp = time.time()
+        cache.add(STAMP_KEY, stamp, None)
+        stamp = cache.get(STAMP_KEY, stamp)
+    return stamp
+
+
+def _load():
+    from .models import ExchangeRate, ExchangeRateHistory
+
+    history = {}
+    for currency, effective_date, rate in ExchangeRateHistory.objects.order_by(
+        'currency', 'effective_date'
+    ).values_list('currency', 'effective_date', 'rate'):
+        dates, rates = history.setdefault(currency, ([], []))
+        dates.append(effective_date)
+        rates.append(rate)
+    current = dict(ExchangeRate.objects.values_list('currency', 'rate'))
+    return current, history
+
+
+def _snapshot():
+    now = time.monotonic()
+    if (_state['stamp'] is not None and now - _state['checked_at'] < RATE_STAMP_INTERVAL
+            and now - _state['loaded_at'] < RATE_CACHE_TTL):
+        return _state
+    stamp = _shared_stamp()
+    with _lock:
+        if _state['stamp'] != stamp or now - _state['loaded_at'] >= RATE_CACHE_TTL:
+            current, history = _load()
+            _state.update(stamp=stamp, loaded_at=now, current=current, history=history)
+        _state['checked_at'] = now
+    return _state
+
+
+def get_rates():
+    """{currency: KSH per unit} for every stored rate (a copy)"""
+    return dict(_snapshot()['current'])
+
+
+def get_rate(currency_code):
+    """Current KSH per unit of ``currency_code`` (1 for KSH and unknown currencies)"""
+    if currency_code == BASE_CURRENCY:
+        return Decimal('1.0')
+    return _snapshot()['current'].get(currency_code, Decimal('1.0'))
+
+
+def rate_on(currency_code, on_date):
+    """
+    Rate in effect on ``on_date``: the latest history entry on or before it,
+    else the earliest entry after it, else the current rate.
+    """
+    if currency_code == BASE_CURRENCY:
+        return Decimal('1.0')
+    if isinstance(on_date, datetime):
+        on_date = timezone.localtime(on_date).date() if timezone.is_aware(on_date) else on_date.date()
+
+    snapshot = _snapshot()
+    if currency_code in snapshot['history']:
+        dates, rates = snapshot['history'][currency_code]
+        return rates[max(bisect_right(dates, on_date) - 1, 0)]
+    return snapshot['current'].get(currency_code, Decimal('1.0'))
+
+
+def invalidate_rates():
+    """Force every process to reload rates on its next lookup"""
+    def bump():
+        _state['stamp'] = None
+        cache.set(STAMP_KEY, time.time(), None)
+    transaction.on_commit(bump)
@@ -1,3 +1,82 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
 
-# Create your tests here.
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+
+from customers.models import Customer
+from orders.models import Order
+from products.models import Product
+from .aging import outstanding_orders
+from .conversion import base_in_target
+from .models import ExchangeRate, Payment, PaymentAllocation
+from .rates import get_rate
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class BaseInTargetTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='USD')
+        self.order = Order.objects.create(customer=customer)
+        Order.objects.filter(pk=self.order.pk).update(
+            currency='USD', total_amount=Decimal('12.50'), amount_base=Decimal('1617.12')
+        )
+        self.rates = {'USD': Decimal('129.40'), 'EUR': Decimal('140.00')}
+
+    def total(self, to_currency):
+        expression = base_in_target('amount_base', 'total_amount', 'currency', to_currency, self.rates)
+        return Order.objects.aggregate(total=Sum(expression))['total']
+
+    def test_document_in_target_currency_keeps_its_amount(self):
+        self.assertEqual(self.total('USD'), Decimal('12.50'))
+
+    def test_other_currencies_scale_frozen_base_amount(self):
+        self.assertEqual(self.total('KSH'), Decimal('1617.12'))
+        self.assertEqual(self.total('EUR').quantize(Decimal('0.01')), Decimal('11.55'))
+
+
+class RateCacheTests(TestCase):
+    def test_lookups_reuse_loaded_rates(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            ExchangeRate.objects.create(currency='USD', rate=Decimal('129.40'))
+        self.assertEqual(get_rate('USD'), Decimal('129.40'))
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.assertEqual(get_rate('USD'), Decimal('129.40'))
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AgingTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def outstanding(self, order, as_of):
+        return outstanding_orders(as_of).get(pk=order.pk).outstanding
+
+    def test_late_recorded_payment_counts_on_its_payment_date(self):
+        customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='KSH')
+        order = Order.objects.create(customer=customer, date=date(2026, 1, 5))
+        order.items.create(
+            product=Product.objects.create(name='Rhodos', stem_length_cm=50),
+            stem_length_cm=50, boxes=1, stems_per_box=10, price_per_stem=Decimal('1.00'),
+        )
+        # Recorded today for a payment received on 10 January
+        payment = Payment.objects.create(
+            customer=customer, amount=Decimal('4.00'), currency='KSH',
+            payment_method='cash', payment_date=date(2026, 1, 10),
+        )
+        PaymentAllocation.objects.create(payment=payment, order=order, amount=Decimal('4.00'))
+
+        self.assertEqual(self.outstanding(order, date(2026, 1, 9)), Decimal('10.00'))
+        self.assertEqual(self.outstanding(order, date(2026, 1, 31)), Decimal('6.00'))
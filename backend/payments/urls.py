@@ -20,6 +20,10 @@ urlpatterns = [
     path('balances/<int:customer_id>/', views.customer_balance_detail, name='customer_balance_detail'),
     path('balances/<int:customer_id>/recalculate/', views.recalculate_balance, name='recalculate_balance'),
 
+    # Receivables aging
+    path('aging/', views.receivables_aging, name='receivables_aging'),
+    path('aging/csv/', views.receivables_aging_csv, name='receivables_aging_csv'),
+
     # Account statements
     path('statements/', views.account_statement_list, name='account_statement_list'),
     path('statements/<int:statement_id>/', views.account_statement_detail, name='account_statement_detail'),
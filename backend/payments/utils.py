@@ -1,46 +1,115 @@
 import json
+import logging
+import time
 import urllib.request
 from decimal import Decimal
 from django.conf import settings
+from django.utils.module_loading import import_string
 from .models import ExchangeRate
 
+logger = logging.getLogger(__name__)
+
 # Using a free API (open.er-api.com)
 # Base currency KSH (KES)
 API_URL = "https://open.er-api.com/v6/latest/KES"
 
-def fetch_and_update_rates():
+# Currencies we care about (add more as needed)
+TARGET_CURRENCIES = ['USD', 'GBP', 'EUR']
+
+
+class RateSourceError(Exception):
+    pass
+
+
+class HttpRateSource:
+    """open.er-api.com style endpoint: {"result": "success", "rates": {"USD": 0.0077, ...}} per 1 KES"""
+
+    def __init__(self, url=API_URL, timeout=10):
+        self.url = url
+        self.timeout = timeout
+
+    def __str__(self):
+        return self.url
+
+    def fetch(self):
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            data = json.loads(response.read().decode())
+        if data.get('result', 'success') != 'success':
+            raise RateSourceError("Failed to fetch rates from API")
+        return data.get('rates', {})
+
+
+class JsonFileRateSource:
+    """Local JSON file in the same shape as the API response, for offline use and testing"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def __str__(self):
+        return self.path
+
+    def fetch(self):
+        with open(self.path) as handle:
+            data = json.load(handle)
+        return data.get('rates', data)
+
+
+def get_rate_source(source=None):
+    """
+    Build a rate source from a URL, a .json file path or a dotted path to a
+    source class. Defaults to settings.EXCHANGE_RATE_SOURCE, then the public API.
+    """
+    source = source or getattr(settings, 'EXCHANGE_RATE_SOURCE', None) or API_URL
+    if not isinstance(source, str):
+        return source
+    if source.startswith(('http://', 'https://')):
+        return HttpRateSource(source)
+    if source.endswith('.json'):
+        return JsonFileRateSource(source)
+    return import_string(source)()
+
+
+def update_rates_from_source(source, currencies=None, retries=3, backoff=2.0):
+    """
+    Fetch rates (per 1 KES) from ``source`` with retries and store them as
+    KSH per unit. Returns (success, message).
+    """
+    currencies = currencies or TARGET_CURRENCIES
+    rates = None
+    for attempt in range(1, retries + 1):
+        try:
+            rates = source.fetch()
+            break
+        except Exception as e:
+            logger.warning(f"Exchange rate fetch from {source} failed (attempt {attempt}/{retries}): {e}")
+            if attempt == retries:
+                return False, str(e)
+            time.sleep(backoff * attempt)
+
+    updated_count = 0
+    for code in currencies:
+        rate_in_kes = rates.get(code)  # This is 1 KES = X USD
+
+        if rate_in_kes:
+            # We store "How much KSH is 1 Unit of Foreign Currency"
+            # So if 1 KES = 0.0077 USD, then 1 USD = 1/0.0077 KES
+            rate_decimal = Decimal(1) / Decimal(str(rate_in_kes))
+
+            obj, created = ExchangeRate.objects.update_or_create(
+                currency=code,
+                defaults={'rate': rate_decimal}
+            )
+            updated_count += 1
+
+    return True, f"Successfully updated {updated_count} currencies"
+
+
+def fetch_and_update_rates(source=None, retries=3):
     """
     Fetches live exchange rates relative to KES (Kenyan Shilling)
     and updates the ExchangeRate model.
     """
     try:
-        with urllib.request.urlopen(API_URL) as response:
-            data = json.loads(response.read().decode())
-            
-        if data.get('result') != 'success':
-            return False, "Failed to fetch rates from API"
-            
-        rates = data.get('rates', {})
-        
-        # Currencies we care about (add more as needed)
-        target_currencies = ['USD', 'GBP', 'EUR']
-        
-        updated_count = 0
-        for code in target_currencies:
-            rate_in_kes = rates.get(code) # This is 1 KES = X USD
-             
-            if rate_in_kes:
-                # We store "How much KSH is 1 Unit of Foreign Currency"
-                # So if 1 KES = 0.0077 USD, then 1 USD = 1/0.0077 KES
-                rate_decimal = Decimal(1) / Decimal(str(rate_in_kes))
-                
-                obj, created = ExchangeRate.objects.update_or_create(
-                    currency=code,
-                    defaults={'rate': rate_decimal}
-                )
-                updated_count += 1
-                
-        return True, f"Successfully updated {updated_count} currencies"
-        
+        return update_rates_from_source(get_rate_source(source), retries=retries)
     except Exception as e:
         return False, str(e)
@@ -1,7 +1,7 @@
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
 from django.db.models import Sum, Q, Count
 from django.utils import timezone
 from django.core.paginator import Paginator
@@ -13,6 +13,7 @@ from django.conf import settings
 from datetime import datetime, date
 from dateutil.relativedelta import relativedelta
 from decimal import Decimal
+import csv
 import json
 import os
 
@@ -23,6 +24,7 @@ from .models import (
 from customers.models import Customer
 from orders.models import Order
 from invoices.models import CreditNote
+from .aging import AGING_BUCKETS, aging_summary, outstanding_orders
 from .forms import CustomAccountStatementForm
 
 
@@ -364,6 +366,72 @@ def customer_balance_detail(request, customer_id):
     return render(request, 'payments/customer_balance_detail.html', context)
 
 
+def _aging_as_of(request):
+    as_of = request.GET.get('as_of')
+    if as_of:
+        try:
+            return datetime.strptime(as_of, '%Y-%m-%d').date()
+        except ValueError:
+            pass
+    return timezone.now().date()
+
+
+@login_required
+def receivables_aging(request):
+    """Receivables aging by customer and currency as of a date"""
+    summary = aging_summary(_aging_as_of(request))
+
+    def with_amounts(row):
+        return dict(row, amounts=[row[key] for key, _, _ in AGING_BUCKETS])
+
+    currency = request.GET.get('currency')
+    customers = [
+        with_amounts(row) for row in summary['customers']
+        if not currency or row['currency'] == currency
+    ]
+
+    context = {
+        'as_of': summary['as_of'],
+        'buckets': AGING_BUCKETS,
+        'customers': customers,
+        'totals': [with_amounts(row) for row in summary['totals']],
+        'currencies': [total['currency'] for total in summary['totals']],
+        'filters': request.GET,
+    }
+
+    return render(request, 'payments/receivables_aging.html', context)
+
+
+class _Echo:
+    """File-like object that hands written rows straight back to the csv writer"""
+
+    def write(self, value):
+        return value
+
+
+@login_required
+def receivables_aging_csv(request):
+    """Stream the outstanding orders behind the aging report as CSV"""
+    as_of = _aging_as_of(request)
+    orders = outstanding_orders(as_of).order_by('currency', 'customer__name', 'date').values_list(
+        'customer__name', 'invoice_code', 'date', 'currency', 'total_amount',
+        'allocated', 'credited', 'outstanding', 'age_bucket',
+    )
+    labels = {key: label for key, label, _ in AGING_BUCKETS}
+
+    def rows():
+        yield ['Customer', 'Invoice', 'Date', 'Currency', 'Total', 'Paid', 'Credited',
+               'Outstanding', 'Days', 'Bucket']
+        for customer, invoice_code, order_date, currency, total, paid, credited, outstanding, bucket in orders.iterator():
+            yield [customer, invoice_code, order_date.isoformat(), currency, total, paid, credited,
+                   outstanding, (as_of - order_date).days, labels[bucket]]
+
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows()), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="receivables_aging_{as_of.isoformat()}.csv"'
+    return response
+
+
 @login_required
 def account_statement_list(request):
     """List all account statements"""
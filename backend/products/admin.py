@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Product, CustomerProductPrice
+from .models import Product, CustomerProductPrice, PriceListEntry
 
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
@@ -12,3 +12,10 @@ class CustomerProductPriceAdmin(admin.ModelAdmin):
     list_display = ('customer', 'product', 'stem_length_cm', 'price_per_stem')
     list_filter = ('customer', 'product', 'stem_length_cm')
     search_fields = ('customer__name', 'product__name')
+
+@admin.register(PriceListEntry)
+class PriceListEntryAdmin(admin.ModelAdmin):
+    list_display = ('customer', 'product', 'stem_length_cm', 'price_per_stem', 'valid_from', 'valid_to', 'source')
+    list_filter = ('customer', 'product', 'stem_length_cm', 'source')
+    search_fields = ('customer__name', 'product__name', 'source')
+    date_hierarchy = 'valid_from'
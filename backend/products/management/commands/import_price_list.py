@@ -0,0 +1,57 @@
+import csv
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+
+from products.price_lists import import_price_list
+
+
+class Command(BaseCommand):
+    help = (
+        'Import an effective-dated price list from a CSV with customer_id, product_id, '
+        'stem_length_cm and price_per_stem columns'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path to the price list CSV')
+        parser.add_argument('--valid-from', required=True, help='First day the prices apply (YYYY-MM-DD)')
+        parser.add_argument('--valid-to', help='First day the prices no longer apply (YYYY-MM-DD, default: open-ended)')
+        parser.add_argument('--source', default='', help='Label stored with the entries, e.g. "Valentines 2027"')
+
+    def _parse_date(self, value, label):
+        if not value:
+            return None
+        try:
+            return datetime.strptime(value, '%Y-%m-%d').date()
+        except ValueError:
+            raise CommandError(f'Invalid --{label} date "{value}", expected YYYY-MM-DD')
+
+    def handle(self, *args, **options):
+        valid_from = self._parse_date(options['valid_from'], 'valid-from')
+        valid_to = self._parse_date(options['valid_to'], 'valid-to')
+        if valid_to and valid_to <= valid_from:
+            raise CommandError('--valid-to must be after --valid-from')
+
+        rows = []
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as handle:
+                for line, record in enumerate(csv.DictReader(handle), start=2):
+                    try:
+                        rows.append((
+                            int(record['customer_id']),
+                            int(record['product_id']),
+                            int(record['stem_length_cm']),
+                            Decimal(record['price_per_stem']),
+                        ))
+                    except (KeyError, TypeError, ValueError, InvalidOperation):
+                        raise CommandError(f'Invalid row on line {line}: {record}')
+        except OSError as exc:
+            raise CommandError(f'Cannot read {options["csv_file"]}: {exc}')
+
+        self.stdout.write(f"Importing {len(rows)} prices valid from {valid_from} to {valid_to or 'open-ended'}...")
+        result = import_price_list(rows, valid_from, valid_to, source=options['source'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {result['created']}, updated {result['updated']}, deleted {result['deleted']} "
+            f"entries ({result['unchanged']} prices unchanged)"
+        ))
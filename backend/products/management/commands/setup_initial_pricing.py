@@ -1,5 +1,7 @@
 from django.core.management.base import BaseCommand
-from products.models import Product, CustomerProductPrice
+from django.db import transaction
+from products.models import Product
+from products.price_matrix import upsert_customer_prices
 from customers.models import Customer
 from decimal import Decimal
 
@@ -55,59 +57,18 @@ class Command(BaseCommand):
             self.stdout.write(self.style.ERROR('No products found'))
             return
 
-        # Set up pricing
-        created_count = 0
-        updated_count = 0
-
-        for customer in customers:
-            for product in products:
-                # Check if pricing already exists
-                pricing, created = CustomerProductPrice.objects.get_or_create(
-                    customer=customer,
-                    product=product,
-                    stem_length_cm=stem_length,
-                    defaults={'price_per_stem': price}
-                )
-
-                if created:
-                    self.stdout.write(
-                        f"Created pricing: {customer.name} - {product.name} @ {stem_length}cm: ${price}"
-                    )
-                    created_count += 1
-                else:
-                    # Update existing pricing
-                    if pricing.price_per_stem != price:
-                        pricing.price_per_stem = price
-                        pricing.save()
-                        self.stdout.write(
-                            f"Updated pricing: {customer.name} - {product.name} @ {stem_length}cm: ${price}"
-                        )
-                        updated_count += 1
-                    else:
-                        self.stdout.write(
-                            f"Pricing already exists: {customer.name} - {product.name} @ {stem_length}cm: ${price}"
-                        )
+        # Set up pricing: one bulk upsert instead of a get_or_create per pair
+        prices = {
+            (customer_id, product_id, stem_length): price
+            for customer_id in customers.values_list('id', flat=True)
+            for product_id in products.values_list('id', flat=True)
+        }
+        with transaction.atomic():
+            created_count, updated_count = upsert_customer_prices(prices)
 
         self.stdout.write(
             self.style.SUCCESS(
-                f'Successfully processed {created_count} new pricing records and {updated_count} updates'
+                f'Successfully processed {created_count} new pricing records and {updated_count} updates '
+                f'({len(prices) - created_count - updated_count} already at {price})'
             )
         )
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
-
@@ -0,0 +1,57 @@
+# Generated by Django 3.2.18 on 2026-10-18 15:20
+
+from datetime import date
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def seed_price_lists(apps, schema_editor):
+    """
+    Start the history with the current customer prices. There is no record of
+    when they took effect, so they apply open-ended from a fixed early date.
+    """
+    CustomerProductPrice = apps.get_model('products', 'CustomerProductPrice')
+    PriceListEntry = apps.get_model('products', 'PriceListEntry')
+    PriceListEntry.objects.bulk_create([
+        PriceListEntry(
+            customer_id=price.customer_id,
+            product_id=price.product_id,
+            stem_length_cm=price.stem_length_cm,
+            price_per_stem=price.price_per_stem,
+            valid_from=date(2000, 1, 1),
+            source='initial',
+        )
+        for price in CustomerProductPrice.objects.all()
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('customers', '0004_alter_customer_email'),
+        ('products', '0005_auto_20260502_1155'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PriceListEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stem_length_cm', models.PositiveIntegerField(help_text='Stem length in centimeters')),
+                ('price_per_stem', models.DecimalField(decimal_places=2, max_digits=10)),
+                ('valid_from', models.DateField()),
+                ('valid_to', models.DateField(blank=True, help_text='First day the price no longer applies (blank = open-ended)', null=True)),
+                ('source', models.CharField(blank=True, help_text='Where the price came from, e.g. a price list name', max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('customer', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_list_entries', to='customers.customer')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_list_entries', to='products.product')),
+            ],
+            options={
+                'verbose_name_plural': 'Price list entries',
+                'ordering': ['customer', 'product', 'stem_length_cm', '-valid_from'],
+                'unique_together': {('customer', 'product', 'stem_length_cm', 'valid_from')},
+            },
+        ),
+        migrations.RunPython(seed_price_lists, migrations.RunPython.noop),
+    ]
@@ -1,4 +1,6 @@
 from django.db import models
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from customers.models import Customer
 
 class Product(models.Model):
@@ -29,3 +31,54 @@ class CustomerProductPrice(models.Model):
     def __str__(self):
         return f"{self.customer.name} - {self.product.name} @ {self.stem_length_cm}cm: {self.price_per_stem}"
 
+
+class PriceListEntry(models.Model):
+    """
+    Customer price for a product and stem length over a date range.
+    valid_to is exclusive; an open-ended entry has no valid_to. Entries for
+    the same key never overlap (see products.price_lists).
+    """
+    customer = models.ForeignKey(Customer, on_delete=models.CASCADE, related_name='price_list_entries')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='price_list_entries')
+    stem_length_cm = models.PositiveIntegerField(help_text="Stem length in centimeters")
+    price_per_stem = models.DecimalField(max_digits=10, decimal_places=2)
+    valid_from = models.DateField()
+    valid_to = models.DateField(null=True, blank=True, help_text="First day the price no longer applies (blank = open-ended)")
+    source = models.CharField(max_length=100, blank=True, help_text="Where the price came from, e.g. a price list name")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        # The unique index on (customer, product, stem length, valid_from) serves as-of lookups
+        unique_together = ('customer', 'product', 'stem_length_cm', 'valid_from')
+        ordering = ['customer', 'product', 'stem_length_cm', '-valid_from']
+        verbose_name_plural = 'Price list entries'
+
+    def __str__(self):
+        until = f" until {self.valid_to}" if self.valid_to else ""
+        return f"{self.customer.name} - {self.product.name} @ {self.stem_length_cm}cm: {self.price_per_stem} from {self.valid_from}{until}"
+
+
+@receiver(post_save, sender=CustomerProductPrice)
+@receiver(post_delete, sender=CustomerProductPrice)
+def invalidate_price_cache(sender, instance, **kwargs):
+    """Drop the resolver's cached entry for this price key"""
+    from .pricing import invalidate_prices
+    invalidate_prices([(instance.customer_id, instance.product_id, instance.stem_length_cm)])
+
+
+@receiver(post_save, sender=CustomerProductPrice)
+def record_price_history(sender, instance, raw=False, **kwargs):
+    """Keep the price list history in step with the current customer price"""
+    if raw:
+        return
+    from .price_lists import record_current_prices
+    record_current_prices([
+        (instance.customer_id, instance.product_id, instance.stem_length_cm, instance.price_per_stem)
+    ])
+
+
+@receiver(post_delete, sender=CustomerProductPrice)
+def close_price_history(sender, instance, **kwargs):
+    """A deleted customer price stops applying from today"""
+    from .price_lists import close_current_prices
+    close_current_prices([(instance.customer_id, instance.product_id, instance.stem_length_cm)])
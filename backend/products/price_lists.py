@@ -0,0 +1,219 @@
+"""
+Effective-dated customer price lists.
+
+PriceListEntry rows hold the price of a (customer, product, stem length) key
+over [valid_from, valid_to). Lookups for many order lines at arbitrary dates
+load the candidate entries for all keys in one query per batch of keys and
+bisect per line:
+
+    prices = prices_as_of([(customer_id, product_id, 60, date(2026, 2, 10)), ...])
+
+import_price_list() writes a seasonal or open-ended list with one select and
+a bulk delete/update/insert, trimming or splitting the entries it overlaps so
+ranges for a key never overlap. An open-ended price runs until the next entry
+already scheduled for its key, so importing a new regular price does not wipe
+a seasonal list planned for later. record_current_prices() and
+close_current_prices() keep the history in step with CustomerProductPrice.
+
+Order lines are priced by their order date with order_line_prices(): the
+entry in effect on that date, else the current CustomerProductPrice.
+"""
+from bisect import bisect_right
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from .models import PriceListEntry
+
+LOOKUP_BATCH_SIZE = 500
+
+
+def _as_date(value):
+    # Order.date defaults to timezone.now and views assign form strings, so unsaved orders may not hold a date
+    if isinstance(value, datetime):
+        if timezone.is_aware(value):
+            value = timezone.localtime(value)
+        return value.date()
+    if isinstance(value, str):
+        return parse_date(value)
+    return value
+
+
+def _entries_by_key(keys, start, end=None):
+    """
+    Entries for (customer_id, product_id, stem_length_cm) keys that overlap
+    [start, end) (end None = unbounded), per key ordered by valid_from.
+    """
+    grouped = {}
+    keys = list(keys)
+    for offset in range(0, len(keys), LOOKUP_BATCH_SIZE):
+        chunk = set(keys[offset:offset + LOOKUP_BATCH_SIZE])
+        queryset = PriceListEntry.objects.filter(
+            customer_id__in={key[0] for key in chunk},
+            product_id__in={key[1] for key in chunk},
+            stem_length_cm__in={key[2] for key in chunk},
+        ).filter(
+            Q(valid_to__isnull=True) | Q(valid_to__gt=start)
+        ).order_by('valid_from')
+        if end is not None:
+            queryset = queryset.filter(valid_from__lt=end)
+        for entry in queryset:
+            key = (entry.customer_id, entry.product_id, entry.stem_length_cm)
+            if key in chunk:
+                grouped.setdefault(key, []).append(entry)
+    return grouped
+
+
+def prices_as_of(lines):
+    """
+    {line: price or None} for (customer_id, product_id, stem_length_cm, date)
+    lines; None where no entry covers the date.
+    """
+    lines = [tuple(line) for line in lines]
+    if not lines:
+        return {}
+    dates = {line: _as_date(line[3]) for line in lines}
+    grouped = _entries_by_key(
+        {line[:3] for line in lines}, min(dates.values()), max(dates.values()) + timedelta(days=1)
+    )
+    starts = {key: [entry.valid_from for entry in entries] for key, entries in grouped.items()}
+
+    prices = {}
+    for line in lines:
+        key, on_date = line[:3], dates[line]
+        price = None
+        if key in grouped:
+            index = bisect_right(starts[key], on_date) - 1
+            if index >= 0:
+                entry = grouped[key][index]
+                if entry.valid_to is None or on_date < entry.valid_to:
+                    price = entry.price_per_stem
+        prices[line] = price
+    return prices
+
+
+def price_as_of(customer_id, product_id, stem_length_cm, on_date):
+    line = (customer_id, product_id, stem_length_cm, on_date)
+    return prices_as_of([line])[line]
+
+
+def order_line_prices(lines):
+    """
+    {line: price or None} for (customer_id, product_id, stem_length_cm, date)
+    order lines: the price list entry in effect on the order date, falling
+    back to the current customer price where the history has no entry.
+    """
+    from .pricing import resolve_prices
+
+    prices = prices_as_of(lines)
+    unpriced = [line[:3] for line, price in prices.items() if price is None]
+    if unpriced:
+        current = resolve_prices(unpriced)
+        for line, price in prices.items():
+            if price is None:
+                prices[line] = current.get(line[:3])
+    return prices
+
+
+def order_line_price(customer_id, product_id, stem_length_cm, on_date):
+    line = (customer_id, product_id, stem_length_cm, on_date)
+    return order_line_prices([line])[line]
+
+
+def import_price_list(rows, valid_from, valid_to=None, source=''):
+    """
+    Apply (customer_id, product_id, stem_length_cm, price) rows as a price
+    list valid from ``valid_from`` until ``valid_to`` (exclusive). Entries the
+    new range overlaps are trimmed, split around it or replaced. Returns
+    {'created': n, 'updated': n, 'deleted': n, 'unchanged': n}.
+    """
+    if valid_to is not None and valid_to <= valid_from:
+        raise ValueError("valid_to must be after valid_from")
+
+    prices = {}
+    for customer_id, product_id, stem_length_cm, price in rows:
+        prices[(customer_id, product_id, stem_length_cm)] = Decimal(str(price))
+    if not prices:
+        return {'created': 0, 'updated': 0, 'deleted': 0, 'unchanged': 0}
+
+    with transaction.atomic():
+        existing = _entries_by_key(prices.keys(), valid_from, valid_to)
+        to_create, to_update, to_delete = [], [], []
+        unchanged = 0
+        for key, price in prices.items():
+            entries = existing.get(key, [])
+            key_to = valid_to
+            if key_to is None:
+                # Open-ended: run until the next entry already scheduled for this key
+                later = [entry.valid_from for entry in entries if entry.valid_from > valid_from]
+                key_to = min(later) if later else None
+                entries = [entry for entry in entries if key_to is None or entry.valid_from < key_to]
+
+            if len(entries) == 1 and entries[0].price_per_stem == price and entries[0].valid_from <= valid_from and (
+                entries[0].valid_to is None or (key_to is not None and entries[0].valid_to >= key_to)
+            ):
+                unchanged += 1
+                continue
+
+            for entry in entries:
+                starts_before = entry.valid_from < valid_from
+                ends_after = key_to is not None and (entry.valid_to is None or entry.valid_to > key_to)
+                if starts_before and ends_after:
+                    # Split around the new range; the old price resumes afterwards
+                    to_create.append(PriceListEntry(
+                        customer_id=key[0], product_id=key[1], stem_length_cm=key[2],
+                        price_per_stem=entry.price_per_stem, valid_from=key_to, valid_to=entry.valid_to,
+                        source=entry.source,
+                    ))
+                    entry.valid_to = valid_from
+                    to_update.append(entry)
+                elif starts_before:
+                    entry.valid_to = valid_from
+                    to_update.append(entry)
+                elif ends_after:
+                    entry.valid_from = key_to
+                    to_update.append(entry)
+                else:
+                    to_delete.append(entry.pk)
+
+            to_create.append(PriceListEntry(
+                customer_id=key[0], product_id=key[1], stem_length_cm=key[2],
+                price_per_stem=price, valid_from=valid_from, valid_to=key_to, source=source,
+            ))
+
+        if to_delete:
+            PriceListEntry.objects.filter(pk__in=to_delete).delete()
+        PriceListEntry.objects.bulk_update(to_update, ['valid_from', 'valid_to'])
+        PriceListEntry.objects.bulk_create(to_create)
+
+    return {
+        'created': len(to_create), 'updated': len(to_update),
+        'deleted': len(to_delete), 'unchanged': unchanged,
+    }
+
+
+def record_current_prices(rows, effective_date=None):
+    """Record (customer_id, product_id, stem_length_cm, price) as the price from today on"""
+    return import_price_list(rows, effective_date or timezone.now().date(), source='customer_price')
+
+
+def close_current_prices(keys, effective_date=None):
+    """
+    End the open-ended entries in effect today for (customer_id, product_id,
+    stem_length_cm) keys whose customer price was deleted. Entries starting
+    today are removed; seasonal (bounded) and later scheduled entries stay.
+    """
+    on_date = effective_date or timezone.now().date()
+    keys = {tuple(key) for key in keys}
+    current = [
+        entry for entries in _entries_by_key(keys, on_date, on_date + timedelta(days=1)).values()
+        for entry in entries if entry.valid_to is None
+    ]
+    with transaction.atomic():
+        PriceListEntry.objects.filter(pk__in=[e.pk for e in current if e.valid_from >= on_date]).delete()
+        PriceListEntry.objects.filter(pk__in=[e.pk for e in current if e.valid_from < on_date]).update(valid_to=on_date)
+    return len(current)
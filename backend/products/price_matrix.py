@@ -0,0 +1,281 @@
+"""
+Customer price matrix: bulk import, streaming export and mass repricing.
+
+The matrix has one row per (customer, product) and one column per stem
+length:
+
+    Customer ID, Customer, Product ID, Product, 40cm, 50cm, 60cm, ...
+
+Imports (CSV or XLSX) are parsed and validated in memory first; nothing is
+written unless the whole file is valid, and then every price is upserted
+with one SELECT, one bulk insert, a SELECT re-checking the inserted keys
+(another writer may have inserted some first) and one bulk update. Repricing reads the
+matching prices once and writes the changed ones in chunked bulk updates.
+Both bypass model signals, so they invalidate the price
+resolver, bump the price sheet versions and record price history themselves.
+"""
+import csv
+import io
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+
+from core.versioning import bump_version, customer_scope
+from customers.models import Customer
+from .models import Product, CustomerProductPrice
+from .price_lists import record_current_prices
+from .pricing import invalidate_prices
+
+BATCH_SIZE = 500
+MIN_PRICE = Decimal('0.01')
+ID_COLUMNS = ['Customer ID', 'Customer', 'Product ID', 'Product']
+STEM_COLUMN = re.compile(r'^\s*(\d+)\s*(cm)?\s*$', re.IGNORECASE)
+
+
+class PriceMatrixError(Exception):
+    """Raised when an import file is invalid; ``errors`` lists every problem found"""
+
+    def __init__(self, errors):
+        self.errors = errors
+        super().__init__(f"{len(errors)} error(s) in price matrix")
+
+
+def _prices_written(rows):
+    """Bulk writes skip post_save: bump the price sheet scopes, resolver and history"""
+    if not rows:
+        return
+    bump_version('products', *{customer_scope(row[0]) for row in rows})
+    invalidate_prices([row[:3] for row in rows])
+    record_current_prices(rows)
+
+
+def upsert_customer_prices(prices_by_key):
+    """
+    Insert or update CustomerProductPrice from
+    {(customer_id, product_id, stem_length_cm): price}. Returns
+    (created, updated); rows already at the price are left alone.
+    """
+    if not prices_by_key:
+        return 0, 0
+    existing = {
+        (p.customer_id, p.product_id, p.stem_length_cm): p
+        for p in CustomerProductPrice.objects.filter(
+            customer_id__in={key[0] for key in prices_by_key},
+            product_id__in={key[1] for key in prices_by_key},
+        )
+    }
+    new_prices, changed_prices = [], []
+    for key, price in prices_by_key.items():
+        current = existing.get(key)
+        if current is None:
+            new_prices.append(CustomerProductPrice(
+                customer_id=key[0], product_id=key[1], stem_length_cm=key[2], price_per_stem=price
+            ))
+        elif current.price_per_stem != price:
+            current.price_per_stem = price
+            changed_prices.append(current)
+
+    CustomerProductPrice.objects.bulk_create(new_prices, batch_size=BATCH_SIZE, ignore_conflicts=True)
+    if new_prices:
+        # Keys inserted concurrently were skipped by ignore_conflicts; set them to this price too
+        new_keys = {(p.customer_id, p.product_id, p.stem_length_cm) for p in new_prices}
+        for current in CustomerProductPrice.objects.filter(
+            customer_id__in={key[0] for key in new_keys},
+            product_id__in={key[1] for key in new_keys},
+        ):
+            key = (current.customer_id, current.product_id, current.stem_length_cm)
+            if key in new_keys and current.price_per_stem != prices_by_key[key]:
+                current.price_per_stem = prices_by_key[key]
+                changed_prices.append(current)
+                new_keys.discard(key)
+        new_prices = [p for p in new_prices if (p.customer_id, p.product_id, p.stem_length_cm) in new_keys]
+    CustomerProductPrice.objects.bulk_update(changed_prices, ['price_per_stem'], batch_size=BATCH_SIZE)
+    _prices_written([
+        (p.customer_id, p.product_id, p.stem_length_cm, p.price_per_stem) for p in new_prices + changed_prices
+    ])
+    return len(new_prices), len(changed_prices)
+
+
+def _read_rows(uploaded_file):
+    """Rows of cell values from a CSV or XLSX upload"""
+    name = (getattr(uploaded_file, 'name', '') or '').lower()
+    if name.endswith('.xlsx'):
+        try:
+            from openpyxl import load_workbook
+        except ImportError:
+            raise PriceMatrixError(['XLSX import needs the openpyxl package; upload a CSV instead'])
+        try:
+            sheet = load_workbook(uploaded_file, read_only=True, data_only=True).active
+        except Exception as exc:
+            raise PriceMatrixError([f'Cannot read workbook: {exc}'])
+        return [['' if cell is None else str(cell) for cell in row] for row in sheet.iter_rows(values_only=True)]
+    try:
+        text = uploaded_file.read().decode('utf-8-sig')
+    except UnicodeDecodeError:
+        raise PriceMatrixError(['File must be UTF-8 encoded CSV or XLSX'])
+    return list(csv.reader(io.StringIO(text)))
+
+
+def _lookup(row, id_index, name_index, by_id, by_name, label):
+    """Resolve an ID column, falling back to an exact (case-insensitive) name"""
+    raw_id = row[id_index].strip() if id_index is not None and id_index < len(row) else ''
+    raw_name = row[name_index].strip() if name_index is not None and name_index < len(row) else ''
+    if raw_id:
+        try:
+            pk = int(float(raw_id))
+        except ValueError:
+            return None, f'invalid {label} ID "{raw_id}"'
+        if pk not in by_id:
+            return None, f'unknown {label} ID {pk}'
+        return pk, None
+    if raw_name:
+        matches = by_name.get(raw_name.lower(), [])
+        if len(matches) == 1:
+            return matches[0], None
+        if matches:
+            return None, f'{label} name "{raw_name}" is ambiguous, use the ID column'
+        return None, f'unknown {label} "{raw_name}"'
+    return None, f'missing {label}'
+
+
+def parse_price_matrix(uploaded_file):
+    """
+    Validate a price matrix upload and return
+    {(customer_id, product_id, stem_length_cm): price}. Blank cells leave the
+    price unchanged. Raises PriceMatrixError listing every invalid cell.
+    """
+    rows = _read_rows(uploaded_file)
+    if not rows:
+        raise PriceMatrixError(['File is empty'])
+
+    header = [cell.strip() for cell in rows[0]]
+    columns = {name.lower(): index for index, name in enumerate(header)}
+    stem_columns = []
+    for index, name in enumerate(header):
+        match = STEM_COLUMN.match(name)
+        if match:
+            stem_columns.append((index, int(match.group(1))))
+
+    errors = []
+    if 'customer id' not in columns and 'customer' not in columns:
+        errors.append('Missing "Customer ID" or "Customer" column')
+    if 'product id' not in columns and 'product' not in columns:
+        errors.append('Missing "Product ID" or "Product" column')
+    if not stem_columns:
+        errors.append('No stem length columns (e.g. "50cm") found')
+    if errors:
+        raise PriceMatrixError(errors)
+
+    customers_by_id, customers_by_name = {}, {}
+    for pk, name in Customer.objects.values_list('id', 'name'):
+        customers_by_id[pk] = name
+        customers_by_name.setdefault(name.strip().lower(), []).append(pk)
+    products_by_id, products_by_name = {}, {}
+    for pk, name in Product.objects.values_list('id', 'name'):
+        products_by_id[pk] = name
+        products_by_name.setdefault(name.strip().lower(), []).append(pk)
+
+    prices = {}
+    for line, row in enumerate(rows[1:], start=2):
+        if not any(cell.strip() for cell in row):
+            continue
+        customer_id, error = _lookup(
+            row, columns.get('customer id'), columns.get('customer'), customers_by_id, customers_by_name, 'customer'
+        )
+        if error:
+            errors.append(f'Row {line}: {error}')
+        product_id, error = _lookup(
+            row, columns.get('product id'), columns.get('product'), products_by_id, products_by_name, 'product'
+        )
+        if error:
+            errors.append(f'Row {line}: {error}')
+
+        for index, stem_length_cm in stem_columns:
+            raw = row[index].strip() if index < len(row) else ''
+            if not raw:
+                continue
+            try:
+                price = Decimal(raw).quantize(Decimal('0.01'))
+            except InvalidOperation:
+                errors.append(f'Row {line}, {header[index]}: "{raw}" is not a number')
+                continue
+            if price < MIN_PRICE:
+                errors.append(f'Row {line}, {header[index]}: price must be positive')
+                continue
+            if customer_id and product_id:
+                key = (customer_id, product_id, stem_length_cm)
+                if key in prices and prices[key] != price:
+                    errors.append(f'Row {line}, {header[index]}: conflicting price for the same customer and product')
+                prices[key] = price
+
+    if errors:
+        raise PriceMatrixError(errors)
+    return prices
+
+
+def import_price_matrix(uploaded_file):
+    """Validate and apply a price matrix upload; returns (created, updated)"""
+    prices = parse_price_matrix(uploaded_file)
+    with transaction.atomic():
+        return upsert_customer_prices(prices)
+
+
+def price_matrix_rows(customer_id=None, product_id=None):
+    """Yield the matrix header and one row per (customer, product), streaming from the database"""
+    prices = CustomerProductPrice.objects.all()
+    if customer_id:
+        prices = prices.filter(customer_id=customer_id)
+    if product_id:
+        prices = prices.filter(product_id=product_id)
+
+    stems = sorted(set(prices.values_list('stem_length_cm', flat=True).distinct()))
+    yield ID_COLUMNS + [f'{stem}cm' for stem in stems]
+
+    rows = prices.order_by('customer__name', 'customer_id', 'product__name', 'product_id').values_list(
+        'customer_id', 'customer__name', 'product_id', 'product__name', 'stem_length_cm', 'price_per_stem'
+    )
+    current, cells = None, {}
+    for customer_id, customer_name, product_id, product_name, stem, price in rows.iterator():
+        key = (customer_id, customer_name, product_id, product_name)
+        if key != current:
+            if current is not None:
+                yield list(current) + [cells.get(stem, '') for stem in stems]
+            current, cells = key, {}
+        cells[stem] = price
+    if current is not None:
+        yield list(current) + [cells.get(stem, '') for stem in stems]
+
+
+def reprice(percent=None, amount=None, customer_id=None, product_id=None, stem_length_cm=None):
+    """
+    Change matching customer prices by ``percent`` or by an absolute
+    ``amount``, rounded to cents and never below MIN_PRICE. New prices are
+    computed in Python (SQLite has no exact decimal arithmetic) and written
+    with chunked bulk updates. Returns the number of prices changed.
+    """
+    if (percent is None) == (amount is None):
+        raise ValueError("Give either a percentage or an amount")
+
+    prices = CustomerProductPrice.objects.all()
+    if customer_id:
+        prices = prices.filter(customer_id=customer_id)
+    if product_id:
+        prices = prices.filter(product_id=product_id)
+    if stem_length_cm:
+        prices = prices.filter(stem_length_cm=stem_length_cm)
+
+    factor = Decimal('1') + Decimal(str(percent)) / 100 if percent is not None else None
+    delta = Decimal(str(amount)) if amount is not None else None
+
+    with transaction.atomic():
+        changed = []
+        for price in prices.only('id', 'customer_id', 'product_id', 'stem_length_cm', 'price_per_stem').iterator():
+            new_price = price.price_per_stem * factor if factor is not None else price.price_per_stem + delta
+            new_price = max(new_price.quantize(Decimal('0.01')), MIN_PRICE)
+            if new_price != price.price_per_stem:
+                price.price_per_stem = new_price
+                changed.append(price)
+        CustomerProductPrice.objects.bulk_update(changed, ['price_per_stem'], batch_size=BATCH_SIZE)
+        _prices_written([(p.customer_id, p.product_id, p.stem_length_cm, p.price_per_stem) for p in changed])
+    return len(changed)
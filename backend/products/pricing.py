@@ -0,0 +1,187 @@
+"""
+Process-local customer price resolution.
+
+Order lines and missed sales look up CustomerProductPrice by (customer,
+product, stem length) on every save. The resolver keeps a bounded LRU of
+those lookups, including negative entries for keys without a price, and
+resolves many keys with one IN query.
+
+Saves and deletes of CustomerProductPrice evict the key locally and, on
+commit, bump the 'customer_prices' DataVersion counter (core.versioning).
+The resolver reads that counter at most every PRICE_STAMP_INTERVAL seconds
+and drops the LRU when it moved, so other processes stop serving a price at
+most that long after it commits, whatever cache backend is configured.
+Reads inside a transaction are cached too, except for keys this thread has
+written since it was last outside one: those may be uncommitted.
+
+    price = resolve_price(customer_id, product_id, 60)        # Decimal or None
+    prices = resolve_prices([(customer_id, product_id, 60), ...])
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from core.versioning import bump_version
+
+STAMP_SCOPE = 'customer_prices'
+PRICE_CACHE_SIZE = getattr(settings, 'PRICE_CACHE_SIZE', 4096)
+# Seconds a process may serve prices before checking other processes' changes
+PRICE_STAMP_INTERVAL = getattr(settings, 'PRICE_STAMP_INTERVAL', 5)
+
+_MISSING = object()
+
+
+def _shared_stamp():
+    from core.models import DataVersion
+    return DataVersion.objects.filter(scope=STAMP_SCOPE).values_list('version', flat=True).first() or 0
+
+
+class PriceResolver:
+    """Bounded LRU of (customer_id, product_id, stem_length_cm) -> price or None"""
+
+    def __init__(self, max_entries=PRICE_CACHE_SIZE, stamp_interval=PRICE_STAMP_INTERVAL):
+        self.max_entries = max_entries
+        self.stamp_interval = stamp_interval
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._stamp = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+        # Keys written by this thread's open transaction (see mark_written)
+        self._local = threading.local()
+
+    def _sync_stamp(self):
+        now = time.monotonic()
+        if self._checked_at is not None and now - self._checked_at < self.stamp_interval:
+            return
+        stamp = _shared_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                self._entries.clear()
+                self._stamp = stamp
+            self._checked_at = now
+
+    def _written_keys(self):
+        """Keys this thread wrote in its open transaction; forgotten once outside one"""
+        written = getattr(self._local, 'written', None)
+        if written is None or not connection.in_atomic_block:
+            written = self._local.written = set()
+        return written
+
+    def mark_written(self, keys):
+        """Do not cache these keys until this thread's transaction has ended"""
+        if connection.in_atomic_block:
+            self._written_keys().update(keys)
+
+    def _lookup(self, key):
+        with self._lock:
+            value = self._entries.get(key, _MISSING)
+            if value is _MISSING:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            return value
+
+    def _store(self, key, price):
+        with self._lock:
+            self._entries[key] = price
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def resolve(self, customer_id, product_id, stem_length_cm):
+        """Customer price for the key, or None if there is none"""
+        return self.resolve_many([(customer_id, product_id, stem_length_cm)])[
+            (customer_id, product_id, stem_length_cm)
+        ]
+
+    def resolve_many(self, keys):
+        """
+        {key: price or None} for (customer_id, product_id, stem_length_cm)
+        keys; everything not cached is fetched with a single query.
+        """
+        from .models import CustomerProductPrice
+
+        self._sync_stamp()
+        resolved, missing = {}, set()
+        for key in keys:
+            key = tuple(key)
+            if key in resolved or key in missing:
+                continue
+            value = self._lookup(key)
+            if value is _MISSING:
+                missing.add(key)
+            else:
+                resolved[key] = value
+
+        if missing:
+            # Rows this transaction wrote may be uncommitted (and rolled back)
+            uncommitted = self._written_keys()
+            found = {}
+            rows = CustomerProductPrice.objects.filter(
+                customer_id__in={key[0] for key in missing},
+                product_id__in={key[1] for key in missing},
+                stem_length_cm__in={key[2] for key in missing},
+            ).values_list('customer_id', 'product_id', 'stem_length_cm', 'price_per_stem')
+            for customer_id, product_id, stem_length_cm, price in rows:
+                found[(customer_id, product_id, stem_length_cm)] = price
+            for key in missing:
+                # None is cached too, so keys without a price do not hit the database again
+                resolved[key] = found.get(key)
+                if key not in uncommitted:
+                    self._store(key, resolved[key])
+        return resolved
+
+    def evict(self, keys):
+        with self._lock:
+            for key in keys:
+                self._entries.pop(tuple(key), None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._checked_at = None
+
+    def stats(self):
+        total = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_ratio': round(self.hits / total, 4) if total else None,
+            'size': len(self._entries),
+            'max_entries': self.max_entries,
+        }
+
+
+resolver = PriceResolver()
+
+
+def resolve_price(customer_id, product_id, stem_length_cm):
+    return resolver.resolve(customer_id, product_id, stem_length_cm)
+
+
+def resolve_prices(keys):
+    return resolver.resolve_many(keys)
+
+
+def price_cache_stats():
+    """Hit/miss counters of this process's price resolver"""
+    return resolver.stats()
+
+
+def invalidate_prices(keys):
+    """
+    Forget cached prices for (customer_id, product_id, stem_length_cm) keys,
+    here now and in every process once the current transaction commits.
+    """
+    keys = [tuple(key) for key in keys]
+    resolver.evict(keys)
+    resolver.mark_written(keys)
+    transaction.on_commit(lambda: resolver.evict(keys))
+    bump_version(STAMP_SCOPE)
+
@@ -1,3 +1,165 @@
-from django.test import TestCase
+from datetime import date, datetime
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.db import transaction
+from django.test import TestCase, TransactionTestCase
+
+from core.versioning import _increment
+from customers.models import Customer
+from .models import Product, CustomerProductPrice
+from .price_lists import import_price_list, order_line_prices, prices_as_of
+from .price_matrix import reprice, upsert_customer_prices
+from .pricing import STAMP_SCOPE, PriceResolver, resolve_price, resolver
+
+
+class RepriceTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='USD')
+        self.product = Product.objects.create(name='Rhodos', stem_length_cm=50)
+        self.price_50 = CustomerProductPrice.objects.create(
+            customer=self.customer, product=self.product, stem_length_cm=50, price_per_stem=Decimal('0.70')
+        )
+        self.price_60 = CustomerProductPrice.objects.create(
+            customer=self.customer, product=self.product, stem_length_cm=60, price_per_stem=Decimal('0.80')
+        )
+
+    def test_percent_increase(self):
+        self.assertEqual(reprice(percent=10), 2)
+        self.price_50.refresh_from_db()
+        self.price_60.refresh_from_db()
+        self.assertEqual(self.price_50.price_per_stem, Decimal('0.77'))
+        self.assertEqual(self.price_60.price_per_stem, Decimal('0.88'))
+
+    def test_amount_change(self):
+        reprice(amount=Decimal('0.05'), stem_length_cm=50)
+        self.price_50.refresh_from_db()
+        self.price_60.refresh_from_db()
+        self.assertEqual(self.price_50.price_per_stem, Decimal('0.75'))
+        self.assertEqual(self.price_60.price_per_stem, Decimal('0.80'))
+
+    def test_never_below_minimum(self):
+        reprice(amount=Decimal('-5'))
+        self.price_50.refresh_from_db()
+        self.assertEqual(self.price_50.price_per_stem, Decimal('0.01'))
+
+    def test_requires_exactly_one_change(self):
+        with self.assertRaises(ValueError):
+            reprice()
+        with self.assertRaises(ValueError):
+            reprice(percent=5, amount=1)
+
+    def test_upsert_overwrites_concurrently_inserted_price(self):
+        other = Product.objects.create(name='Athena', stem_length_cm=50)
+        key = (self.customer.pk, other.pk, 50)
+        bulk_create = CustomerProductPrice.objects.bulk_create
+
+        def insert_first(objs, **kwargs):
+            # Another writer inserts the key between our SELECT and INSERT
+            CustomerProductPrice.objects.create(
+                customer=self.customer, product=other, stem_length_cm=50, price_per_stem=Decimal('0.40')
+            )
+            return bulk_create(objs, **kwargs)
+
+        with mock.patch.object(CustomerProductPrice.objects, 'bulk_create', side_effect=insert_first):
+            self.assertEqual(upsert_customer_prices({key: Decimal('0.60')}), (0, 1))
+        stored = CustomerProductPrice.objects.get(product=other).price_per_stem
+        self.assertEqual(stored, Decimal('0.60'))
+        self.assertEqual(prices_as_of([key + (date.today(),)])[key + (date.today(),)], Decimal('0.60'))
+
+
+class PriceListTests(TestCase):
+    def setUp(self):
+        self.customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='USD')
+        self.product = Product.objects.create(name='Rhodos', stem_length_cm=50)
+        self.key = (self.customer.pk, self.product.pk, 50)
+        import_price_list([self.key + (Decimal('0.50'),)], date(2026, 1, 1))
+
+    def price_on(self, on_date):
+        line = self.key + (on_date,)
+        return prices_as_of([line])[line]
+
+    def test_seasonal_list_splits_regular_price(self):
+        result = import_price_list([self.key + (Decimal('0.90'),)], date(2026, 2, 1), date(2026, 2, 15))
+        self.assertEqual(result, {'created': 2, 'updated': 1, 'deleted': 0, 'unchanged': 0})
+        self.assertEqual(self.price_on(date(2026, 1, 31)), Decimal('0.50'))
+        self.assertEqual(self.price_on(date(2026, 2, 10)), Decimal('0.90'))
+        self.assertEqual(self.price_on(date(2026, 2, 15)), Decimal('0.50'))
+        self.assertIsNone(self.price_on(date(2025, 12, 31)))
+
+    def test_open_ended_price_stops_at_scheduled_list(self):
+        import_price_list([self.key + (Decimal('0.90'),)], date(2026, 2, 1), date(2026, 2, 15))
+        import_price_list([self.key + (Decimal('0.60'),)], date(2026, 1, 20))
+        self.assertEqual(self.price_on(date(2026, 1, 25)), Decimal('0.60'))
+        self.assertEqual(self.price_on(date(2026, 2, 10)), Decimal('0.90'))
+        self.assertEqual(self.price_on(date(2026, 3, 1)), Decimal('0.50'))
+
+    def test_order_line_prices_fall_back_to_current_price(self):
+        other = Product.objects.create(name='Athena', stem_length_cm=60)
+        CustomerProductPrice.objects.create(
+            customer=self.customer, product=other, stem_length_cm=60, price_per_stem=Decimal('0.40')
+        )
+        seasonal = self.key + (date(2026, 1, 10),)
+        before_history = (self.customer.pk, other.pk, 60, date(1999, 1, 1))
+        prices = order_line_prices([seasonal, before_history])
+        self.assertEqual(prices[seasonal], Decimal('0.50'))
+        self.assertEqual(prices[before_history], Decimal('0.40'))
+
+    def test_unsaved_order_dates_are_normalised(self):
+        for on_date in (datetime(2026, 1, 10, 15, 30), '2026-01-10'):
+            self.assertEqual(self.price_on(on_date), Decimal('0.50'))
+
+    def test_deleting_customer_price_closes_history(self):
+        today = date.today()
+        price = CustomerProductPrice.objects.create(
+            customer=self.customer, product=self.product, stem_length_cm=50, price_per_stem=Decimal('0.70')
+        )
+        self.assertEqual(self.price_on(today), Decimal('0.70'))
+        price.delete()
+        self.assertIsNone(self.price_on(today))
+        self.assertEqual(self.price_on(date(2026, 1, 10)), Decimal('0.50'))
+
+
+class PriceResolverTests(TransactionTestCase):
+    def setUp(self):
+        customer = Customer.objects.create(name='Acme Flowers', short_code='ACME', preferred_currency='USD')
+        product = Product.objects.create(name='Rhodos', stem_length_cm=50)
+        self.price = CustomerProductPrice.objects.create(
+            customer=customer, product=product, stem_length_cm=50, price_per_stem=Decimal('0.70')
+        )
+        self.key = (customer.pk, product.pk, 50)
+        self.resolver = PriceResolver(stamp_interval=0)
+
+    def test_committed_change_elsewhere_drops_cached_prices(self):
+        self.assertEqual(self.resolver.resolve(*self.key), Decimal('0.70'))
+        self.assertEqual(self.resolver.resolve(*self.key), Decimal('0.70'))
+        self.assertEqual(self.resolver.stats()['hits'], 1)
+
+        # Another process changes the price and bumps the shared counter on commit
+        CustomerProductPrice.objects.filter(pk=self.price.pk).update(price_per_stem=Decimal('0.80'))
+        _increment(STAMP_SCOPE)
+        self.assertEqual(self.resolver.resolve(*self.key), Decimal('0.80'))
+
+    def test_stamp_checked_at_most_every_interval(self):
+        resolver = PriceResolver(stamp_interval=60)
+        resolver.resolve(*self.key)
+        with self.assertNumQueries(0):
+            for _ in range(10):
+                self.assertEqual(resolver.resolve(*self.key), Decimal('0.70'))
+
+    def test_committed_prices_read_in_a_transaction_are_cached(self):
+        with transaction.atomic():
+            self.assertEqual(self.resolver.resolve(*self.key), Decimal('0.70'))
+        self.assertEqual(self.resolver.stats()['size'], 1)
+
+    def test_prices_written_in_a_rolled_back_transaction_are_not_cached(self):
+        resolver.clear()
+        try:
+            with transaction.atomic():
+                self.price.price_per_stem = Decimal('0.90')
+                self.price.save()
+                self.assertEqual(resolve_price(*self.key), Decimal('0.90'))
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        self.assertEqual(resolve_price(*self.key), Decimal('0.70'))
@@ -15,4 +15,10 @@ urlpatterns = [
     path('<int:product_id>/prices/create/', views.price_create, name='price_create'),
     path('prices/<int:price_id>/edit/', views.price_edit, name='price_edit'),
     path('prices/<int:price_id>/delete/', views.price_delete, name='price_delete'),
+
+    # Price matrix
+    path('prices/matrix/', views.price_matrix, name='price_matrix'),
+    path('prices/matrix/import/', views.price_matrix_import, name='price_matrix_import'),
+    path('prices/matrix/export/', views.price_matrix_export, name='price_matrix_export'),
+    path('prices/matrix/reprice/', views.price_reprice, name='price_reprice'),
 ]
@@ -1,8 +1,14 @@
+import csv
+from decimal import Decimal, InvalidOperation
+
 from django.shortcuts import render, get_object_or_404, redirect
 from django.contrib import messages
 from django.db.models import Q, Count, Avg, Min, Max
 from django.core.paginator import Paginator
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from .models import Product, CustomerProductPrice
+from .price_matrix import PriceMatrixError, import_price_matrix, price_matrix_rows, reprice
 from customers.models import Customer
 
 
@@ -277,3 +283,95 @@ def price_delete(request, price_id):
         'price': price,
     }
     return render(request, 'products/price_confirm_delete.html', context)
+
+
+def _price_matrix_context(**extra):
+    context = {
+        'customers': Customer.objects.all().order_by('name'),
+        'products': Product.objects.all().order_by('name'),
+        'stem_lengths': CustomerProductPrice.objects.order_by('stem_length_cm').values_list(
+            'stem_length_cm', flat=True
+        ).distinct(),
+        'total_prices': CustomerProductPrice.objects.count(),
+    }
+    context.update(extra)
+    return context
+
+
+def price_matrix(request):
+    """Bulk price matrix import/export and mass repricing"""
+    return render(request, 'products/price_matrix.html', _price_matrix_context())
+
+
+def price_matrix_import(request):
+    """Validate an uploaded CSV/XLSX price matrix and upsert every price in it"""
+    if request.method != 'POST':
+        return redirect('products:price_matrix')
+
+    upload = request.FILES.get('file')
+    if not upload:
+        messages.error(request, 'Choose a CSV or XLSX file to import.')
+        return redirect('products:price_matrix')
+
+    try:
+        created, updated = import_price_matrix(upload)
+    except PriceMatrixError as e:
+        messages.error(request, f'Nothing was imported: {len(e.errors)} problem(s) found in {upload.name}.')
+        return render(request, 'products/price_matrix.html', _price_matrix_context(import_errors=e.errors[:100]))
+
+    messages.success(request, f'Price matrix imported: {created} prices created, {updated} updated.')
+    return redirect('products:price_matrix')
+
+
+class _Echo:
+    """File-like object that hands written rows straight back to the csv writer"""
+
+    def write(self, value):
+        return value
+
+
+def price_matrix_export(request):
+    """Stream the customer price matrix as CSV"""
+    customer_id = request.GET.get('customer_id', '')
+    product_id = request.GET.get('product_id', '')
+    rows = price_matrix_rows(
+        customer_id=int(customer_id) if customer_id.isdigit() else None,
+        product_id=int(product_id) if product_id.isdigit() else None,
+    )
+
+    writer = csv.writer(_Echo())
+    response = StreamingHttpResponse((writer.writerow(row) for row in rows), content_type='text/csv')
+    response['Content-Disposition'] = f'attachment; filename="price_matrix_{timezone.now().date().isoformat()}.csv"'
+    return response
+
+
+def price_reprice(request):
+    """Change many customer prices at once by a percentage or an absolute amount"""
+    if request.method != 'POST':
+        return redirect('products:price_matrix')
+
+    change_type = request.POST.get('change_type', 'percent')
+    try:
+        value = Decimal(request.POST.get('value', ''))
+        customer_id = int(request.POST['customer_id']) if request.POST.get('customer_id') else None
+        product_id = int(request.POST['product_id']) if request.POST.get('product_id') else None
+        stem_length_cm = int(request.POST['stem_length_cm']) if request.POST.get('stem_length_cm') else None
+    except (InvalidOperation, ValueError):
+        messages.error(request, 'Enter a valid change value.')
+        return redirect('products:price_matrix')
+
+    if not value:
+        messages.error(request, 'Enter a non-zero change value.')
+        return redirect('products:price_matrix')
+    if change_type == 'percent' and value <= -100:
+        messages.error(request, 'A percentage decrease must be less than 100%.')
+        return redirect('products:price_matrix')
+
+    if change_type == 'amount':
+        updated = reprice(amount=value, customer_id=customer_id, product_id=product_id, stem_length_cm=stem_length_cm)
+        change = f'{value:+}'
+    else:
+        updated = reprice(percent=value, customer_id=customer_id, product_id=product_id, stem_length_cm=stem_length_cm)
+        change = f'{value:+}%'
+    messages.success(request, f'Repriced {updated} customer prices by {change}.')
+    return redirect('products:price_matrix')
@@ -104,6 +104,20 @@ DATABASES = {
 }
 
 
+# Cache
+# Analytics results, their stampede locks and the warmed home
+# dashboard must be visible to every worker process, so the default is the
+# shared database cache (create its table with `python manage.py createcachetable`).
+# Point CACHE_BACKEND/CACHE_LOCATION at memcached or another shared backend if available.
+
+CACHES = {
+    'default': {
+        'BACKEND': config('CACHE_BACKEND', default='django.core.cache.backends.db.DatabaseCache'),
+        'LOCATION': config('CACHE_LOCATION', default='zahara_cache'),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
 